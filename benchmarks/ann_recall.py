@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+'''
+    Benchmark of approximate nearest neighbours index : recall and speed
+    against exact search, for range of `nprobe` values.
+
+    Usage : python -m benchmarks.ann_recall -n 100000 -d 512 -k 10
+'''
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+from engine.AnnIndex import AnnIndex
+from helpers.features import ExactSearch
+
+
+def SyntheticFeatures(count: int, dimension: int, clusters: int, seed: int = 0) -> np.ndarray:
+    ''' Create clustered non negative features (like color histograms).'''
+    random = np.random.default_rng(seed)
+    centers = random.random((clusters, dimension), dtype=np.float32) ** 4
+    labels = random.integers(0, clusters, count)
+    noise = random.random((count, dimension), dtype=np.float32) ** 4
+    return centers[labels] + 0.5 * noise
+
+
+def Recall(approximate: np.ndarray, exact: np.ndarray) -> float:
+    ''' Return mean fraction of exact neighbours found.'''
+    found = [len(set(a.tolist()) & set(e.tolist())) for a, e in zip(approximate, exact)]
+    return np.sum(found) / exact.size
+
+
+def Benchmark(arguments: argparse.Namespace):
+    ''' Run benchmark.'''
+    features = SyntheticFeatures(arguments.count, arguments.dimension, arguments.clusters)
+    ids = np.arange(arguments.count)
+    random = np.random.default_rng(1)
+    queriesIndices = random.choice(arguments.count, arguments.queries, replace=False)
+    queries = features[queriesIndices]
+
+    # Exact : Reference search
+    start = time.perf_counter()
+    exact, _similarities = ExactSearch(features, queries, arguments.k + 1)
+    exactTime = time.perf_counter() - start
+    # Exact : Drop query itself
+    exact = np.array([row[row != index][:arguments.k] for row, index in zip(exact, queriesIndices)])
+
+    # Index : Build
+    index = AnnIndex(nlist=arguments.nlist)
+    start = time.perf_counter()
+    index.Build(ids, features)
+    buildTime = time.perf_counter() - start
+
+    logging.info('Vectors %u x %u, lists %u, build %2.2fs.',
+                 arguments.count, arguments.dimension, index.nlist, buildTime)
+    print(f'{"method":>12} {"recall@k":>10} {"ms/query":>10} {"speedup":>8}')
+    print(f'{"exact":>12} {1.0:>10.3f} {1000 * exactTime / len(queries):>10.3f} {1.0:>8.1f}')
+
+    # Index : Search with increasing probes
+    for nprobe in arguments.nprobes:
+        index.nprobe = nprobe
+        start = time.perf_counter()
+        approximate, _similarities = index.Search(queries, arguments.k, exclude=queriesIndices)
+        searchTime = time.perf_counter() - start
+        print(f'{"nprobe=" + str(nprobe):>12} {Recall(approximate, exact):>10.3f} '
+              f'{1000 * searchTime / len(queries):>10.3f} {exactTime / searchTime:>8.1f}')
+
+
+if (__name__ == '__main__'):
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', type=int, default=100000,
+                        required=False, help='Count of indexed vectors (identities).')
+    parser.add_argument('-d', '--dimension', type=int, default=512,
+                        required=False, help='Dimension of vectors.')
+    parser.add_argument('-c', '--clusters', type=int, default=1000,
+                        required=False, help='Count of synthetic clusters.')
+    parser.add_argument('-q', '--queries', type=int, default=1000,
+                        required=False, help='Count of queries.')
+    parser.add_argument('-k', '--k', type=int, default=10,
+                        required=False, help='Count of neighbours.')
+    parser.add_argument('-l', '--nlist', type=int, default=None,
+                        required=False, help='Count of index lists.')
+    parser.add_argument('-p', '--nprobes', type=int, nargs='+', default=[1, 4, 8, 16, 32],
+                        required=False, help='Probes counts to test.')
+    Benchmark(parser.parse_args())
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+'''
+    Benchmark of pipeline preset tiers : average augmentation time of
+    every pipeline (color, shape, all) in every tier (fast, balanced,
+    full), printed as markdown cost table.
+
+    Usage : python -m benchmarks.presets -i tests/TestImages1/*.jpg
+'''
+import sys
+import time
+import random
+import argparse
+import logging
+import numpy as np
+from helpers.augumentations import AugmentImage, PresetName, ReadImage, presets, transforms
+
+
+def Benchmark(arguments: argparse.Namespace):
+    ''' Run benchmark.'''
+    image = ReadImage(arguments.input)
+
+    print(f'| pipeline | {" | ".join(f"{preset} ms" for preset in presets)} | full / fast |')
+    print(f'|---|{"---:|" * (len(presets) + 1)}')
+    for name in ['color', 'shape', 'all']:
+        costs = []
+        for preset in presets:
+            # Random : Same random choices for every tier
+            random.seed(arguments.seed)
+            np.random.seed(arguments.seed)
+            transform = transforms[PresetName(name, preset)]
+            start = time.perf_counter()
+            AugmentImage(image, transform, arguments.repeats)
+            costs.append(1000 * (time.perf_counter() - start) / arguments.repeats)
+
+        print(f'| {name} | {" | ".join(f"{cost:.2f}" for cost in costs)} | {costs[-1] / costs[0]:.1f}x |')
+
+
+if (__name__ == '__main__'):
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', type=str, required=True,
+                        help='Source image.')
+    parser.add_argument('-r', '--repeats', type=int, default=200,
+                        required=False, help='Augmentations of every pipeline.')
+    parser.add_argument('--seed', type=int, default=0,
+                        required=False, help='Random seed.')
+    Benchmark(parser.parse_args())
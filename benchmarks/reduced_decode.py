@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+'''
+    Benchmark of reduced resolution decode : full decode versus JPEG DCT
+    scaled decode for high resolution sources, augmentation time of
+    pipelines with resize moved to front, and quality check (PSNR of
+    resized outputs of both decode paths).
+
+    Usage : python -m benchmarks.reduced_decode -i tests/TestImages1/*.jpg
+'''
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import cv2
+import numpy as np
+from helpers.augumentations import AugmentImage, ReadImage, outputHeight, outputWidth, transforms
+
+
+def Psnr(image1: np.ndarray, image2: np.ndarray) -> float:
+    ''' Return peak signal to noise ratio of two images in dB.'''
+    error = np.mean((image1.astype(np.float64) - image2.astype(np.float64)) ** 2)
+    return float('inf') if (error == 0) else 10 * np.log10(255 ** 2 / error)
+
+
+def Timeit(function, repeats: int) -> float:
+    ''' Return average time of function call in milliseconds.'''
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return 1000 * (time.perf_counter() - start) / repeats
+
+
+def Benchmark(arguments: argparse.Namespace):
+    ''' Run benchmark.'''
+    targetSize = (outputWidth, outputHeight)
+    source = cv2.imread(arguments.input)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f'{"source":>12} {"full ms":>9} {"reduced ms":>11} {"speedup":>8} {"PSNR dB":>8}')
+        for scale in arguments.scales:
+            # Source : Upscaled high resolution JPEG
+            path = os.path.join(directory, f'source{scale}.jpg')
+            image = cv2.resize(source, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+            # Decode : Full and reduced, both resized to output size
+            full = lambda: cv2.resize(ReadImage(path), targetSize, interpolation=cv2.INTER_AREA)
+            reduced = lambda: cv2.resize(ReadImage(path, targetSize), targetSize, interpolation=cv2.INTER_AREA)
+            fullTime = Timeit(full, arguments.repeats)
+            reducedTime = Timeit(reduced, arguments.repeats)
+
+            size = f'{image.shape[1]}x{image.shape[0]}'
+            print(f'{size:>12} {fullTime:>9.2f} {reducedTime:>11.2f} '
+                  f'{fullTime / reducedTime:>8.1f} {Psnr(full(), reduced()):>8.1f}')
+
+        # Pipelines : Augment time with resize at end and at front
+        print()
+        print(f'{"pipeline":>14} {"ms/image":>9}')
+        image = ReadImage(path)
+        for name in ['color', 'color_resized']:
+            elapsed = Timeit(lambda: AugmentImage(image, transforms[name], 1), arguments.repeats)
+            print(f'{name:>14} {elapsed:>9.2f}')
+
+
+if (__name__ == '__main__'):
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', type=str, required=True,
+                        help='Source image, upscaled to test resolutions.')
+    parser.add_argument('-s', '--scales', type=float, nargs='+', default=[1, 2, 4],
+                        required=False, help='Upscale factors of source image.')
+    parser.add_argument('-r', '--repeats', type=int, default=20,
+                        required=False, help='Repeats of every measurement.')
+    Benchmark(parser.parse_args())
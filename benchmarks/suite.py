@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+'''
+    Benchmark suite of augmentation hot path on synthetic reid dataset :
+    dataset loading by AnnoterReid (cold and indexed), Augment by every
+    pipeline and end-to-end main.Process. Reports images/sec, p50/p99
+    per-image latency and peak RSS, compared with stored baselines.
+    Every benchmark runs in fresh (spawned) process, so peak RSS is
+    measured per benchmark, not as peak of whole suite.
+
+    Usage : python -m benchmarks.suite -id 50 -im 20 -r 256x512
+            python -m benchmarks.suite --save     (store new baselines)
+'''
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+import main
+from engine.AnnoterReid import AnnoterReid
+from engine.ReidIndex import indexFilename
+from helpers.augumentations import Augment, transforms
+from helpers.files import IsImageFile
+
+# Baselines : Default file
+baselinesPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+def SyntheticDataset(path: str, identities: int, images: int, resolution: tuple, seed: int = 0):
+    ''' Create reid dataset of random person-like images (colored blobs and noise).'''
+    generator = np.random.default_rng(seed)
+    width, height = resolution
+    for identity in range(identities):
+        # Identity : Base colors of upper and lower body
+        colors = generator.integers(0, 256, (2, 3))
+        for index in range(images):
+            image = generator.integers(0, 40, (height, width, 3), dtype=np.uint8)
+            image[:height // 2] += colors[0].astype(np.uint8) // 2
+            image[height // 2:] += colors[1].astype(np.uint8) // 2
+            camera = 1 + index % 4
+            cv2.imwrite(os.path.join(path, f'ID{identity}_CAM{camera}_FRAME{index}.jpg'), image)
+
+
+def PeakRss() -> float:
+    ''' Return peak resident set size of this process and children in MB
+        (process lifetime peak, see Isolated).'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(peak, children) / 1024
+
+
+def Result(latencies: list, count: int, elapsed: float) -> dict:
+    ''' Return result dictionary from per-image latencies (seconds).'''
+    latencies = np.asarray(latencies if (len(latencies) != 0) else [elapsed / max(1, count)])
+    return {'images_per_second': count / elapsed,
+            'p50_ms': 1000 * float(np.percentile(latencies, 50)),
+            'p99_ms': 1000 * float(np.percentile(latencies, 99)),
+            'peak_rss_mb': PeakRss()}
+
+
+def Isolated(function, *args) -> dict:
+    ''' Run benchmark function in fresh spawned process, return its results.'''
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(function, *args).result()
+
+
+def BenchmarkLoading(path: str, name: str) -> dict:
+    ''' Benchmark dataset loading without (load_cold) or with (load_indexed) persistent index.'''
+    arguments = main.CreateParser().parse_args(['-i', path])
+    # Cold : Remove index
+    if (name == 'load_cold') and (os.path.exists(os.path.join(path, indexFilename))):
+        os.remove(os.path.join(path, indexFilename))
+
+    start = time.perf_counter()
+    annoter = AnnoterReid(dirpath=path, args=arguments)
+    elapsed = time.perf_counter() - start
+    return {name: Result([], annoter.images_count, elapsed)}
+
+
+def BenchmarkAugment(path: str, samples: int, name: str, seed: int = 0) -> dict:
+    ''' Benchmark Augment (read, augment, write) of pipeline.'''
+    # Random : Reproducible augmentations
+    random.seed(seed)
+    np.random.seed(seed)
+
+    imagePaths = sorted(os.path.join(path, filename) for filename in os.listdir(path) if filename.endswith('.jpg'))
+    imagePaths = imagePaths[:samples]
+    with tempfile.TemporaryDirectory() as outputDirectory:
+        latencies = []
+        for index, imagePath in enumerate(imagePaths):
+            start = time.perf_counter()
+            Augment(imagePath, f'{index}.jpg', outputDirectory, transforms[name])
+            latencies.append(time.perf_counter() - start)
+
+    return {f'augment_{name}': Result(latencies, len(latencies), sum(latencies))}
+
+
+def BenchmarkProcess(path: str, iterations: int, workers: int, seed: int = 0) -> dict:
+    ''' Benchmark end-to-end main.Process.'''
+    arguments = main.CreateParser().parse_args(['-i', path, '-n', str(iterations), '-w', str(workers),
+                                                '-s', str(seed)])
+    start = time.perf_counter()
+    main.Process(path, arguments)
+    elapsed = time.perf_counter() - start
+    # Created : Only images (manifest and reports skipped)
+    created = sum(1 for filename in os.listdir(os.path.join(path, 'generated')) if (IsImageFile(filename)))
+    return {f'process_w{workers}': Result([], created, elapsed)}
+
+
+def Compare(results: dict, baselines: dict, tolerance: float) -> list:
+    ''' Return list of regression descriptions against baselines.'''
+    regressions = []
+    for name, result in results.items():
+        # Check : No baseline
+        if (name not in baselines):
+            continue
+
+        baseline = baselines[name]
+        if (result['images_per_second'] < baseline['images_per_second'] * (1 - tolerance)):
+            regressions.append(f'{name} : {result["images_per_second"]:.1f} images/s, '
+                               f'baseline {baseline["images_per_second"]:.1f}')
+        if (result['p99_ms'] > baseline['p99_ms'] * (1 + tolerance)):
+            regressions.append(f'{name} : p99 {result["p99_ms"]:.2f} ms, '
+                               f'baseline {baseline["p99_ms"]:.2f}')
+
+    return regressions
+
+
+def Benchmark(arguments: argparse.Namespace) -> int:
+    ''' Run benchmark suite, return exit code (1 if regressions).'''
+    resolution = tuple(int(value) for value in arguments.resolution.split('x'))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = directory + os.sep
+        SyntheticDataset(path, arguments.identities, arguments.images, resolution, arguments.seed)
+        # Benchmarks : Each in own process (peak RSS of benchmark only)
+        for name in ['load_cold', 'load_indexed']:
+            results.update(Isolated(BenchmarkLoading, path, name))
+        for name in ['color', 'shape', 'all']:
+            results.update(Isolated(BenchmarkAugment, path, arguments.samples, name, arguments.seed))
+        results.update(Isolated(BenchmarkProcess, path, arguments.iterations, arguments.workers, arguments.seed))
+
+    # Results : Print table
+    print(f'{"benchmark":>16} {"images/s":>10} {"p50 ms":>9} {"p99 ms":>9} {"peak MB":>9}')
+    for name, result in results.items():
+        print(f'{name:>16} {result["images_per_second"]:>10.1f} {result["p50_ms"]:>9.2f} '
+              f'{result["p99_ms"]:>9.2f} {result["peak_rss_mb"]:>9.1f}')
+
+    # Configuration : Baselines valid only for same configuration
+    configuration = {key: getattr(arguments, key) for key in
+                     ['identities', 'images', 'resolution', 'samples', 'iterations', 'workers']}
+
+    # Baselines : Save new
+    if (arguments.save):
+        with open(arguments.baselines, 'w') as file:
+            json.dump({'configuration': configuration, 'results': results}, file, indent=2)
+        logging.info('(Benchmark) Baselines saved to `%s`.', arguments.baselines)
+        return 0
+
+    # Baselines : Compare with stored
+    if (not os.path.exists(arguments.baselines)):
+        logging.info('(Benchmark) No baselines `%s`, run with --save.', arguments.baselines)
+        return 0
+
+    with open(arguments.baselines) as file:
+        baselines = json.load(file)
+    if (baselines['configuration'] != configuration):
+        logging.warning('(Benchmark) Baselines configuration differs, not compared!')
+        return 0
+
+    regressions = Compare(results, baselines['results'], arguments.tolerance)
+    for regression in regressions:
+        logging.error('(Benchmark) Regression %s', regression)
+
+    return 1 if (len(regressions) != 0) else 0
+
+
+if (__name__ == '__main__'):
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-id', '--identities', type=int, default=50,
+                        required=False, help='Number of synthetic identities.')
+    parser.add_argument('-im', '--images', type=int, default=20,
+                        required=False, help='Number of images per identity.')
+    parser.add_argument('-r', '--resolution', type=str, default='256x512',
+                        required=False, help='Resolution of synthetic images (WxH), not smaller than shape pipeline crop.')
+    parser.add_argument('-s', '--samples', type=int, default=100,
+                        required=False, help='Number of images augmented by every pipeline.')
+    parser.add_argument('-n', '--iterations', type=int, default=500,
+                        required=False, help='Number of images created by end-to-end process.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        required=False, help='Number of end-to-end process workers.')
+    parser.add_argument('--seed', type=int, default=0,
+                        required=False, help='Random seed of dataset and augmentations.')
+    parser.add_argument('-b', '--baselines', type=str, default=baselinesPath,
+                        required=False, help='Baselines JSON file.')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                        required=False, help='Relative tolerance before regression is flagged.')
+    parser.add_argument('--save', action='store_true',
+                        required=False, help='Save results as new baselines.')
+    sys.exit(Benchmark(parser.parse_args()))
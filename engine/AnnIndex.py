@@ -0,0 +1,141 @@
+'''
+    Approximate nearest neighbours index (inverted file, IVF) on NumPy.
+
+    Vectors are clustered by spherical k-means into `nlist` lists stored
+    contiguously. Query is compared to centroids first and only vectors
+    of `nprobe` most similar lists are scanned exactly.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import numpy as np
+from helpers.features import NormalizeFeatures, TopK
+
+
+@dataclass
+class AnnIndex:
+    ''' Class of inverted file index for cosine similarity search.'''
+    # Count of lists (clusters), None is sqrt of vectors count
+    nlist: int = field(init=True, default=None)
+    # Count of lists scanned per query
+    nprobe: int = field(init=True, default=8)
+    # K-means iterations
+    iterations: int = field(init=True, default=10)
+    # Random seed of k-means initialization
+    seed: int = field(init=True, default=0)
+    # Centroids of lists
+    centroids: np.ndarray = field(init=False, repr=False, default=None)
+    # Vectors and their ids, sorted by list
+    vectors: np.ndarray = field(init=False, repr=False, default=None)
+    ids: np.ndarray = field(init=False, repr=False, default=None)
+    # Offsets of lists in vectors (nlist + 1)
+    offsets: np.ndarray = field(init=False, repr=False, default=None)
+
+    @property
+    def count(self) -> int:
+        ''' Count of indexed vectors.'''
+        return 0 if (self.ids is None) else len(self.ids)
+
+    @staticmethod
+    def Assign(vectors: np.ndarray, centroids: np.ndarray, tile: int = 8192) -> np.ndarray:
+        ''' Return index of most similar centroid for every vector.'''
+        assignment = np.zeros(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), tile):
+            assignment[start:start + tile] = np.argmax(vectors[start:start + tile] @ centroids.T, axis=1)
+        return assignment
+
+    def Train(self, vectors: np.ndarray):
+        ''' Train centroids by spherical k-means on sample of vectors.'''
+        random = np.random.default_rng(self.seed)
+
+        # Lists : Default count
+        if (self.nlist is None):
+            self.nlist = max(1, int(np.sqrt(len(vectors))))
+        self.nlist = min(self.nlist, len(vectors))
+
+        # Sample : Limit training set size
+        sampleSize = min(len(vectors), 256 * self.nlist)
+        sample = vectors[random.choice(len(vectors), sampleSize, replace=False)]
+
+        # Centroids : Random initialization, then iterate
+        self.centroids = sample[random.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = self.Assign(sample, self.centroids)
+            # Centroids : Sum of assigned vectors, empty lists keep old centroid
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=self.nlist)
+            sums[counts == 0] = self.centroids[counts == 0]
+            self.centroids = NormalizeFeatures(sums)
+
+    def Build(self, ids, features: np.ndarray):
+        ''' Build index of features with given ids.'''
+        vectors = NormalizeFeatures(np.asarray(features, dtype=np.float32))
+        ids = np.asarray(ids, dtype=np.int64)
+
+        # Centroids : Train
+        self.Train(vectors)
+
+        # Lists : Sort vectors by assigned list
+        assignment = self.Assign(vectors, self.centroids)
+        order = np.argsort(assignment, kind='stable')
+        self.vectors = vectors[order]
+        self.ids = ids[order]
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(assignment, minlength=self.nlist))
+
+    def Search(self, queries: np.ndarray, k: int, exclude=None) -> tuple:
+        ''' Search top k of queries, return (ids, similarities), -1 ids if less found.'''
+        queries = NormalizeFeatures(np.asarray(queries, dtype=np.float32).reshape(len(queries), -1))
+        nprobe = min(self.nprobe, self.nlist)
+        resultIds = np.full((len(queries), k), -1, dtype=np.int64)
+        resultSimilarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        # Lists : Most similar lists of every query
+        probes = TopK(queries @ self.centroids.T, nprobe)
+
+        # Lists : Queries probing every list, grouped by list
+        probedLists = probes.ravel()
+        probingQueries = np.repeat(np.arange(len(queries)), nprobe)
+        order = np.argsort(probedLists, kind='stable')
+        probedLists, probingQueries = probedLists[order], probingQueries[order]
+        lists, starts = np.unique(probedLists, return_index=True)
+        ends = np.append(starts[1:], len(probedLists))
+
+        for probe, first, last in zip(lists.tolist(), starts.tolist(), ends.tolist()):
+            # Check : Empty list
+            listStart, listEnd = self.offsets[probe], self.offsets[probe + 1]
+            if (listStart == listEnd):
+                continue
+
+            # Similarities : All queries probing list at once (list is contiguous view)
+            group = probingQueries[first:last]
+            similarities = queries[group] @ self.vectors[listStart:listEnd].T
+            ids = np.broadcast_to(self.ids[listStart:listEnd], similarities.shape)
+
+            # Exclude : Drop given ids (queries themselves)
+            if (exclude is not None):
+                excluded = np.asarray(exclude)[group]
+                similarities[ids == excluded[:, None]] = -np.inf
+
+            # Merge : Running top k with list candidates
+            candidatesSimilarities = np.concatenate([resultSimilarities[group], similarities], axis=1)
+            candidatesIds = np.concatenate([resultIds[group], ids], axis=1)
+            best = TopK(candidatesSimilarities, k)
+            resultSimilarities[group] = np.take_along_axis(candidatesSimilarities, best, axis=1)
+            resultIds[group] = np.take_along_axis(candidatesIds, best, axis=1)
+
+        # Results : Not found neighbours
+        resultIds[np.isneginf(resultSimilarities)] = -1
+
+        return resultIds, resultSimilarities
+
+    def SearchAll(self, k: int, batchSize: int = 1024) -> tuple:
+        ''' Top k of every indexed vector (itself excluded), return (ids, neighbours ids, similarities).'''
+        neighbours = np.zeros((self.count, k), dtype=np.int64)
+        similarities = np.zeros((self.count, k), dtype=np.float32)
+        for start in range(0, self.count, batchSize):
+            end = min(start + batchSize, self.count)
+            neighbours[start:end], similarities[start:end] = self.Search(self.vectors[start:end], k,
+                                                                         exclude=self.ids[start:end])
+
+        return self.ids, neighbours, similarities
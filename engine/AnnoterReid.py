@@ -6,14 +6,25 @@ Created on 17 lis 2020
 from __future__ import annotations
 from dataclasses import dataclass, field
 import os
-import time
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import numpy as np
 import logging
 from tqdm import tqdm
-from engine.ReidFileInfo import ReidFileInfo
-from helpers.files import IsImageFile,  GetFilename
+from engine.ReidFileInfo import ReidDataset, ReidFileInfo
+from engine.ReidIndex import ReidIndex
+from engine.ReidCatalog import ReidCatalog
+from engine.ShardReader import ShardReader
+from helpers.files import GetFilename
 from engine.Identity import Identity
-from engine.ImageData import ImageData
+from engine.FeatureStore import FeatureStore
+from engine.SimilarityTable import SimilarityTable
+from engine.AnnIndex import AnnIndex
+from engine.HashIndex import HashIndex
+from helpers.hashing import DHashBatches
+from helpers.visuals import ComputeVisualsBatches
+from helpers.features import ExtractFeaturesBatches, featuresDimension
+from helpers.scanning import ListDirectory, StatDirectory
 
 
 @dataclass
@@ -24,13 +35,23 @@ class AnnoterReid:
     # Arguments : Namespace from argparse
     args: object = field(init=True, default=None)
     # Found identities list
-    identities: dict = field(init=False, default_factory=list)
-
-    # Matrix of Identity.features x Identity.features similarities
-    similarity_matrix: np.ndarray = field(init=False, default=None)
+    identities: dict = field(init=False, default_factory=dict)
+    # Dataset of all identities (identities of different datasets not merged)
+    dataset: ReidDataset = field(init=False, default=None)
+    # Catalog of all images
+    catalog: ReidCatalog = field(init=False, default=None, repr=False)
+    # Scanned directories : Path to (root, directory key in root index)
+    locations: dict = field(init=False, default_factory=dict, repr=False)
+
+    # Table of Identity.features x Identity.features similarities
+    similarity: SimilarityTable = field(init=False, default=None, repr=False)
+    # Approximate nearest neighbours index of Identity.features
+    ann_index: AnnIndex = field(init=False, default=None, repr=False)
 
     def __post_init__(self):
         ''' Post init method.'''
+        # Catalog : Empty until location opened
+        self.catalog = ReidCatalog()
 
         # Location : Open and parse data
         self.OpenLocation(self.dirpath)
@@ -48,7 +69,7 @@ class AnnoterReid:
     @property
     def images_count(self) -> int:
         ''' Count of images.'''
-        return sum([len(identity.images) for identity in self.identities])
+        return self.catalog.count
 
     @property
     def consistency_avg(self) -> float:
@@ -59,6 +80,14 @@ class AnnoterReid:
         # Return average
         return sum(consistency) / len(consistency)
 
+    @property
+    def similarity_matrix(self) -> np.ndarray:
+        ''' Return similarity matrix of identities (rows in similarity.active_ids order).'''
+        if (self.similarity is None):
+            return None
+
+        return self.similarity.Active()
+
     @property
     def similarity_avg(self) -> float:
         ''' Return average similarity.'''
@@ -100,34 +129,226 @@ class AnnoterReid:
 
     def Remove(self, identity: Identity):
         ''' Remove identity.'''
-        # Identity : Get index from keys
-        index = self.indentities_ids.index(identity.number)
-
         # Identity : Remove identity
         self.identities.pop(identity.number)
-        # Similarity matrix : Remove row and column
-        self.similarity_matrix = np.delete(self.similarity_matrix, index, 0)
-        self.similarity_matrix = np.delete(self.similarity_matrix, index, 1)
+        # Similarity matrix : Remove row and column (lazily)
+        if (self.similarity is not None) and (self.similarity.Contains(identity.number)):
+            self.similarity.Remove(identity.number)
 
     def Similarities(self, identity: Identity) -> dict:
         ''' Return identity (to other identities) similarities as dict.'''
-        # Row index of identity in matrix
-        index = self.indentities_ids.index(identity.number)
-
-        # Similarities dict : Create from matrix
-        similarities = {}
-        for index, value in enumerate(self.similarity_matrix[index, :]):
-            similarities[self.indentities_ids[index]] = value
+        # Similarities : Row of identity
+        ids, values = self.similarity.Similarities(identity.number)
 
-        return similarities
+        # Similarities dict : Create from matrix row
+        return dict(zip(ids.tolist(), values.tolist()))
 
     def SeparationAvg(self, identity: Identity) -> float:
         ''' Return separation of identity.'''
-        # Index position in matrix
-        index = self.indentities_ids.index(identity.number)
         # Similarity : Get similarity
-        similarity = np.mean(self.similarity_matrix[index, :])
-        return 1 - similarity
+        _ids, values = self.similarity.Similarities(identity.number)
+        return 1 - np.mean(values)
+
+    @staticmethod
+    def ParseImages(images: list) -> list:
+        ''' Parse images names into (name, identity, camera, frame, dataset,
+            hue, brightness, saturation, dhash) rows, visuals are not known.'''
+        # ReidInfo : Parse whole listing at once
+        valid, identities, cameras, frames, datasets = ReidFileInfo.FromFilenames(images)
+        for index in np.flatnonzero(~valid):
+            logging.warning('(Annoter) Skipped not reid image `%s`!', images[index])
+
+        names = [imagename for imagename, isValid in zip(images, valid.tolist()) if (isValid)]
+        return [(imagename, identity, camera, frame, dataset, None, None, None, None)
+                for imagename, identity, camera, frame, dataset in zip(names,
+                                                                       identities[valid].tolist(),
+                                                                       cameras[valid].tolist(),
+                                                                       frames[valid].tolist(),
+                                                                       datasets[valid].tolist())]
+
+    def ComputeFeatures(self, batchSize: int = 256, threads: int = 4):
+        ''' Extract features of all images without features.'''
+        # Store : Shared memory mapped store in dataset, unless disabled
+        if (self.catalog.feature_store is None):
+            if (self.args is not None) and (getattr(self.args, 'noFeatureStore', False)):
+                store = FeatureStore(None, featuresDimension)
+            else:
+                store = FeatureStore.ForDirectory(self.dirpath, featuresDimension)
+            self.catalog.OpenFeatures(store)
+
+        # Rows : Images without features
+        rows = self.catalog.MissingFeatures()
+        paths = [self.catalog.Path(row) for row in rows]
+
+        # ProgressBar : Create
+        progress = tqdm(total=len(rows),
+                        desc='Extracting features',
+                        unit='images',
+                        leave=False)
+
+        # Batches : Extract and store
+        for start, features in ExtractFeaturesBatches(paths, batchSize, threads):
+            self.catalog.SetFeatures(rows[start:start + len(features)], features)
+            progress.update(len(features))
+
+        # Progress : Close
+        progress.close()
+
+    def ComputeSimilarities(self, tile: int = 2048, path: str = None):
+        ''' Compute identities similarity matrix (memory mapped to path or
+            `similarityFile` argument if given, else in memory).'''
+        # Features : Compute missing
+        self.ComputeFeatures()
+
+        # Features : Identities features matrix
+        ids = self.indentities_ids
+        features = np.stack([self.identities[identityID].features
+                             for identityID in ids]).astype(np.float32)
+
+        # Output : Memory mapped file for large matrices
+        if (path is None):
+            path = getattr(self.args, 'similarityFile', None)
+
+        # Similarity matrix : Blocked computation
+        self.similarity = SimilarityTable.Build(ids, features, tile=tile, path=path)
+
+    def UpdateSimilarities(self):
+        ''' Append similarities of identities missing in similarity matrix.'''
+        # Check : Not computed yet, full computation
+        if (self.similarity is None):
+            self.ComputeSimilarities()
+            return
+
+        # Identities : Not stored in matrix
+        missing = [identityID for identityID in self.indentities_ids
+                   if (not self.similarity.Contains(identityID))]
+
+        # Features : Compute missing images features
+        if (len(missing) != 0):
+            self.ComputeFeatures()
+
+        # Matrix : Append rows and columns
+        for identityID in missing:
+            self.similarity.Add(identityID, self.identities[identityID].features)
+
+    def BuildAnnIndex(self, nlist: int = None, nprobe: int = 8):
+        ''' Build approximate nearest neighbours index of identities features.'''
+        # Features : Compute missing
+        self.ComputeFeatures()
+
+        # Index : Build from identities features
+        ids = self.indentities_ids
+        features = np.stack([self.identities[identityID].features for identityID in ids])
+        self.ann_index = AnnIndex(nlist=nlist, nprobe=nprobe)
+        self.ann_index.Build(ids, features)
+
+    def MostSimilar(self, identity: Identity, k: int = 10) -> list:
+        ''' Return list of (identity number, similarity) of k most similar identities.'''
+        # Index : Build on first use
+        if (self.ann_index is None):
+            self.BuildAnnIndex()
+
+        # Search : Identity itself excluded
+        ids, similarities = self.ann_index.Search(identity.features.reshape(1, -1), k,
+                                                  exclude=[identity.number])
+        return [(number, similarity) for number, similarity in zip(ids[0].tolist(), similarities[0].tolist())
+                if (number != -1)]
+
+    def MostSimilarAll(self, k: int = 10) -> dict:
+        ''' Return dict of identity number to list of k most similar (identity number, similarity).'''
+        # Index : Build on first use
+        if (self.ann_index is None):
+            self.BuildAnnIndex()
+
+        # Search : All pairs top k
+        ids, neighbours, similarities = self.ann_index.SearchAll(k)
+        return {number: [(neighbour, similarity) for neighbour, similarity in zip(row, values)
+                         if (neighbour != -1)]
+                for number, row, values in zip(ids.tolist(), neighbours.tolist(), similarities.tolist())}
+
+    def ComputeHashes(self, batchSize: int = 1024, threads: int = 4):
+        ''' Compute dHash of all images without hash.'''
+        # Rows : Images without hash
+        rows = self.catalog.MissingHashes()
+        paths = [self.catalog.Path(row) for row in rows]
+
+        # ProgressBar : Create
+        progress = tqdm(total=len(rows),
+                        desc='Hashing images',
+                        unit='images',
+                        leave=False)
+
+        # Batches : Compute and store
+        for start, hashes in DHashBatches(paths, batchSize, threads):
+            self.catalog.SetHashes(rows[start:start + len(hashes)], hashes)
+            progress.update(len(hashes))
+
+        # Progress : Close
+        progress.close()
+
+    def ComputeVisuals(self, batchSize: int = 512, workers: int = None):
+        ''' Compute visual statistics of all images without them, persist in index.'''
+        # Rows : Images without visuals
+        rows = self.catalog.MissingVisuals()
+        paths = [self.catalog.Path(row) for row in rows]
+
+        # Indexes : Opened roots indexes, visuals persisted unless disabled
+        indexes = {}
+
+        # ProgressBar : Create
+        progress = tqdm(total=len(rows),
+                        desc='Computing visuals',
+                        unit='images',
+                        leave=False)
+
+        # Batches : Compute and store
+        for start, visuals in ComputeVisualsBatches(paths, batchSize, workers):
+            batchRows = rows[start:start + len(visuals['hue'])]
+            self.catalog.SetVisuals(batchRows, visuals)
+
+            # Indexes : Only images of scanned directories are indexed
+            directories = self.catalog.directory[batchRows]
+            for directoryId in np.unique(directories).tolist():
+                directory = self.catalog.directories[directoryId]
+                # Check : Not scanned directory (generated images)
+                if (directory not in self.locations):
+                    continue
+
+                root, key = self.locations[directory]
+                if (root not in indexes):
+                    indexes[root] = self.OpenIndex(root)
+                if (indexes[root] is None):
+                    continue
+
+                indexed = directories == directoryId
+                try:
+                    indexes[root].SetVisuals(key,
+                                             [self.catalog.Name(row) for row in batchRows[indexed]],
+                                             {name: np.asarray(values)[indexed] for name, values in visuals.items()})
+                # Index : Damaged, rebuilt (visuals stored again by next run)
+                except sqlite3.DatabaseError as error:
+                    indexes[root] = indexes[root].Rebuild(error)
+
+            progress.update(len(batchRows))
+
+        # Progress : Close
+        progress.close()
+        for index in indexes.values():
+            if (index is not None):
+                index.Close()
+
+    def NearDuplicates(self, radius: int = 4) -> list:
+        ''' Return list of (path1, path2, distance) of images within dHash Hamming radius.'''
+        # Hashes : Compute missing
+        self.ComputeHashes()
+
+        # Index : Build and find pairs
+        index = HashIndex(radius=radius)
+        index.Build(self.catalog.dhash[:self.catalog.count])
+        pairs = index.NearDuplicates()
+
+        return [(self.catalog.Path(first), self.catalog.Path(second), distance)
+                for first, second, distance in pairs.tolist()]
 
     def OpenLocation(self, path: str):
         ''' Open images/annotations location.'''
@@ -139,43 +360,169 @@ class AnnoterReid:
         # Dirpath : Store
         self.dirpath = path
 
-        # Excludes : List of excludes
-        excludes = ['.', '..', './', '.directory']
-        # Images : List all directory images.
-        images = [filename for filename in os.listdir(path)
-                  if (filename not in excludes) and (IsImageFile(filename))]
+        # Shards : Directory of tar shards
+        if (ShardReader.IsShards(path)):
+            self.OpenShards(path)
+            return
 
-        # ProgressBar : Create
-        progress = tqdm(total=len(images),
-                        desc=f'Loading reid images',
-                        unit='images',
-                        leave=False)
+        # Identities : Scan all roots into new catalog
+        self.catalog = ReidCatalog()
+        self.identities = {}
+        self.dataset = None
+        self.locations = {}
+        roots = [path] + list(getattr(self.args, 'inputRoots', None) or [])
+        self.OpenLocations(roots,
+                           recursive=getattr(self.args, 'recursive', False),
+                           threads=getattr(self.args, 'scanThreads', 8))
+
+    def OpenIndex(self, root: str) -> ReidIndex:
+        ''' Open persistent index of root, None if disabled.'''
+        if (self.args is None) or (not getattr(self.args, 'noIndex', False)):
+            return ReidIndex.ForDirectory(root)
+
+        return None
+
+    def OpenLocations(self, roots: list, recursive: bool = False, threads: int = 8):
+        ''' Scan roots (and their subdirectories if recursive) by thread pool,
+            add images of every directory as soon as it is listed.'''
+        # Indexes : One persistent index per root
+        indexes = {root: self.OpenIndex(root) for root in roots}
+
+        try:
+            self.ScanLocations(roots, indexes, recursive, threads)
+        finally:
+            # Indexes : Close
+            for index in indexes.values():
+                if (index is not None):
+                    index.Close()
+
+        logging.debug('(Annoter) Scanned %u directories, %u images, %u identities.',
+                      len(self.locations), self.catalog.count, len(self.identities))
+
+    def ScanLocations(self, roots: list, indexes: dict, recursive: bool, threads: int):
+        ''' Scan roots by thread pool, directories added as they are listed.'''
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            # Pending : Future to (kind, root, directory key)
+            pending = {}
+
+            def Submit(function, root: str, key: str):
+                ''' Submit directory stat or listing.'''
+                pending[executor.submit(function, self.LocationPath(root, key))] = (function, root, key)
+
+            # Roots : Indexed roots are checked by stat first
+            for root in roots:
+                Submit(StatDirectory if (indexes[root] is not None) else ListDirectory, root, '.')
+
+            # Results : Processed in main thread as they arrive
+            while (len(pending) != 0):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    function, root, key = pending.pop(future)
+                    index = indexes[root]
+                    directory = self.LocationPath(root, key)
+
+                    # Check : Directory not accessible
+                    try:
+                        result = future.result()
+                    except OSError as error:
+                        logging.warning('(Annoter) Cannot scan `%s` : %s!', directory, error)
+                        continue
+
+                    try:
+                        # Stat : Indexed and unchanged, else list directory
+                        if (function is StatDirectory):
+                            if (index is None) or (not index.IsValid(key, result)):
+                                Submit(ListDirectory, root, key)
+                                continue
+                            rows, subdirectories = index.Images(key), index.Subdirectories(key)
+                        # List : Update index incrementally
+                        else:
+                            mtime, images, subdirectories = result
+                            if (index is not None):
+                                rows = index.Update(key, mtime, images, subdirectories)
+                            else:
+                                rows = self.ParseImages(images)
+                    # Index : Damaged, rebuilt and directory listed again
+                    except sqlite3.DatabaseError as error:
+                        indexes[root] = index.Rebuild(error)
+                        Submit(ListDirectory, root, key)
+                        continue
+
+                    # Directory : Add images, merged into identities
+                    self.locations[directory] = (root, key)
+                    self.AddRows(directory, rows)
+
+                    # Subdirectories : Scan recursively
+                    if (recursive):
+                        for subdirectory in subdirectories:
+                            subkey = subdirectory if (key == '.') else os.path.join(key, subdirectory)
+                            Submit(StatDirectory if (index is not None) else ListDirectory, root, subkey)
 
-        # Identities : Create identities
+    @staticmethod
+    def LocationPath(root: str, key: str) -> str:
+        ''' Return path of directory key (relative to root).'''
+        return root if (key == '.') else os.path.join(root, key)
+
+    def OpenShards(self, path: str):
+        ''' Open images stored in tar shards, identities from shards index.'''
+        reader = ShardReader(path)
+
+        # Identities : Every shard is catalog directory
+        self.catalog = ReidCatalog()
         self.identities = {}
-        # Processing all files
-        for index, imagename in enumerate(images):
-            # Filepath : Create filepath
-            imagepath = f'{path}{imagename}'
-
-            # ReidInfo : Get reid info
-            reidInfo = ReidFileInfo.FromFilename(imagename)
-
-            # Identity : Create identity if not exists
-            if (reidInfo.identity not in self.identities):
-                self.identities[reidInfo.identity] = Identity(number=reidInfo.identity,
-                                                              images=[],
-                                                              dataset=reidInfo.dataset,
-                                                              )
-
-            # Identity : Append image
-            self.identities[reidInfo.identity].images.append(ImageData(path=imagepath,
-                                                                       camera=reidInfo.camera,
-                                                                       frame=reidInfo.frame,
-                                                                       ))
-
-            # Progress : Update
-            progress.update(1)
+        self.dataset = None
+        for shard in reader.shards:
+            self.AddRows(os.path.join(path, shard), reader.Rows(shard))
+
+        logging.info('(Annoter) Opened %u images from %u shards.', self.catalog.count, len(reader.shards))
+
+    def MoveToShards(self, directory: str, reader: ShardReader) -> int:
+        ''' Move catalog images of directory written into shards of reader
+            to their shard paths, return count of moved images.'''
+        rows = self.catalog.DirectoryRows(directory)
+        shards = {}
+        for row in rows.tolist():
+            name = self.catalog.Name(row)
+            if (reader.Contains(name)):
+                shards.setdefault(reader.entries[name][0], []).append(row)
+
+        # Shards : Every shard is catalog directory
+        for shard, shardRows in shards.items():
+            self.catalog.Move(np.array(shardRows, dtype=np.int64), os.path.join(reader.directory, shard))
+
+        return sum(len(shardRows) for shardRows in shards.values())
+
+    def AddRows(self, directory: str, rows: list):
+        ''' Add (name, identity, camera, frame, dataset, hue, brightness,
+            saturation, dhash) rows of directory.'''
+        # Check : No rows
+        if (len(rows) == 0):
+            return
 
-        # Progress : Close
-        progress.close()
+        # Columns : Transpose rows
+        names, identities, cameras, frames, datasets, hue, brightness, saturation, dhash = zip(*rows)
+
+        # Check : Identities numbers of different datasets are different persons
+        for dataset in set(datasets):
+            if (self.dataset is None):
+                self.dataset = ReidDataset(dataset)
+            elif (self.dataset.value != dataset):
+                raise ValueError(f'(Annoter) Directory `{directory}` of dataset {dataset}, '
+                                 f'cannot merge with {self.dataset.value}!')
+
+        # Visuals : Stored visuals (None missing), hashes stored signed
+        visuals = {'hue': np.array(hue, dtype=np.float32),
+                   'brightness': np.array(brightness, dtype=np.float32),
+                   'saturation': np.array(saturation, dtype=np.float32),
+                   'dhash': [None if (value is None) else value % (1 << 64) for value in dhash]}
+
+        # Catalog : Bulk add images
+        unique = self.catalog.Extend(directory, names, identities, cameras, frames, visuals)
+
+        # Identities : Create not existing identities
+        for number in unique.tolist():
+            if (number not in self.identities):
+                self.identities[number] = Identity(number=number,
+                                                   dataset=self.dataset,
+                                                   catalog=self.catalog,
+                                                   )
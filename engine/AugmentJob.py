@@ -0,0 +1,42 @@
+'''
+    Single augmentation job : source image to generated output images.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+
+
+@dataclass
+class AugmentJob:
+    ''' Dataclass representing one augmentation job (one source image, many outputs).'''
+    # Source image path
+    source: str = field(init=True, default=None)
+    # Output images names
+    outputNames: list = field(init=True, default_factory=list)
+    # Output directory
+    outputDirectory: str = field(init=True, default=None)
+    # Transformation name (see helpers.augumentations.transforms)
+    transform: str = field(init=True, default='all')
+    # Random seed of job augmentations (None for not seeded)
+    seed: int = field(init=True, default=None)
+    # Index of job in run plan
+    index: int = field(init=True, default=None)
+
+    @property
+    def count(self) -> int:
+        ''' Count of outputs.'''
+        return len(self.outputNames)
+
+    @property
+    def outputPaths(self) -> list:
+        ''' Return paths of generated images.'''
+        return [self.OutputPath(outputName) for outputName in self.outputNames]
+
+    def OutputPath(self, outputName: str) -> str:
+        ''' Return path of generated image.'''
+        return os.path.join(self.outputDirectory, outputName)
+
+    def AddOutput(self, outputName: str) -> str:
+        ''' Add output name, return path of generated image.'''
+        self.outputNames.append(outputName)
+        return self.OutputPath(outputName)
@@ -0,0 +1,435 @@
+'''
+    Long running augmentation service.
+
+    Pipelines are built once at import, warp maps pools are prepared and
+    worker processes forked once at start, datasets catalogs are kept
+    warm between jobs (reopened on request, validated by index). Jobs are
+    submitted over HTTP on localhost or Unix socket and executed one by
+    one from queue on shared worker pool, each with own run manifest.
+    Failed job is cancelled, its processing stages joined before it is
+    marked failed, and outputs planned by failed or cancelled job are
+    rolled back from warm catalog (done outputs kept). Only latest
+    finished jobs (and their manifests) are kept. Service listens on
+    loopback host only.
+
+        POST   /jobs        {directory, transform, count, seed, cap, rescan}
+        GET    /jobs        status of all jobs
+        GET    /jobs/<id>   status of job (progress of outputs)
+        DELETE /jobs/<id>   cancel job
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import closing
+import os
+import json
+import stat
+import queue
+import signal
+import socket
+import ipaddress
+import socketserver
+import logging
+import argparse
+import threading
+import multiprocessing
+from engine.AnnoterReid import AnnoterReid
+from engine.ImageData import ImageData
+from engine.ReidFileInfo import ReidFileInfo
+from engine.RunManifest import RunManifest
+from engine.Scheduler import Scheduler
+from engine.ServiceJob import ServiceJob
+from helpers.augumentations import ConfigureWarpMaps, GetTransform, PrepareTransform, transforms
+from helpers.files import FixPath
+from helpers.processing import InitWorker, ProcessJobs, SeedJob
+
+# Sentinel : Stops service runner
+ServiceEnd = None
+# Unix socket : Prefix of explicit socket path address
+unixPrefix = 'unix:'
+
+
+@dataclass
+class AugmentService:
+    ''' Class executing queued augmentation jobs on warm pipelines and catalogs.'''
+    # Arguments : Namespace from argparse (processing defaults)
+    arguments: argparse.Namespace = field(init=True, default=None, repr=False)
+    # Count of finished jobs kept for status requests
+    history: int = field(init=True, default=1000)
+    # Jobs by id
+    jobs: dict = field(init=False, default_factory=dict)
+    # Queue of jobs waiting for runner
+    queue: queue.Queue = field(init=False, default_factory=queue.Queue, repr=False)
+    # Warm annoters by dataset directory
+    annoters: dict = field(init=False, default_factory=dict, repr=False)
+    # Worker processes pool (None for single worker)
+    pool: object = field(init=False, default=None, repr=False)
+    # Runner thread
+    runner: threading.Thread = field(init=False, default=None, repr=False)
+    # Lock : Jobs dictionary shared with request threads
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock, repr=False)
+
+    @property
+    def workers(self) -> int:
+        ''' Count of augment workers (zero means all cores).'''
+        return self.arguments.workers if (self.arguments.workers > 0) else os.cpu_count()
+
+    @property
+    def warpSeed(self) -> int:
+        ''' Seed of warp maps pool shared by all jobs (stored in jobs manifests).'''
+        return self.arguments.seed if (self.arguments.seed is not None) else 0
+
+    def Start(self):
+        ''' Prepare pipelines, start worker pool and runner thread.'''
+        # Transforms : Prepared once before workers fork (warp maps pools, noise banks)
+        if (self.arguments.warpMaps is not None):
+            ConfigureWarpMaps(self.arguments.warpMaps, self.arguments.warpFile)
+        else:
+            ConfigureWarpMaps()
+        SeedJob(self.warpSeed)
+        for transform in transforms.values():
+            PrepareTransform(transform)
+
+        # Pool : Forked once, shared by all jobs
+        if (self.workers > 1):
+            self.pool = multiprocessing.Pool(processes=self.workers, initializer=InitWorker)
+
+        self.runner = threading.Thread(target=self.Run, name='ServiceRunner', daemon=True)
+        self.runner.start()
+        logging.info('(AugmentService) Started with %u workers.', self.workers)
+
+    def Close(self):
+        ''' Cancel jobs, stop runner and worker pool.'''
+        with self.lock:
+            for job in self.jobs.values():
+                job.Cancel()
+        self.queue.put(ServiceEnd)
+        if (self.runner is not None):
+            self.runner.join()
+        if (self.pool is not None):
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def Submit(self, request: dict) -> ServiceJob:
+        ''' Validate request and queue new job.'''
+        # Check : Dataset directory
+        directory = request.get('directory', None)
+        if (not isinstance(directory, str)) or (not os.path.isdir(directory)):
+            raise ValueError(f'Directory `{directory}` not exists!')
+        # Check : Unknown transformation (raises)
+        transform = request.get('transform', 'all')
+        GetTransform(transform)
+        # Check : Count of outputs
+        count = request.get('count', self.arguments.iterations)
+        if (not IsInteger(count)) or (count <= 0):
+            raise ValueError(f'Count `{count}` must be positive integer!')
+        # Check : Seed of random generators (32-bit unsigned), None for random
+        seed = request.get('seed', None)
+        if (seed is not None) and ((not IsInteger(seed)) or (not 0 <= seed < 2**32)):
+            raise ValueError(f'Seed `{seed}` must be integer in range 0..2^32-1!')
+        # Check : Maximum images of identity, None for no cap
+        cap = request.get('cap', self.arguments.cap)
+        if (cap is not None) and ((not IsInteger(cap)) or (cap <= 0)):
+            raise ValueError(f'Cap `{cap}` must be positive integer!')
+
+        job = ServiceJob(directory=FixPath(directory),
+                         transform=transform,
+                         count=count,
+                         seed=seed,
+                         cap=cap,
+                         rescan=bool(request.get('rescan', False)))
+        with self.lock:
+            self.jobs[job.id] = job
+        self.Prune()
+        self.queue.put(job)
+        logging.info('(AugmentService) Queued job %s : %u `%s` outputs of `%s`.',
+                     job.id, job.count, job.transform, job.directory)
+        return job
+
+    def Job(self, jobId: str) -> ServiceJob:
+        ''' Return job by id, None if unknown.'''
+        with self.lock:
+            return self.jobs.get(jobId, None)
+
+    def Prune(self):
+        ''' Forget oldest finished jobs above history, their manifests removed.'''
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values() if (job.finishedStatus)),
+                              key=lambda job: job.finished)
+            pruned = finished[:max(0, len(finished) - self.history)]
+            for job in pruned:
+                del self.jobs[job.id]
+
+        # Manifests : Removed with jobs, generated directory does not grow
+        for job in pruned:
+            if (job.directory is not None) and (os.path.exists(job.manifestPath)):
+                os.remove(job.manifestPath)
+
+    def Statuses(self) -> list:
+        ''' Return statuses of all jobs.'''
+        with self.lock:
+            return [job.Status() for job in self.jobs.values()]
+
+    def Annoter(self, directory: str, rescan: bool = False) -> AnnoterReid:
+        ''' Return warm annoter of directory, scanned on first use or rescan.'''
+        if (rescan) or (directory not in self.annoters):
+            # Arguments : Job directory only, without service input roots
+            arguments = argparse.Namespace(**{**vars(self.arguments), 'inputRoots': None})
+            self.annoters[directory] = AnnoterReid(dirpath=directory, args=arguments)
+
+        return self.annoters[directory]
+
+    def Run(self):
+        ''' Runner loop : Execute queued jobs one by one.'''
+        while True:
+            job = self.queue.get()
+            # Check : Service stopped
+            if (job is ServiceEnd):
+                break
+            # Check : Cancelled while queued
+            if (job.finishedStatus):
+                continue
+
+            # Job : Errors finish job (stages already joined), service keeps running
+            try:
+                self.Execute(job)
+            except Exception as error:
+                logging.error('(AugmentService) Job %s failed : %s', job.id, error)
+                job.cancel.set()
+                job.Finish('failed', str(error))
+            self.Prune()
+
+    def Execute(self, job: ServiceJob):
+        ''' Plan and process job, written outputs marked in job manifest.'''
+        job.Start()
+        annoter = self.Annoter(job.directory, job.rescan)
+        outputPath = os.path.join(job.directory, 'generated')
+        os.makedirs(outputPath, exist_ok=True)
+
+        # Catalog : Rows before planned outputs (rolled back unless written)
+        rows, manifest = annoter.catalog.count, None
+        try:
+            # Jobs : Plan identity balanced outputs
+            seed = job.seed if (job.seed is not None) else int.from_bytes(os.urandom(4), 'little')
+            scheduler = Scheduler(annoter=annoter,
+                                  iterations=job.count,
+                                  cap=job.cap,
+                                  cameraWeight=self.arguments.cameraWeight)
+            manifest = RunManifest(path=job.manifestPath,
+                                   run={'seed': seed,
+                                        'iterations': job.count,
+                                        'warpSeed': self.warpSeed,
+                                        **RunManifest.Options(self.arguments),
+                                        # Sink : Service writes files only
+                                        'shards': None},
+                                   jobs=scheduler.Plan(outputPath, job.transform, seed))
+            manifest.Create()
+            job.total = sum(augmentJob.count for augmentJob in manifest.jobs)
+
+            # Jobs : Processed on shared pool until done or cancelled, stages joined on exit
+            manifest.Open()
+            try:
+                with closing(ProcessJobs(manifest.jobs,
+                                         workers=self.workers,
+                                         queueDepth=self.arguments.queueDepth,
+                                         ioThreads=self.arguments.ioThreads,
+                                         reducedDecode=self.arguments.reducedDecode,
+                                         pool=self.pool,
+                                         cancel=job.cancel)) as processed:
+                    for augmentJob in processed:
+                        manifest.MarkDone(augmentJob)
+                        job.done += augmentJob.count
+            finally:
+                manifest.Close()
+        except BaseException:
+            self.Rollback(annoter, rows, manifest)
+            raise
+
+        # Cancelled : Not written outputs rolled back
+        if (job.cancel.is_set()):
+            self.Rollback(annoter, rows, manifest)
+
+        job.Finish('cancelled' if (job.cancel.is_set()) else 'done')
+        logging.info('(AugmentService) Job %s %s : %u of %u outputs.', job.id, job.status, job.done, job.total)
+
+
+    @staticmethod
+    def Rollback(annoter: AnnoterReid, rows: int, manifest: RunManifest = None):
+        ''' Remove outputs planned after `rows` from catalog, except outputs of done jobs.'''
+        annoter.catalog.Truncate(rows)
+
+        # Check : Nothing planned
+        if (manifest is None):
+            return
+
+        # Done : Written outputs stay in catalog
+        for augmentJob in manifest.jobs:
+            if (augmentJob.index in manifest.done):
+                for outputName in augmentJob.outputNames:
+                    info = ReidFileInfo.FromFilename(outputName)
+                    annoter.identities[info.identity].AddImage(ImageData(path=augmentJob.OutputPath(outputName),
+                                                                         camera=info.camera,
+                                                                         frame=info.frame))
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    ''' HTTP requests handler of augmentation service.'''
+    # Service : Set by Serve
+    service: AugmentService = None
+
+    def Reply(self, code: int, body):
+        ''' Send JSON response.'''
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def JobFromPath(self) -> ServiceJob:
+        ''' Return job of /jobs/<id> path, reply 404 if unknown.'''
+        job = self.service.Job(self.path.rstrip('/').rsplit('/', 1)[-1])
+        if (job is None):
+            self.Reply(404, {'error': 'Unknown job!'})
+        return job
+
+    def do_GET(self):
+        ''' Jobs statuses.'''
+        if (self.path.rstrip('/') == '/jobs'):
+            self.Reply(200, self.service.Statuses())
+        elif (self.path.startswith('/jobs/')):
+            job = self.JobFromPath()
+            if (job is not None):
+                self.Reply(200, job.Status())
+        else:
+            self.Reply(404, {'error': 'Unknown path!'})
+
+    def do_POST(self):
+        ''' Submit job.'''
+        # Check : Unknown path
+        if (self.path.rstrip('/') != '/jobs'):
+            self.Reply(404, {'error': 'Unknown path!'})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            job = self.service.Submit(request)
+        except (ValueError, AttributeError) as error:
+            self.Reply(400, {'error': str(error)})
+            return
+
+        self.Reply(201, job.Status())
+
+    def do_DELETE(self):
+        ''' Cancel job.'''
+        # Check : Unknown path
+        if (not self.path.startswith('/jobs/')):
+            self.Reply(404, {'error': 'Unknown path!'})
+            return
+
+        job = self.JobFromPath()
+        if (job is not None):
+            job.Cancel()
+            self.Reply(200, job.Status())
+
+    def log_message(self, format, *args):
+        ''' Requests logged as debug (no client address on Unix socket).'''
+        logging.debug('(AugmentService) %s', format % args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    ''' Threading HTTP server on Unix socket.'''
+    daemon_threads = True
+
+    def server_bind(self):
+        ''' Bind socket, replacing stale socket file only (not listening socket or other file).'''
+        if (os.path.lexists(self.server_address)):
+            # Check : Not socket
+            if (not stat.S_ISSOCK(os.lstat(self.server_address).st_mode)):
+                raise FileExistsError(f'Path `{self.server_address}` exists and is not socket!')
+            # Check : Socket of running server
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.server_address)
+                except ConnectionRefusedError:
+                    os.remove(self.server_address)
+                else:
+                    raise OSError(f'Socket `{self.server_address}` is in use!')
+        socketserver.UnixStreamServer.server_bind(self)
+        # HTTP : Names used by request handler
+        self.server_name, self.server_port = self.server_address, 0
+
+
+def ParseAddress(address: str) -> tuple:
+    ''' Return (host, port) of `host:port` or `port` (localhost) address,
+        (path, None) of `unix:path`, path or not numeric name address.'''
+    # Unix socket : Explicit prefix or path
+    if (address.startswith(unixPrefix)):
+        return address[len(unixPrefix):], None
+    if (os.sep in address):
+        return address, None
+
+    host, separator, port = address.rpartition(':')
+    # Check : Port not number
+    if (not port.isdigit()):
+        # Unix socket : Name in working directory (aug.sock)
+        if (not separator):
+            return address, None
+        raise ValueError(f'Port of address `{address}` is not number!')
+
+    return host or '127.0.0.1', int(port)
+
+
+def IsLoopback(host: str) -> bool:
+    ''' True if all addresses of host are loopback addresses.'''
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+
+    return all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses)
+
+
+def IsInteger(value) -> bool:
+    ''' True if request value is integer (booleans are not).'''
+    return isinstance(value, int) and (not isinstance(value, bool))
+
+
+def CreateServer(address: str, service: AugmentService):
+    ''' Create server on `host:port`, `port` (localhost) or Unix socket address.'''
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service})
+    host, port = ParseAddress(address)
+    # Unix socket : Path
+    if (port is None):
+        return UnixHTTPServer(host, handler)
+
+    # Check : Service has no authentication, local clients only
+    if (not IsLoopback(host)):
+        raise ValueError(f'Host `{host}` is not loopback address!')
+
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def Serve(address: str, arguments: argparse.Namespace):
+    ''' Run augmentation service until interrupted.'''
+    service = AugmentService(arguments=arguments)
+    service.Start()
+    try:
+        server = CreateServer(address, service)
+    except (OSError, ValueError):
+        service.Close()
+        raise
+    # Signal : Terminate stops server loop (from other thread, loop waits for it)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    logging.info('(AugmentService) Listening on `%s`.', address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info('(AugmentService) Stopping.')
+    finally:
+        server.server_close()
+        service.Close()
+        path, port = ParseAddress(address)
+        if (port is None) and (os.path.exists(path)):
+            os.remove(path)
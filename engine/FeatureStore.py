@@ -0,0 +1,218 @@
+'''
+    Features store : Feature vectors kept in single raw file read by
+    memory mapping, with SQLite index keyed by image path and mtime.
+    Several processes can share one store, appends are serialized by
+    SQLite write lock. Without path store keeps vectors in memory.
+    Vectors of replaced images stay in data file, so store is compacted
+    on open when their share exceeds ratio : live vectors are rewritten
+    into new file and store generation is incremented (rows of older
+    generation are looked up again).
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import sqlite3
+import logging
+import numpy as np
+from engine.ShardReader import ShardReader
+
+# Store data file name (index file has `.sqlite` suffix appended)
+storeFilename = '.reidfeatures.bin'
+# Lookup : Paths queried by single statement
+lookupChunk = 512
+
+
+@dataclass
+class FeatureStore:
+    ''' Class storing feature vectors, memory mapped from file.'''
+    # Path to data file, None keeps vectors in memory
+    path: str = field(init=True, default=None)
+    # Dimension of feature vectors
+    dimension: int = field(init=True, default=None)
+    # Data type of stored vectors
+    dtype: str = field(init=True, default='float16')
+    # Share of stale vectors (replaced images) starting compaction
+    compactRatio: float = field(init=True, default=0.5)
+    # Count of stored vectors
+    count: int = field(init=False, default=0)
+    # Generation of rows, incremented by compaction
+    generation: int = field(init=False, default=0)
+    # Vectors : Memory map (or in memory array)
+    vectors: np.ndarray = field(init=False, repr=False, default=None)
+    # Index : Database connection
+    connection: sqlite3.Connection = field(init=False, repr=False, default=None)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        # Memory : Vectors kept in growable array
+        if (self.path is None):
+            self.vectors = np.zeros((0, self.dimension), dtype=self.dtype)
+            return
+
+        # Index : Open, journal in memory to not touch directory mtime
+        self.connection = sqlite3.connect(self.path + '.sqlite', timeout=60)
+        self.connection.execute('PRAGMA journal_mode=MEMORY')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS features (path TEXT PRIMARY KEY, mtime INTEGER, row INTEGER);
+        ''')
+
+        # Check : Store created for other dimension or type, recreate
+        meta = dict(self.connection.execute('SELECT key, value FROM meta').fetchall())
+        if (meta.get('dimension') != str(self.dimension)) or (meta.get('dtype') != self.dtype):
+            with self.connection:
+                self.connection.execute('DELETE FROM features')
+                self.connection.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                            [('dimension', str(self.dimension)),
+                                             ('dtype', self.dtype),
+                                             ('count', '0')])
+            open(self.path, 'wb').close()
+
+        self.Remap()
+
+    @staticmethod
+    def ForDirectory(path: str, dimension: int, dtype: str = 'float16') -> FeatureStore:
+        ''' Open store in directory, in memory store if not possible.'''
+        try:
+            store = FeatureStore(os.path.join(path, storeFilename), dimension, dtype)
+            store.Compact()
+            return store
+        except (sqlite3.Error, OSError) as error:
+            logging.warning('(FeatureStore) Cannot open store in `%s` : %s!', path, error)
+            return FeatureStore(None, dimension, dtype)
+
+    @property
+    def rowBytes(self) -> int:
+        ''' Size of single vector in bytes.'''
+        return self.dimension * np.dtype(self.dtype).itemsize
+
+    def Close(self):
+        ''' Close store.'''
+        if (self.connection is not None):
+            self.connection.close()
+            self.connection = None
+        self.vectors = None
+
+    def Meta(self) -> tuple:
+        ''' Return stored (count, generation) of vectors.'''
+        meta = dict(self.connection.execute('SELECT key, value FROM meta').fetchall())
+        return int(meta.get('count', 0)), int(meta.get('generation', 0))
+
+    def Remap(self):
+        ''' Memory map all vectors stored in file.'''
+        self.count, self.generation = self.Meta()
+
+        # Check : Empty store cannot be mapped
+        if (self.count == 0):
+            self.vectors = np.zeros((0, self.dimension), dtype=self.dtype)
+            return
+
+        self.vectors = np.memmap(self.path, dtype=self.dtype, mode='r',
+                                 shape=(self.count, self.dimension))
+
+    def Lookup(self, paths: list) -> np.ndarray:
+        ''' Return store rows of paths, -1 for missing or outdated.'''
+        rows = np.full(len(paths), -1, dtype=np.int64)
+
+        # Check : Memory store has no index
+        if (self.connection is None):
+            return rows
+
+        # Index : Chunks of paths, read in single transaction (same generation)
+        keys = [os.path.abspath(path) for path in paths]
+        stored = {}
+        with self.connection:
+            self.connection.execute('BEGIN')
+            for start in range(0, len(keys), lookupChunk):
+                chunk = keys[start:start + lookupChunk]
+                stored.update((path, (mtime, row)) for path, mtime, row in
+                              self.connection.execute('SELECT path, mtime, row FROM features WHERE path IN '
+                                                      f'({",".join("?" * len(chunk))})', chunk))
+            count, generation = self.Meta()
+
+        # Rows : Stored vector of unchanged file
+        for index, (path, key) in enumerate(zip(paths, keys)):
+            result = stored.get(key, None)
+            if (result is not None) and (result[0] == ShardReader.Mtime(path)):
+                rows[index] = result[1]
+
+        # Vectors : Remap if other process appended or compacted
+        if (generation != self.generation) or (count > self.count):
+            self.Remap()
+
+        return rows
+
+    def Compact(self) -> bool:
+        ''' Rewrite data file without stale vectors if their share exceeds ratio, True if compacted.'''
+        # Check : Memory store
+        if (self.connection is None):
+            return False
+
+        # Transaction : Write lock, no appends during rewrite
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            count, generation = self.Meta()
+            live = self.connection.execute('SELECT path, row FROM features ORDER BY row').fetchall()
+            # Check : Few stale vectors
+            if (count - len(live) <= self.compactRatio * count):
+                return False
+
+            # Data : Live vectors copied into new file, replacing old one
+            rows = np.array([row for _, row in live], dtype=np.int64)
+            vectors = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(count, self.dimension))
+            with open(self.path + '.compact', 'wb') as file:
+                for start in range(0, len(rows), lookupChunk):
+                    file.write(np.ascontiguousarray(vectors[rows[start:start + lookupChunk]]).tobytes())
+            del vectors
+            os.replace(self.path + '.compact', self.path)
+
+            # Index : New rows, count and generation
+            self.connection.executemany('UPDATE features SET row=? WHERE path=?',
+                                        [(row, path) for row, (path, _) in enumerate(live)])
+            self.connection.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                        [('count', str(len(live))), ('generation', str(generation + 1))])
+
+        logging.info('(FeatureStore) Compacted `%s` : %u of %u vectors kept.', self.path, len(live), count)
+        self.Remap()
+        return True
+
+    def Write(self, paths: list, features: np.ndarray) -> np.ndarray:
+        ''' Append vectors of paths, return their store rows.'''
+        features = np.ascontiguousarray(features, dtype=self.dtype)
+
+        # Memory : Append to array, capacity doubled when full
+        if (self.connection is None):
+            start = self.count
+            self.count = start + len(features)
+            if (self.count > len(self.vectors)):
+                vectors = np.zeros((max(self.count, 2 * len(self.vectors)), self.dimension),
+                                   dtype=self.dtype)
+                vectors[:start] = self.vectors[:start]
+                self.vectors = vectors
+            self.vectors[start:self.count] = features
+            return np.arange(start, self.count)
+
+        # Transaction : Write lock serializes appends of all processes
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            start = int(self.connection.execute("SELECT value FROM meta WHERE key='count'").fetchone()[0])
+
+            # Data : Write vectors at end of stored ones
+            with open(self.path, 'r+b') as file:
+                file.seek(start * self.rowBytes)
+                file.write(features.tobytes())
+
+            # Index : Store rows
+            rows = np.arange(start, start + len(features))
+            self.connection.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?)',
+                                        [(os.path.abspath(path), ShardReader.Mtime(path), row)
+                                         for path, row in zip(paths, rows.tolist())])
+            self.connection.execute("UPDATE meta SET value=? WHERE key='count'",
+                                    (str(start + len(features)),))
+
+        self.Remap()
+        return rows
+
+    def Read(self, rows: np.ndarray) -> np.ndarray:
+        ''' Return vectors of store rows.'''
+        return self.vectors[rows]
@@ -0,0 +1,117 @@
+'''
+    Multi-index hashing of 64-bit perceptual hashes for Hamming radius
+    queries. Hash is split into `radius + 1` chunks, by pigeonhole rule
+    two hashes within radius share at least one equal chunk. Hashes are
+    sorted by every chunk, so candidates are hashes in same chunk bucket,
+    only those are verified by exact Hamming distance. Pairs of big
+    buckets (blank or identical images) are verified in blocks, so memory
+    is bounded, and pair is kept only in first chunk it shares (no
+    duplicates across chunks).
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import numpy as np
+from helpers.hashing import HammingDistance
+
+# Pairs : Bucket members compared at once (block x block distances)
+pairBlock = 1024
+
+
+@dataclass
+class HashIndex:
+    ''' Class of multi-index hashing for Hamming radius search.'''
+    # Hamming radius supported by index
+    radius: int = field(init=True, default=4)
+    # Hashes (uint64)
+    hashes: np.ndarray = field(init=False, repr=False, default=None)
+    # Chunks : Bit shifts and masks
+    shifts: list = field(init=False, repr=False, default_factory=list)
+    masks: list = field(init=False, repr=False, default_factory=list)
+    # Chunks : Per chunk (sorted chunk values, order of hashes)
+    tables: list = field(init=False, repr=False, default_factory=list)
+
+    @property
+    def count(self) -> int:
+        ''' Count of indexed hashes.'''
+        return 0 if (self.hashes is None) else len(self.hashes)
+
+    def Build(self, hashes: np.ndarray):
+        ''' Build index of uint64 hashes.'''
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+
+        # Chunks : Split 64 bits into radius + 1 chunks
+        chunks = min(self.radius + 1, 64)
+        bounds = [(64 * index) // chunks for index in range(chunks + 1)]
+        self.shifts = [np.uint64(bounds[index]) for index in range(chunks)]
+        self.masks = [np.uint64((1 << (bounds[index + 1] - bounds[index])) - 1) for index in range(chunks)]
+
+        # Tables : Hashes sorted by chunk value
+        self.tables = []
+        for shift, mask in zip(self.shifts, self.masks):
+            values = (self.hashes >> shift) & mask
+            order = np.argsort(values, kind='stable')
+            self.tables.append((values[order], order))
+
+    def Query(self, hash: int, radius: int = None) -> tuple:
+        ''' Return (indices, distances) of hashes within radius of hash.'''
+        radius = self.radius if (radius is None) else min(radius, self.radius)
+        hash = np.uint64(hash)
+
+        # Candidates : Hashes with any equal chunk
+        candidates = []
+        for (values, order), shift, mask in zip(self.tables, self.shifts, self.masks):
+            value = (hash >> shift) & mask
+            start, end = np.searchsorted(values, [value, value + np.uint64(1)])
+            candidates.append(order[start:end])
+        candidates = np.unique(np.concatenate(candidates))
+
+        # Verify : Exact distance
+        distances = HammingDistance(self.hashes[candidates], hash)
+        found = distances <= radius
+        return candidates[found], distances[found]
+
+    def NearDuplicates(self, radius: int = None) -> np.ndarray:
+        ''' Return (N,3) array of (index1, index2, distance) pairs within radius, index1 < index2.'''
+        radius = self.radius if (radius is None) else min(radius, self.radius)
+        pairs = []
+
+        for chunk, (values, order) in enumerate(self.tables):
+            # Buckets : Runs of equal chunk value with more than one hash
+            starts = np.flatnonzero(np.diff(values) != 0) + 1
+            starts = np.concatenate([[0], starts])
+            ends = np.append(starts[1:], len(values))
+            buckets = np.flatnonzero((ends - starts) > 1)
+
+            for bucket in buckets.tolist():
+                members = np.sort(order[starts[bucket]:ends[bucket]])
+                pairs.extend(self.BucketPairs(members, chunk, radius))
+
+        # Check : No pairs
+        if (len(pairs) == 0):
+            return np.zeros((0, 3), dtype=np.int64)
+
+        # Pairs : Sorted by first and second index
+        pairs = np.concatenate(pairs).astype(np.int64)
+        return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+    def BucketPairs(self, members: np.ndarray, chunk: int, radius: int):
+        ''' Yield (index1, index2, distance) arrays of pairs of sorted bucket members
+            within radius, compared by blocks, pairs sharing earlier chunk skipped.'''
+        for rowStart in range(0, len(members), pairBlock):
+            rows = members[rowStart:rowStart + pairBlock]
+            for columnStart in range(rowStart, len(members), pairBlock):
+                columns = members[columnStart:columnStart + pairBlock]
+                distances = HammingDistance(self.hashes[rows][:, None], self.hashes[columns][None, :])
+                found = distances <= radius
+                # Diagonal block : Upper triangle only (index1 < index2)
+                if (columnStart == rowStart):
+                    found &= np.triu(np.ones(found.shape, dtype=bool), k=1)
+                first, second = np.nonzero(found)
+
+                # Chunks : Pair found in earlier chunk already
+                xor = self.hashes[rows[first]] ^ self.hashes[columns[second]]
+                keep = np.ones(len(first), dtype=bool)
+                for shift, mask in zip(self.shifts[:chunk], self.masks[:chunk]):
+                    keep &= ((xor >> shift) & mask) != 0
+
+                yield np.stack([rows[first[keep]], columns[second[keep]], distances[first[keep], second[keep]]], axis=1)
@@ -3,11 +3,10 @@
 
 '''
 from __future__ import annotations
-from dataclasses import dataclass, field
-from functools import cached_property
-import shutil
-from engine.ReidFileInfo import ReidDataset, ReidFileInfo
+from dataclasses import InitVar, dataclass, field
+from engine.ReidFileInfo import ReidDataset
 from engine.ImageData import ImageData
+from engine.ReidCatalog import ReidCatalog
 import numpy as np
 
 
@@ -16,101 +15,109 @@ class Identity:
     ''' Class representing identity with all images.'''
     # Identity number :
     number: int = field(init=True, default=None)
-    # Identity ImageData list
-    images: list = field(init=True, default=None)
+    # Identity ImageData list : Initial images, added to catalog (read back by `images`)
+    images: InitVar[list] = None
     # Identity dataset type
     dataset: ReidDataset = field(init=True, default=ReidDataset.AispReid)
+    # Catalog storing identity images
+    catalog: ReidCatalog = field(init=True, default=None, repr=False)
 
-    def __post_init__(self):
+    def __post_init__(self, images: list):
         ''' Post init.'''
-        # Check : Invalid images list
-        if (self.images is None):
-            self.images = []
+        # Check : Standalone identity, own catalog
+        if (self.catalog is None):
+            self.catalog = ReidCatalog()
 
-        # Similarity matrix : Default is None
+        # Images : Initial images stored in catalog
+        for image in images or []:
+            self.AddImage(image)
+
+    @property
+    def rows(self) -> np.ndarray:
+        ''' Return catalog rows of identity images.'''
+        return self.catalog.Rows(self.number)
 
     @property
     def image(self) -> ImageData:
         ''' Return first image.'''
         # Check : Images list is not empty
-        if (len(self.images) == 0):
+        if (self.images_count == 0):
             return None
 
-        return self.images[0]
+        return self.catalog.Image(self.rows[0])
 
     @property
     def images_count(self) -> int:
         ''' Count of images.'''
-        return len(self.images)
+        return self.catalog.Count(self.number)
 
     @property
     def last_frame(self) -> int:
         ''' Return last frame number.'''
-        # Check : Images list is not empty
-        if (len(self.images) == 0):
-            return 0
-
-        # Maximum frame number
-        return  max([image.frame for image in self.images])
+        return self.catalog.LastFrame(self.number)
 
-    @cached_property
+    @property
     def hue(self) -> float:
-        ''' Return average hue of all images.'''
+        ''' Return average (circular) hue of all images.'''
+        # Get hue : Computed only
+        hue = self.catalog.hue[self.rows]
+        hue = hue[~np.isnan(hue)]
         # Check : Images list is not empty
-        if (len(self.images) == 0):
+        if (len(hue) == 0):
             return None
 
-        # Get hue
-        hue = [image.visuals.hue for image in self.images]
-        return np.mean(hue)
+        angle = np.deg2rad(hue)
+        return float(np.rad2deg(np.arctan2(np.sin(angle).mean(), np.cos(angle).mean())) % 360)
 
-    @cached_property
+    @property
     def brightness(self) -> float:
         ''' Return average brightness of all images.'''
+        # Get brightness : Computed only
+        brightness = self.catalog.brightness[self.rows]
         # Check : Images list is not empty
-        if (len(self.images) == 0):
+        if (np.all(np.isnan(brightness))):
             return None
 
-        # Get brightness
-        brightness = [image.visuals.brightness for image in self.images]
-        return np.mean(brightness)
+        return float(np.nanmean(brightness))
 
-    @cached_property
+    @property
     def saturation(self) -> float:
         ''' Return average saturation of all images.'''
+        # Get saturation : Computed only
+        saturation = self.catalog.saturation[self.rows]
         # Check : Images list is not empty
-        if (len(self.images) == 0):
+        if (np.all(np.isnan(saturation))):
             return None
 
-        # Get saturation
-        saturation = [image.visuals.saturation for image in self.images]
-        return np.mean(saturation)
+        return float(np.nanmean(saturation))
 
-    @cached_property
+    @property
     def imhash(self) -> float:
         ''' Return average imhash of all images.'''
+        # Get imhash : Computed only
+        rows = self.rows
+        imhash = self.catalog.dhash[rows][self.catalog.dhash_valid[rows]]
         # Check : Images list is not empty
-        if (len(self.images) == 0):
+        if (len(imhash) == 0):
             return None
 
-        # Get imhash
-        imhash = [image.visuals.dhash for image in self.images]
-        return np.mean(imhash)
+        return np.mean(imhash.astype(np.float64))
 
-    @cached_property
+    @property
     def features(self) -> np.array:
-        ''' Return average features of all np.arrays.'''
+        ''' Return median features of all images.'''
         # Check : Images list is not empty
-        if (len(self.images) == 0):
+        if (self.images_count == 0):
             return None
 
         # Get features
-        features = [image.features for image in self.images]
-        # Get average
-        average = np.median(features, axis=0)
-
-        return average
+        features = self.catalog.Features(self.rows)
+        # Check : Features not computed
+        if (features is None):
+            return None
 
+        # Get median
+        return np.median(features.astype(np.float32), axis=0)
 
     def AddImage(self, image: ImageData):
         ''' Add image to identity.'''
@@ -119,5 +126,14 @@ class Identity:
             return None
 
         # Add image
-        self.images.append(image)
-        sorted(self.images, key=lambda image: image.frame)
+        self.catalog.Append(self.number, image.path, image.camera, image.frame)
+
+
+def IdentityImages(identity: Identity) -> tuple:
+    ''' Return read only tuple of identity ImageData (created from catalog),
+        images are added by Identity.AddImage.'''
+    return tuple(identity.catalog.Image(row) for row in identity.rows)
+
+
+# Images : Read only view replacing init only `images` argument
+Identity.images = property(IdentityImages)
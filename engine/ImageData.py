@@ -4,6 +4,7 @@
 from dataclasses import dataclass, field
 import numpy as np
 import os
+from engine.ImageVisuals import ImageVisuals
 
 
 
@@ -18,6 +19,8 @@ class ImageData:
     frame: int = field(init=True, default=1)
     # Image features
     features: np.array = field(init=True, default=None)
+    # Image visuals
+    visuals: ImageVisuals = field(init=True, default=None)
 
     @property
     def location(self) -> str:
@@ -0,0 +1,17 @@
+'''
+   Visual informations of single image.
+'''
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ImageVisuals:
+    ''' Dataclass representing image visual informations.'''
+    # Perceptual difference hash (64-bit)
+    dhash: int = field(init=True, default=None)
+    # Average hue (degrees 0..360)
+    hue: float = field(init=True, default=None)
+    # Average brightness (0..1)
+    brightness: float = field(init=True, default=None)
+    # Average saturation (0..1)
+    saturation: float = field(init=True, default=None)
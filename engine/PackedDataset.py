@@ -0,0 +1,162 @@
+'''
+    Packed reid dataset : all encoded images in single memory mappable
+    file for training data loaders. Images are sorted by identity and
+    stored as contiguous encoded bytes followed by aligned tables :
+
+        header   : magic, version, images count, identities count,
+                   offsets of sections below
+        data     : encoded images bytes
+        offsets  : int64 (N+1) images data offsets
+        identity, camera, frame : int32 (N) columns
+        names    : int64 (N+1) names offsets + names bytes
+        identities : int32 (K) identities
+        starts   : int64 (K+1) first image index of every identity
+
+    Reader maps whole file once, images are returned as zero-copy
+    views of mapped data, without any per-file open or stat.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import struct
+import cv2
+import numpy as np
+
+# Packed : File magic and version
+packedMagic = b'REIDPACK'
+packedVersion = 1
+# Packed : Header (magic, version, count, identities, 9 section offsets)
+headerFormat = '<8sIQQ9Q'
+headerSize = struct.calcsize(headerFormat)
+# Packed : Sections order in file and header
+sections = ['data', 'offsets', 'identity', 'camera', 'frame', 'name_offsets', 'names', 'identities', 'starts']
+
+
+def Align(file, alignment: int = 8) -> int:
+    ''' Pad file to alignment, return position.'''
+    position = file.tell()
+    padding = (-position) % alignment
+    file.write(b'\0' * padding)
+    return position + padding
+
+
+@dataclass
+class PackedDataset:
+    ''' Class reading packed reid dataset file by memory map.'''
+    # Path to packed file
+    path: str = field(init=True, default=None)
+    # Memory map of whole file
+    buffer: np.memmap = field(init=False, default=None, repr=False)
+    # Images data offsets (N+1)
+    offsets: np.ndarray = field(init=False, default=None, repr=False)
+    # Images identity, camera, frame columns (N)
+    identity: np.ndarray = field(init=False, default=None, repr=False)
+    camera: np.ndarray = field(init=False, default=None, repr=False)
+    frame: np.ndarray = field(init=False, default=None, repr=False)
+    # Images names offsets (N+1) and bytes
+    name_offsets: np.ndarray = field(init=False, default=None, repr=False)
+    names: np.ndarray = field(init=False, default=None, repr=False)
+    # Identities (K) and their first image indices (K+1)
+    identities: np.ndarray = field(init=False, default=None, repr=False)
+    starts: np.ndarray = field(init=False, default=None, repr=False)
+    # Offset of images data in file
+    dataOffset: int = field(init=False, default=0, repr=False)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        self.buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+        magic, version, count, identities, *positions = struct.unpack_from(headerFormat, self.buffer, 0)
+        # Check : Not packed dataset
+        if (magic != packedMagic) or (version != packedVersion):
+            raise ValueError(f'File `{self.path}` is not packed reid dataset!')
+
+        # Tables : Views of mapped file
+        offsets = dict(zip(sections, positions))
+        self.offsets = self.View(offsets['offsets'], np.int64, count + 1)
+        self.identity = self.View(offsets['identity'], np.int32, count)
+        self.camera = self.View(offsets['camera'], np.int32, count)
+        self.frame = self.View(offsets['frame'], np.int32, count)
+        self.name_offsets = self.View(offsets['name_offsets'], np.int64, count + 1)
+        self.names = self.View(offsets['names'], np.uint8, int(self.name_offsets[-1]))
+        self.identities = self.View(offsets['identities'], np.int32, identities)
+        self.starts = self.View(offsets['starts'], np.int64, identities + 1)
+        self.dataOffset = offsets['data']
+
+    def View(self, offset: int, dtype: type, count: int) -> np.ndarray:
+        ''' Return array view of mapped file.'''
+        return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=offset)
+
+    def __len__(self) -> int:
+        ''' Count of images.'''
+        return len(self.identity)
+
+    @staticmethod
+    def Write(path: str, images) -> int:
+        ''' Write packed file from iterable of (name, identity, camera, frame, data bytes)
+            sorted by identity, return count of images.'''
+        offsets, identity, camera, frame, names = [0], [], [], [], []
+        with open(path, 'wb') as file:
+            # Header : Placeholder, filled at end
+            file.write(b'\0' * headerSize)
+            positions = {'data': file.tell()}
+
+            # Data : Streamed encoded images
+            for name, imageIdentity, imageCamera, imageFrame, data in images:
+                file.write(data)
+                offsets.append(offsets[-1] + len(data))
+                identity.append(imageIdentity)
+                camera.append(imageCamera)
+                frame.append(imageFrame)
+                names.append(name.encode())
+
+            # Identities : Unique (sorted input) and first image indices
+            identity = np.array(identity, dtype=np.int32)
+            # Check : Input not sorted by identity
+            if (np.any(np.diff(identity) < 0)):
+                raise ValueError('Packed images must be sorted by identity!')
+            identities, starts = np.unique(identity, return_index=True)
+            starts = np.append(starts, len(identity)).astype(np.int64)
+            nameOffsets = np.cumsum([0] + [len(name) for name in names], dtype=np.int64)
+
+            # Tables : Aligned sections
+            for section, array in [('offsets', np.array(offsets, dtype=np.int64)),
+                                   ('identity', identity),
+                                   ('camera', np.array(camera, dtype=np.int32)),
+                                   ('frame', np.array(frame, dtype=np.int32)),
+                                   ('name_offsets', nameOffsets),
+                                   ('names', np.frombuffer(b''.join(names), dtype=np.uint8)),
+                                   ('identities', identities.astype(np.int32)),
+                                   ('starts', starts)]:
+                positions[section] = Align(file)
+                file.write(array.tobytes())
+
+            # Header : Counts and sections offsets
+            file.seek(0)
+            file.write(struct.pack(headerFormat, packedMagic, packedVersion, len(identity), len(identities),
+                                   *[positions[section] for section in sections]))
+
+        return len(identity)
+
+    def Bytes(self, index: int) -> np.ndarray:
+        ''' Return zero-copy view of encoded image.'''
+        return self.buffer[self.dataOffset + self.offsets[index]:self.dataOffset + self.offsets[index + 1]]
+
+    def Image(self, index: int, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        ''' Decode image by index.'''
+        return cv2.imdecode(self.Bytes(index), flags)
+
+    def Name(self, index: int) -> str:
+        ''' Return image name by index.'''
+        return self.names[self.name_offsets[index]:self.name_offsets[index + 1]].tobytes().decode()
+
+    def IdentityIndices(self, identity: int) -> range:
+        ''' Return images indices of identity (empty if unknown).'''
+        position = int(np.searchsorted(self.identities, identity))
+        # Check : Unknown identity
+        if (position == len(self.identities)) or (self.identities[position] != identity):
+            return range(0)
+
+        return range(int(self.starts[position]), int(self.starts[position + 1]))
+
+    def IdentityImages(self, identity: int) -> list:
+        ''' Decode all images of identity.'''
+        return [self.Image(index) for index in self.IdentityIndices(identity)]
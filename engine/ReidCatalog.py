@@ -0,0 +1,351 @@
+'''
+    Columnar catalog of reid images.
+
+    Images are stored as rows of NumPy columns (identity, camera, frame,
+    directory) with names kept in one string table addressed by offsets.
+    Every identity owns list of contiguous row ranges and maintained
+    counters (images count, last frame), so bookkeeping is O(1).
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import numpy as np
+from engine.ImageData import ImageData
+from engine.ImageVisuals import ImageVisuals
+from engine.FeatureStore import FeatureStore
+
+# Columns : Initial capacity
+initialCapacity = 1024
+
+
+@dataclass
+class ReidCatalog:
+    ''' Class storing all reid images in columnar arrays.'''
+    # Count of images (rows)
+    count: int = field(init=False, default=0)
+    # Directories table
+    directories: list = field(init=False, default_factory=list)
+    # Columns : Identity, camera, frame, directory index
+    identity: np.ndarray = field(init=False, repr=False, default=None)
+    camera: np.ndarray = field(init=False, repr=False, default=None)
+    frame: np.ndarray = field(init=False, repr=False, default=None)
+    directory: np.ndarray = field(init=False, repr=False, default=None)
+    # Names : Offsets into strings table
+    offsets: np.ndarray = field(init=False, repr=False, default=None)
+    strings: bytearray = field(init=False, repr=False, default_factory=bytearray)
+    # Identities : Row ranges, counts and last frames
+    ranges: dict = field(init=False, repr=False, default_factory=dict)
+    counts: dict = field(init=False, repr=False, default_factory=dict)
+    last_frames: dict = field(init=False, repr=False, default_factory=dict)
+    # Directories : Path to index lookup
+    directories_ids: dict = field(init=False, repr=False, default_factory=dict)
+    # Features : Store of vectors and per image store row (-1 missing)
+    feature_store: FeatureStore = field(init=False, repr=False, default=None)
+    feature_rows: np.ndarray = field(init=False, repr=False, default=None)
+    # Hashes : Per image dHash and validity
+    dhash: np.ndarray = field(init=False, repr=False, default=None)
+    dhash_valid: np.ndarray = field(init=False, repr=False, default=None)
+    # Visuals : Per image hue, brightness, saturation (NaN missing)
+    hue: np.ndarray = field(init=False, repr=False, default=None)
+    brightness: np.ndarray = field(init=False, repr=False, default=None)
+    saturation: np.ndarray = field(init=False, repr=False, default=None)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        self.identity = np.zeros(initialCapacity, dtype=np.int32)
+        self.camera = np.zeros(initialCapacity, dtype=np.int32)
+        self.frame = np.zeros(initialCapacity, dtype=np.int32)
+        self.directory = np.zeros(initialCapacity, dtype=np.int32)
+        self.offsets = np.zeros(initialCapacity + 1, dtype=np.int64)
+        self.feature_rows = np.full(initialCapacity, -1, dtype=np.int64)
+        self.dhash = np.zeros(initialCapacity, dtype=np.uint64)
+        self.dhash_valid = np.zeros(initialCapacity, dtype=bool)
+        self.hue = np.full(initialCapacity, np.nan, dtype=np.float32)
+        self.brightness = np.full(initialCapacity, np.nan, dtype=np.float32)
+        self.saturation = np.full(initialCapacity, np.nan, dtype=np.float32)
+
+    @property
+    def capacity(self) -> int:
+        ''' Allocated rows capacity.'''
+        return len(self.identity)
+
+    @property
+    def identities_ids(self) -> list:
+        ''' Return list of identities ids.'''
+        return list(self.ranges.keys())
+
+    @property
+    def nbytes(self) -> int:
+        ''' Memory used by columns and strings.'''
+        return (self.identity.nbytes + self.camera.nbytes + self.frame.nbytes +
+                self.directory.nbytes + self.offsets.nbytes + self.feature_rows.nbytes +
+                self.dhash.nbytes + self.dhash_valid.nbytes + self.hue.nbytes +
+                self.brightness.nbytes + self.saturation.nbytes + len(self.strings))
+
+    def Reserve(self, count: int):
+        ''' Grow columns to hold at least `count` rows.'''
+        # Check : Enough capacity
+        if (count <= self.capacity):
+            return
+
+        # Capacity : Double until enough
+        capacity = self.capacity
+        while (capacity < count):
+            capacity *= 2
+
+        # Columns : Resize (copies data, zero fills rest)
+        self.identity = np.resize(self.identity, capacity)
+        self.camera = np.resize(self.camera, capacity)
+        self.frame = np.resize(self.frame, capacity)
+        self.directory = np.resize(self.directory, capacity)
+        self.offsets = np.resize(self.offsets, capacity + 1)
+        self.feature_rows = np.resize(self.feature_rows, capacity)
+        self.feature_rows[self.count:] = -1
+        self.dhash = np.resize(self.dhash, capacity)
+        self.dhash_valid = np.resize(self.dhash_valid, capacity)
+        self.dhash_valid[self.count:] = False
+        self.hue = np.resize(self.hue, capacity)
+        self.brightness = np.resize(self.brightness, capacity)
+        self.saturation = np.resize(self.saturation, capacity)
+        self.hue[self.count:] = np.nan
+        self.brightness[self.count:] = np.nan
+        self.saturation[self.count:] = np.nan
+
+    def AddDirectory(self, path: str) -> int:
+        ''' Return index of directory, adds if not exists.'''
+        if (path not in self.directories_ids):
+            self.directories_ids[path] = len(self.directories)
+            self.directories.append(path)
+
+        return self.directories_ids[path]
+
+    def AddRange(self, identity: int, start: int, end: int, last_frame: int):
+        ''' Attach rows range to identity.'''
+        # Identity : Create if not exists
+        if (identity not in self.ranges):
+            self.ranges[identity] = []
+            self.counts[identity] = 0
+            self.last_frames[identity] = 0
+
+        # Ranges : Extend last range if contiguous
+        ranges = self.ranges[identity]
+        if (len(ranges) != 0) and (ranges[-1][1] == start):
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+
+        # Counters : Update
+        self.counts[identity] += end - start
+        self.last_frames[identity] = max(self.last_frames[identity], last_frame)
+
+    def Extend(self,
+               directory: str,
+               names: list,
+               identities,
+               cameras,
+               frames,
+               visuals: dict = None) -> np.ndarray:
+        ''' Bulk add images of one directory (optional visuals columns), return unique identities.'''
+        # Check : Nothing to add
+        if (len(names) == 0):
+            return np.zeros(0, dtype=np.int32)
+
+        identities = np.asarray(identities, dtype=np.int32)
+        cameras = np.asarray(cameras, dtype=np.int32)
+        frames = np.asarray(frames, dtype=np.int32)
+
+        # Order : Group rows by identity, keeping original order
+        order = np.argsort(identities, kind='stable')
+        identities = identities[order]
+
+        # Rows : Reserve and fill columns
+        start = self.count
+        end = start + len(names)
+        self.Reserve(end)
+        self.identity[start:end] = identities
+        self.camera[start:end] = cameras[order]
+        self.frame[start:end] = frames[order]
+        self.directory[start:end] = self.AddDirectory(directory)
+
+        # Visuals : Optional columns (NaN / None missing)
+        if (visuals is not None):
+            rows = np.arange(start, end)
+            self.SetVisuals(rows, {key: np.asarray(values)[order] for key, values in visuals.items()})
+
+        # Names : Append encoded names to strings table
+        encoded = [names[index].encode() for index in order]
+        lengths = np.fromiter((len(name) for name in encoded), dtype=np.int64, count=len(encoded))
+        self.offsets[start+1:end+1] = self.offsets[start] + np.cumsum(lengths)
+        self.strings += b''.join(encoded)
+        self.count = end
+
+        # Identities : Attach contiguous ranges
+        unique, starts, counts = np.unique(identities, return_index=True, return_counts=True)
+        maximums = np.maximum.reduceat(self.frame[start:end], starts)
+        for identity, first, count, last_frame in zip(unique.tolist(), starts.tolist(),
+                                                      counts.tolist(), maximums.tolist()):
+            self.AddRange(identity, start + first, start + first + count, last_frame)
+
+        return unique
+
+    def Append(self, identity: int, path: str, camera: int, frame: int) -> int:
+        ''' Add single image, return its row.'''
+        row = self.count
+        self.Reserve(row + 1)
+
+        # Row : Fill columns
+        self.identity[row] = identity
+        self.camera[row] = camera
+        self.frame[row] = frame
+        self.directory[row] = self.AddDirectory(os.path.dirname(path))
+
+        # Name : Append to strings table
+        encoded = os.path.basename(path).encode()
+        self.offsets[row + 1] = self.offsets[row] + len(encoded)
+        self.strings += encoded
+        self.count = row + 1
+
+        # Identity : Attach row
+        self.AddRange(identity, row, row + 1, frame)
+
+        return row
+
+    def Truncate(self, count: int):
+        ''' Remove rows added after first `count` rows, identities counters recomputed.'''
+        # Check : Nothing to remove
+        if (count >= self.count):
+            return
+
+        # Identities : Cut ranges of identities owning removed rows
+        for identity in np.unique(self.identity[count:self.count]).tolist():
+            ranges = [(start, min(end, count)) for start, end in self.ranges[identity] if (start < count)]
+            if (len(ranges) == 0):
+                del self.ranges[identity], self.counts[identity], self.last_frames[identity]
+                continue
+
+            self.ranges[identity] = ranges
+            self.counts[identity] = sum(end - start for start, end in ranges)
+            self.last_frames[identity] = max(int(self.frame[start:end].max()) for start, end in ranges)
+
+        # Columns : Removed rows reset to missing
+        self.feature_rows[count:self.count] = -1
+        self.dhash_valid[count:self.count] = False
+        self.hue[count:self.count] = np.nan
+        self.brightness[count:self.count] = np.nan
+        self.saturation[count:self.count] = np.nan
+        del self.strings[self.offsets[count]:]
+        self.count = count
+
+    def Move(self, rows: np.ndarray, directory: str):
+        ''' Move images of rows (same names) to directory.'''
+        self.directory[rows] = self.AddDirectory(directory)
+
+    def DirectoryRows(self, directory: str) -> np.ndarray:
+        ''' Return rows of images in directory.'''
+        # Check : Unknown directory
+        if (directory not in self.directories_ids):
+            return np.zeros(0, dtype=np.int64)
+
+        return np.flatnonzero(self.directory[:self.count] == self.directories_ids[directory])
+
+    def Rows(self, identity: int) -> np.ndarray:
+        ''' Return rows of identity.'''
+        # Check : Unknown identity
+        if (identity not in self.ranges):
+            return np.zeros(0, dtype=np.int64)
+
+        return np.concatenate([np.arange(start, end) for start, end in self.ranges[identity]])
+
+    def Count(self, identity: int) -> int:
+        ''' Return count of identity images.'''
+        return self.counts.get(identity, 0)
+
+    def LastFrame(self, identity: int) -> int:
+        ''' Return last frame number of identity.'''
+        return self.last_frames.get(identity, 0)
+
+    def Name(self, row: int) -> str:
+        ''' Return image name of row.'''
+        return self.strings[self.offsets[row]:self.offsets[row + 1]].decode()
+
+    def Path(self, row: int) -> str:
+        ''' Return image path of row.'''
+        return os.path.join(self.directories[self.directory[row]], self.Name(row))
+
+    def OpenFeatures(self, store: FeatureStore):
+        ''' Attach features store, link rows already stored.'''
+        self.feature_store = store
+
+        # Rows : Lookup stored vectors by path and mtime
+        paths = [self.Path(row) for row in range(self.count)]
+        self.feature_rows[:self.count] = store.Lookup(paths)
+
+    def SetFeatures(self, rows: np.ndarray, features: np.ndarray):
+        ''' Store features vectors of rows.'''
+        # Store : In memory if not attached
+        if (self.feature_store is None):
+            self.feature_store = FeatureStore(None, features.shape[1])
+
+        paths = [self.Path(row) for row in rows]
+        generation = self.feature_store.generation
+        self.feature_rows[rows] = self.feature_store.Write(paths, features)
+
+        # Store : Compacted by other process, stored rows linked again
+        if (self.feature_store.generation != generation):
+            self.feature_rows[:self.count] = self.feature_store.Lookup([self.Path(row) for row in range(self.count)])
+
+    def Features(self, rows: np.ndarray) -> np.ndarray:
+        ''' Return features of rows, None if any is missing.'''
+        # Check : Features missing
+        storeRows = self.feature_rows[rows]
+        if (self.feature_store is None) or (np.any(storeRows < 0)):
+            return None
+
+        return self.feature_store.Read(storeRows)
+
+    def MissingFeatures(self) -> np.ndarray:
+        ''' Return rows without features.'''
+        return np.flatnonzero(self.feature_rows[:self.count] < 0)
+
+    def SetHashes(self, rows: np.ndarray, hashes: np.ndarray):
+        ''' Store dHash of rows.'''
+        self.dhash[rows] = hashes
+        self.dhash_valid[rows] = True
+
+    def MissingHashes(self) -> np.ndarray:
+        ''' Return rows without dHash.'''
+        return np.flatnonzero(~self.dhash_valid[:self.count])
+
+    def SetVisuals(self, rows: np.ndarray, visuals: dict):
+        ''' Store visuals (hue, brightness, saturation, dhash) of rows, NaN/None missing.'''
+        for key in ['hue', 'brightness', 'saturation']:
+            if (key in visuals):
+                getattr(self, key)[rows] = np.asarray(visuals[key], dtype=np.float32)
+
+        # Hash : Only given hashes
+        if ('dhash' in visuals):
+            hashes = np.asarray(visuals['dhash'], dtype=object)
+            valid = np.array([value is not None for value in hashes], dtype=bool)
+            self.SetHashes(np.asarray(rows)[valid], hashes[valid].astype(np.uint64))
+
+    def MissingVisuals(self) -> np.ndarray:
+        ''' Return rows without visuals.'''
+        return np.flatnonzero(np.isnan(self.hue[:self.count]) | (~self.dhash_valid[:self.count]))
+
+    def Visuals(self, row: int) -> ImageVisuals:
+        ''' Return ImageVisuals of row, None if not computed.'''
+        if (not self.dhash_valid[row]) and (np.isnan(self.hue[row])):
+            return None
+
+        return ImageVisuals(dhash=int(self.dhash[row]) if (self.dhash_valid[row]) else None,
+                            hue=float(self.hue[row]),
+                            brightness=float(self.brightness[row]),
+                            saturation=float(self.saturation[row]))
+
+    def Image(self, row: int) -> ImageData:
+        ''' Return ImageData of row.'''
+        return ImageData(path=self.Path(row),
+                         camera=int(self.camera[row]),
+                         frame=int(self.frame[row]),
+                         features=self.Features(row),
+                         visuals=self.Visuals(row))
@@ -7,12 +7,149 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from enum import Enum
 import re
+import numpy as np
 
 
 class ReidDataset(str, Enum):
     ''' Enum with reid datasets.'''
     AispReid = 'aispreid'
     Market1501 = 'market1501'
+    DukeMTMC = 'dukemtmc'
+    MSMT17 = 'msmt17'
+
+
+# Frame : Sequence multiplier of sequence numbered datasets (Market1501)
+sequenceFrames = 1000000
+
+
+@dataclass
+class ReidFormat:
+    ''' Filename format of reid dataset.'''
+    # Reid dataset type
+    dataset: ReidDataset = field(init=True, default=None)
+    # Pattern with identity, camera, frame (optional sequence) named groups
+    pattern: str = field(init=True, default=None)
+    # Template of output filename (identity, camera, frame, sequence)
+    template: str = field(init=True, default=None)
+    # Identities not being persons (junk, distractors), names skipped
+    ignored: tuple = field(init=True, default=())
+    # Compiled pattern
+    compiled: re.Pattern = field(init=False, default=None, repr=False)
+    # Compiled pattern matching lines of joined names (see FromFilenames)
+    lines: re.Pattern = field(init=False, default=None, repr=False)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        self.compiled = re.compile(self.pattern)
+        self.lines = re.compile('^' + self.LinePattern(self.pattern), re.MULTILINE)
+
+    @staticmethod
+    def LinePattern(pattern: str) -> str:
+        ''' Return pattern matched from line start (anchored or searched in line).'''
+        return pattern[1:] if pattern.startswith('^') else r'[^\n]*?' + pattern
+
+    @staticmethod
+    def Frame(frame: int, sequence: int = None) -> int:
+        ''' Return frame number merged with sequence number.'''
+        return frame if (sequence is None) else sequence * sequenceFrames + frame
+
+    def Parse(self, filename: str) -> ReidFileInfo:
+        ''' Parse filename, None if not matching.'''
+        match = self.compiled.search(filename)
+        if (match is None):
+            return None
+
+        groups = match.groupdict()
+        # Check : Not person identity
+        if (int(groups['identity']) in self.ignored):
+            return None
+
+        sequence = groups.get('sequence', None)
+        return ReidFileInfo(int(groups['identity']),
+                            int(groups['camera']),
+                            self.Frame(int(groups['frame']), None if (sequence is None) else int(sequence)),
+                            self.dataset)
+
+    @staticmethod
+    def Values(columns: np.ndarray, groups: dict) -> tuple:
+        ''' Return (identity, camera, frame) arrays of matched groups strings,
+            groups are columns indices by group name.'''
+        identity = columns[:, groups['identity']].astype(np.int64)
+        camera = columns[:, groups['camera']].astype(np.int64)
+        frame = columns[:, groups['frame']].astype(np.int64)
+        if ('sequence' in groups):
+            frame += columns[:, groups['sequence']].astype(np.int64) * sequenceFrames
+
+        return identity, camera, frame
+
+    def Valid(self, identity: np.ndarray) -> np.ndarray:
+        ''' Return mask of person identities (not ignored).'''
+        return ~np.isin(identity, self.ignored)
+
+    def Path(self, identity: int, camera: int, frame: int) -> str:
+        ''' Return filename of identity image.'''
+        sequence, sequenceFrame = divmod(frame, sequenceFrames)
+        return self.template.format(identity=identity,
+                                    camera=camera,
+                                    frame=frame if ('{sequence' not in self.template) else sequenceFrame,
+                                    sequence=sequence)
+
+
+# Formats : Registered reid dataset formats, matched in order
+reidFormats = {}
+# Bulk : Combined pattern of all formats (see BulkPattern)
+bulkPattern = None
+
+
+def RegisterFormat(reidFormat: ReidFormat):
+    ''' Register reid dataset format.'''
+    reidFormats[reidFormat.dataset] = reidFormat
+    # Bulk : Combined pattern rebuilt on next bulk parse
+    global bulkPattern
+    bulkPattern = None
+
+
+# AISP : ID1_CAM2_FRAME3.jpeg, anywhere in name
+RegisterFormat(ReidFormat(ReidDataset.AispReid,
+                          r'ID(?P<identity>-?\d+)_CAM(?P<camera>\d+)_FRAME(?P<frame>\d+)',
+                          'ID{identity}_CAM{camera}_FRAME{frame}.jpeg'))
+# Market1501 : 0002_c1s1_000451_03.jpg (identity, camera, sequence, frame, box),
+# junk (-1) and distractors (0000) skipped
+RegisterFormat(ReidFormat(ReidDataset.Market1501,
+                          r'^(?P<identity>-?\d+)_c(?P<camera>\d+)s(?P<sequence>\d+)_(?P<frame>\d+)_\d+',
+                          '{identity:04d}_c{camera}s{sequence}_{frame:06d}_00.jpg',
+                          ignored=(-1, 0)))
+# DukeMTMC : 0001_c2_f0046182.jpg (identity, camera, frame)
+RegisterFormat(ReidFormat(ReidDataset.DukeMTMC,
+                          r'^(?P<identity>-?\d+)_c(?P<camera>\d+)_f(?P<frame>\d+)',
+                          '{identity:04d}_c{camera}_f{frame:07d}.jpg'))
+# MSMT17 : 0000_000_01_0303morning_0015_0.jpg (identity, index, camera, time, frame)
+RegisterFormat(ReidFormat(ReidDataset.MSMT17,
+                          r'^(?P<identity>\d+)_(?P<frame>\d+)_(?P<camera>\d+)_[0-9a-z]+_\d+_\d+',
+                          '{identity:04d}_{frame:03d}_{camera:02d}_0000generated_0000_0.jpg'))
+
+
+def BulkPattern() -> tuple:
+    ''' Return (compiled pattern, formats groups) matching every line of joined
+        names, with named groups of every format prefixed by format number.'''
+    global bulkPattern
+    if (bulkPattern is None):
+        alternatives, groups = [], []
+        for number, reidFormat in enumerate(reidFormats.values()):
+            # Groups : Unique names in combined pattern
+            prefix = f'f{number}_'
+            alternatives.append('(?:' + ReidFormat.LinePattern(reidFormat.pattern.replace('(?P<', f'(?P<{prefix}')) + ')')
+            groups.append((reidFormat, prefix))
+
+        # Pattern : Optional formats alternation, so every line matches once
+        compiled = re.compile(r'^(?:' + '|'.join(alternatives) + r')?[^\n]*$', re.MULTILINE)
+        # Groups : Columns indices of every format groups
+        bulkPattern = (compiled, [(reidFormat, {name[len(prefix):]: index - 1
+                                                for name, index in compiled.groupindex.items()
+                                                if name.startswith(prefix)})
+                                  for reidFormat, prefix in groups])
+
+    return bulkPattern
 
 
 @dataclass
@@ -33,41 +170,80 @@ class ReidFileInfo:
                frame_number: int,
                dataset: ReidDataset) -> str:
         ''' According to dataset type return path to image.'''
-        # AISP Reid
-        if dataset == ReidDataset.AispReid:
-            return f'ID{identity_number}_CAM{camera_number}_FRAME{frame_number}.jpeg'
-
-        # Market1501
-        if dataset == ReidDataset.Market1501:
-            return None
+        # Check : Unknown dataset format
+        if (dataset not in reidFormats):
+            raise ValueError(f'Unknown reid dataset `{dataset}`!')
 
-        return None
+        return reidFormats[dataset].Path(identity_number, camera_number, frame_number)
 
     @staticmethod
     def PatternAispReid(text: str) -> ReidFileInfo:
         ''' Parse AISP reid filename.'''
-        # Filename pattern
-        pattern = re.compile(r'ID([-\d]+)_CAM([\d]+)_FRAME([\d]+)')
-
-        # Regular expression : Get results
-        regexResults = pattern.search(text)
-        if regexResults is None:
-            return None
-
-        # Get pid, camid, frame
-        pid, camid, frame = map(int, regexResults.groups())
-
-        return ReidFileInfo(pid, camid, frame)
+        return reidFormats[ReidDataset.AispReid].Parse(text)
 
     @staticmethod
     def FromFilename(filename: str) -> ReidFileInfo:
         ''' Create fileinfo from filename.'''
-        # Patter : AISP
-        result = ReidFileInfo.PatternAispReid(filename)
-        if result is not None:
-            return result
-
-        # Pattern : Market1501
-        # @TODO
+        # Patterns : First matching format
+        for reidFormat in reidFormats.values():
+            result = reidFormat.Parse(filename)
+            if (result is not None):
+                return result
 
         return None
+
+    @staticmethod
+    def FromFilenames(filenames: list) -> tuple:
+        ''' Parse list of filenames in single pass, return (valid, identity,
+            camera, frame, dataset) arrays, dataset as values strings.'''
+        count = len(filenames)
+        valid = np.zeros(count, dtype=bool)
+        identity = np.zeros(count, dtype=np.int64)
+        camera = np.zeros(count, dtype=np.int64)
+        frame = np.zeros(count, dtype=np.int64)
+        dataset = np.full(count, None, dtype=object)
+        # Check : Empty list
+        if (count == 0):
+            return valid, identity, camera, frame, dataset
+
+        # Check : Names with new lines, parse one by one
+        text = '\n'.join(filenames)
+        if (text.count('\n') != count - 1):
+            for index, filename in enumerate(filenames):
+                reidInfo = ReidFileInfo.FromFilename(filename)
+                if (reidInfo is not None):
+                    valid[index] = True
+                    identity[index], camera[index], frame[index] = reidInfo.identity, reidInfo.camera, reidInfo.frame
+                    dataset[index] = reidInfo.dataset.value
+            return valid, identity, camera, frame, dataset
+
+        # Fast path : Listing of single format (every line matched by first
+        # format with any match), parsed by its pattern only
+        for reidFormat in reidFormats.values():
+            matches = reidFormat.lines.findall(text)
+            if (len(matches) == count):
+                columns = np.array(matches, dtype=object).reshape(count, -1)
+                identity, camera, frame = reidFormat.Values(columns, {name: index - 1 for name, index in
+                                                                      reidFormat.lines.groupindex.items()})
+                valid = reidFormat.Valid(identity)
+                dataset[valid] = reidFormat.dataset.value
+                return valid, identity, camera, frame, dataset
+            # Check : Mixed listing
+            if (len(matches) != 0):
+                break
+
+        # Match : Single regex pass over joined names, every line matched once
+        compiled, groups = BulkPattern()
+        columns = np.array(compiled.findall(text), dtype=object).reshape(count, -1)
+        for reidFormat, formatGroups in groups:
+            matched = columns[:, formatGroups['identity']] != ''
+            # Check : No names of format
+            if (not matched.any()):
+                continue
+
+            identity[matched], camera[matched], frame[matched] = reidFormat.Values(columns[matched], formatGroups)
+            matched[matched] = reidFormat.Valid(identity[matched])
+            valid |= matched
+            dataset[matched] = reidFormat.dataset.value
+
+        return valid, identity, camera, frame, dataset
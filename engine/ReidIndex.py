@@ -0,0 +1,171 @@
+'''
+    Persistent index of reid dataset images stored in SQLite file
+    next to the dataset. Every indexed directory (keyed by path relative
+    to dataset root) is validated by its modification time, changed
+    directories are updated incrementally (only new files are parsed,
+    removed files are dropped). Subdirectories are stored too, so
+    unchanged tree is walked without listing any directory.
+
+    Index is written through rollback journal (kept as file, so directory
+    entries and root mtime are not changed by every commit) with synced
+    commits, so crash does not corrupt it. Damaged index (any database
+    error) is dropped and rebuilt by next listing.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import sqlite3
+import logging
+import numpy as np
+from engine.ReidFileInfo import ReidFileInfo
+
+# Index file name
+indexFilename = '.reidindex.sqlite'
+# Index schema version
+indexVersion = 5
+# Index : Seconds of waiting for lock of other process (node)
+indexTimeout = 30.0
+
+
+@dataclass
+class ReidIndex:
+    ''' Class storing reid images informations in SQLite file.'''
+    # Path to index file
+    path: str = field(init=True, default=None)
+    # Database connection
+    connection: sqlite3.Connection = field(init=False, default=None)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        # Connection : Open, persistent rollback journal to not touch directory mtime
+        self.connection = sqlite3.connect(self.path, timeout=indexTimeout)
+        self.connection.execute('PRAGMA journal_mode=PERSIST')
+        self.connection.execute('PRAGMA synchronous=FULL')
+
+        # Schema : Create or recreate if outdated
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if (version != indexVersion):
+            self.connection.executescript('''
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS images;
+                CREATE TABLE directories (path TEXT PRIMARY KEY, mtime INTEGER,
+                                          subdirectories TEXT);
+                CREATE TABLE images (directory TEXT, name TEXT,
+                                     identity INTEGER, camera INTEGER,
+                                     frame INTEGER, dataset TEXT,
+                                     hue REAL, brightness REAL,
+                                     saturation REAL, dhash INTEGER,
+                                     PRIMARY KEY (directory, name));
+            ''')
+            self.connection.execute(f'PRAGMA user_version={indexVersion}')
+            self.connection.commit()
+
+    @staticmethod
+    def ForDirectory(path: str) -> ReidIndex:
+        ''' Open index stored in directory (damaged index rebuilt), None if not possible.'''
+        indexPath = os.path.join(path, indexFilename)
+        try:
+            return ReidIndex(indexPath)
+        except sqlite3.DatabaseError as error:
+            logging.warning('(ReidIndex) Damaged index in `%s` : %s, rebuilding!', path, error)
+            ReidIndex.Remove(indexPath)
+
+        try:
+            return ReidIndex(indexPath)
+        except sqlite3.Error as error:
+            logging.warning('(ReidIndex) Cannot open index in `%s` : %s!', path, error)
+            return None
+
+    @staticmethod
+    def Remove(path: str):
+        ''' Remove index file and its journal.'''
+        for filename in [path, f'{path}-journal']:
+            if (os.path.exists(filename)):
+                os.remove(filename)
+
+    def Rebuild(self, error: Exception) -> ReidIndex:
+        ''' Drop damaged index, return new empty index (None if not possible).'''
+        logging.warning('(ReidIndex) Damaged index `%s` : %s, rebuilding!', self.path, error)
+        try:
+            self.Close()
+        except sqlite3.Error:
+            pass
+        ReidIndex.Remove(self.path)
+        return ReidIndex.ForDirectory(os.path.dirname(self.path))
+
+    def Close(self):
+        ''' Close index.'''
+        if (self.connection is not None):
+            self.connection.close()
+            self.connection = None
+
+    def IsValid(self, directory: str, mtime: int) -> bool:
+        ''' True if directory is indexed with same modification time.'''
+        row = self.connection.execute('SELECT mtime FROM directories WHERE path=?',
+                                      (directory,)).fetchone()
+        return (row is not None) and (row[0] == mtime)
+
+    def Images(self, directory: str) -> list:
+        ''' Return list of (name, identity, camera, frame, dataset,
+            hue, brightness, saturation, dhash) rows.'''
+        return self.connection.execute('SELECT name, identity, camera, frame, dataset, '
+                                       'hue, brightness, saturation, dhash '
+                                       'FROM images WHERE directory=?',
+                                       (directory,)).fetchall()
+
+    def Subdirectories(self, directory: str) -> list:
+        ''' Return stored subdirectories names of directory.'''
+        row = self.connection.execute('SELECT subdirectories FROM directories WHERE path=?',
+                                      (directory,)).fetchone()
+        return [] if (row is None) or (not row[0]) else row[0].split('\n')
+
+    def SetVisuals(self, directory: str, names: list, visuals: dict):
+        ''' Store visuals (hue, brightness, saturation, dhash) of directory images.'''
+        # Hash : SQLite integers are signed 64-bit
+        hashes = np.asarray(visuals['dhash'], dtype=np.uint64).view(np.int64).tolist()
+        self.connection.executemany('UPDATE images SET hue=?, brightness=?, saturation=?, dhash=? '
+                                    'WHERE directory=? AND name=?',
+                                    zip(np.asarray(visuals['hue']).tolist(),
+                                        np.asarray(visuals['brightness']).tolist(),
+                                        np.asarray(visuals['saturation']).tolist(),
+                                        hashes,
+                                        [directory] * len(names),
+                                        names))
+        self.connection.commit()
+
+    def Update(self, directory: str, mtime: int, names: list, subdirectories: list = ()) -> list:
+        ''' Update directory with current list of image names and subdirectories, return rows.'''
+        # Indexed : Names already stored
+        indexed = {row[0] for row in self.connection.execute('SELECT name FROM images WHERE directory=?',
+                                                             (directory,))}
+        current = set(names)
+
+        # Removed : Drop from index
+        removed = indexed - current
+        self.connection.executemany('DELETE FROM images WHERE directory=? AND name=?',
+                                    [(directory, name) for name in removed])
+
+        # Added : Parse only new names, whole listing at once
+        names = list(current - indexed)
+        valid, identities, cameras, frames, datasets = ReidFileInfo.FromFilenames(names)
+        for index in np.flatnonzero(~valid):
+            logging.warning('(ReidIndex) Skipped not reid image `%s`!', names[index])
+
+        parsed = [name for name, isValid in zip(names, valid.tolist()) if (isValid)]
+        added = [(directory, *row) for row in zip(parsed,
+                                                  identities[valid].tolist(),
+                                                  cameras[valid].tolist(),
+                                                  frames[valid].tolist(),
+                                                  datasets[valid].tolist())]
+        self.connection.executemany('INSERT INTO images (directory, name, identity, camera, frame, dataset) '
+                                    'VALUES (?, ?, ?, ?, ?, ?)', added)
+
+        # Directory : Store modification time and subdirectories
+        self.connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?)',
+                                (directory, mtime, '\n'.join(subdirectories)))
+        self.connection.commit()
+
+        logging.debug('(ReidIndex) Directory `%s` updated : %u added, %u removed.',
+                      directory, len(added), len(removed))
+
+        return self.Images(directory)
@@ -0,0 +1,197 @@
+'''
+    Manifest of generation run stored as JSON lines in output directory.
+
+    First line describes run (seed, iterations and options changing
+    outputs pixels : decode, warp maps pool and batched color, seed of
+    warp maps pool if not run seed, and outputs sink : files or shards),
+    then every planned job follows (source, outputs, transformation and
+    job seed) and every finished job is appended as `done` line right
+    after its outputs are written. Interrupted run is resumed by skipping
+    done jobs, any output can be regenerated exactly from its job seed.
+
+    Sharded runs (nodes) write own manifests `manifest-I-of-N.jsonl`,
+    merged into single manifest after all shards are done.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import re
+import json
+import logging
+from engine.AugmentJob import AugmentJob
+
+# Manifest file name
+manifestFilename = 'manifest.jsonl'
+# Manifest file name of run shard
+shardManifestPattern = re.compile(r'manifest-(\d+)-of-(\d+)\.jsonl')
+# Options : Arguments changing outputs pixels, stored in run description
+runOptions = ['reducedDecode', 'warpMaps', 'warpFile', 'batchedColor']
+# Options : Arguments of outputs sink (files or tar shards of size), must match on resume
+sinkOptions = ['shards']
+
+
+@dataclass
+class RunManifest:
+    ''' Class writing and reading generation run manifest.'''
+    # Path to manifest file
+    path: str = field(init=True, default=None)
+    # Run description (seed, iterations, run options)
+    run: dict = field(init=True, default_factory=dict)
+    # Planned jobs
+    jobs: list = field(init=True, default_factory=list)
+    # Indices of done jobs
+    done: set = field(init=True, default_factory=set)
+    # Opened manifest file (append mode)
+    file: object = field(init=False, default=None)
+
+    @staticmethod
+    def ForDirectory(path: str, shard: tuple = None) -> str:
+        ''' Return path of manifest (of run shard) in output directory.'''
+        # Check : Not sharded run
+        if (shard is None):
+            return os.path.join(path, manifestFilename)
+
+        return os.path.join(path, f'manifest-{shard[0]}-of-{shard[1]}.jsonl')
+
+    @staticmethod
+    def Options(arguments) -> dict:
+        ''' Return run and sink options of arguments.'''
+        return {name: getattr(arguments, name, None) for name in runOptions + sinkOptions}
+
+    def Conflicts(self, arguments) -> list:
+        ''' Return names of options given by arguments (not default) different from run options
+            and names of sink options (given or not) different from run sink.'''
+        conflicts = [name for name in runOptions
+                     if (getattr(arguments, name, None) not in (None, False)) and
+                        (getattr(arguments, name) != self.run.get(name, None))]
+        return conflicts + [name for name in sinkOptions
+                            if (getattr(arguments, name, None) != self.run.get(name, None))]
+
+    @property
+    def pending(self) -> list:
+        ''' Planned jobs not done yet.'''
+        return [job for index, job in enumerate(self.jobs) if (index not in self.done)]
+
+    def Create(self):
+        ''' Write new manifest with run and all planned jobs.'''
+        with open(self.path, 'w') as file:
+            file.write(json.dumps({'type': 'run', **self.run}) + '\n')
+            for index, job in enumerate(self.jobs):
+                file.write(json.dumps({'type': 'job', 'index': index,
+                                       'source': job.source,
+                                       'outputs': job.outputNames,
+                                       'transform': job.transform,
+                                       'seed': job.seed}) + '\n')
+
+    @staticmethod
+    def Load(path: str, outputDirectory: str, exists=os.path.exists) -> RunManifest:
+        ''' Load manifest, None if not exists (outputs checked by `exists`).'''
+        # Check : Manifest not exists
+        if (not os.path.exists(path)):
+            return None
+
+        manifest = RunManifest(path=path)
+        with open(path) as file:
+            for line in file:
+                # Check : Line truncated by crash
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning('(RunManifest) Skipped truncated line in `%s`!', path)
+                    continue
+
+                if (record['type'] == 'run'):
+                    manifest.run = {key: value for key, value in record.items() if (key != 'type')}
+                elif (record['type'] == 'job'):
+                    manifest.jobs.append(AugmentJob(source=record['source'],
+                                                    outputNames=record['outputs'],
+                                                    outputDirectory=outputDirectory,
+                                                    transform=record['transform'],
+                                                    seed=record['seed'],
+                                                    index=record['index']))
+                elif (record['type'] == 'done'):
+                    manifest.done.add(record['index'])
+
+        # Done : Only jobs with all outputs present
+        manifest.done = {index for index in manifest.done
+                         if all(exists(path) for path in manifest.jobs[index].outputPaths)}
+        return manifest
+
+    def Open(self):
+        ''' Open manifest for appending done jobs.'''
+        self.file = open(self.path, 'a+')
+
+        # Check : Last line truncated by crash, start new line
+        if (self.file.tell() != 0):
+            self.file.seek(self.file.tell() - 1)
+            if (self.file.read(1) != '\n'):
+                self.file.write('\n')
+
+    def Close(self):
+        ''' Close manifest.'''
+        if (self.file is not None):
+            self.file.close()
+            self.file = None
+
+    def MarkDone(self, job: AugmentJob):
+        ''' Append done job, flushed immediately.'''
+        self.done.add(job.index)
+        self.file.write(json.dumps({'type': 'done', 'index': job.index}) + '\n')
+        self.file.flush()
+
+    @staticmethod
+    def Merge(outputDirectory: str, exists=os.path.exists) -> RunManifest:
+        ''' Merge manifests of all run shards into single manifest, None if none found
+            (outputs checked by `exists`).'''
+        # Shards : Manifests by shard index
+        shards, count = {}, None
+        for filename in sorted(os.listdir(outputDirectory)):
+            match = shardManifestPattern.fullmatch(filename)
+            if (match is not None):
+                shards[int(match.group(1))] = os.path.join(outputDirectory, filename)
+                # Check : Manifests of different shards count
+                if (count is not None) and (count != int(match.group(2))):
+                    raise ValueError(f'Manifests of different shards counts in `{outputDirectory}`!')
+                count = int(match.group(2))
+
+        # Check : No shards manifests
+        if (count is None):
+            return None
+        # Check : Missing shards
+        missing = sorted(set(range(count)) - set(shards))
+        if (len(missing) != 0):
+            logging.warning('(RunManifest) Missing manifests of shards %s!', missing)
+
+        # Jobs : Shards jobs in shard order, indices shifted
+        merged = RunManifest(path=RunManifest.ForDirectory(outputDirectory))
+        for shard in sorted(shards):
+            manifest = RunManifest.Load(shards[shard], outputDirectory, exists)
+            # Check : Shards of different runs
+            run = {key: value for key, value in manifest.run.items() if (key != 'shard')}
+            if (len(merged.run) != 0) and (run != merged.run):
+                raise ValueError(f'Manifest `{shards[shard]}` of different run!')
+            merged.run = run
+
+            offset = len(merged.jobs)
+            for job in manifest.jobs:
+                job.index += offset
+            merged.jobs.extend(manifest.jobs)
+            merged.done.update(index + offset for index in manifest.done)
+
+        # Manifest : Planned and done jobs
+        merged.run['runShards'] = count
+        merged.Create()
+        merged.Open()
+        for job in merged.jobs:
+            if (job.index in merged.done):
+                merged.MarkDone(job)
+        merged.Close()
+        return merged
+
+    def FindOutput(self, outputName: str) -> tuple:
+        ''' Return (job, output index) generating output name, None if not found.'''
+        for job in self.jobs:
+            if (outputName in job.outputNames):
+                return job, job.outputNames.index(outputName)
+
+        return None
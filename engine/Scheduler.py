@@ -0,0 +1,210 @@
+'''
+    Identity balanced scheduler of augmentation jobs.
+
+    Whole plan is built before processing. Outputs budget is spread
+    by water filling : every identity is filled up to common level of
+    images, scaled up for identities seen by fewer cameras and limited
+    by cap, so small identities get most outputs and large ones none.
+    Outputs of identity are assigned round robin over its cameras, then
+    over images of every camera.
+
+    Run can be partitioned into shards (nodes) by hash of identity number.
+    Targets are always computed over all identities and every identity is
+    planned by own generator, so shards together plan exactly unsharded
+    run. Frame numbers of identity are reserved only by its shard, so
+    outputs names never collide without any coordination.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import random
+import zlib
+import numpy as np
+from engine.AugmentJob import AugmentJob
+from engine.ImageData import ImageData
+from engine.ReidFileInfo import ReidFileInfo
+
+
+@dataclass
+class Scheduler:
+    ''' Class planning identity balanced augmentation jobs.'''
+    # Annoter with identities to augment
+    annoter: object = field(init=True, default=None, repr=False)
+    # Outputs budget of whole run
+    iterations: int = field(init=True, default=100)
+    # Maximum images of identity (originals and outputs), None for no cap
+    cap: int = field(init=True, default=None)
+    # Weight of missing cameras coverage (0 for images counts only)
+    cameraWeight: float = field(init=True, default=1.0)
+    # Shard (index, count) of planned identities, None for all
+    shard: tuple = field(init=True, default=None)
+    # Identities numbers (planned order)
+    identities: np.ndarray = field(init=False, default=None)
+    # Identities images and cameras counts
+    counts: np.ndarray = field(init=False, default=None, repr=False)
+    cameras: np.ndarray = field(init=False, default=None, repr=False)
+    # Identities outputs targets
+    targets: np.ndarray = field(init=False, default=None, repr=False)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        catalog = self.annoter.catalog
+        self.identities = np.array(sorted(self.annoter.indentities_ids), dtype=np.int64)
+        self.counts = np.array([catalog.Count(number) for number in self.identities.tolist()], dtype=np.int64)
+        self.cameras = np.array([len(np.unique(catalog.camera[catalog.Rows(number)]))
+                                 for number in self.identities.tolist()], dtype=np.int64)
+        self.targets = self.Targets()
+
+    @staticmethod
+    def ShardOf(identity: int, count: int) -> int:
+        ''' Return shard of identity number (stable across nodes and runs).'''
+        return zlib.crc32(str(identity).encode()) % count
+
+    @property
+    def owned(self) -> np.ndarray:
+        ''' Mask of identities planned by this shard.'''
+        # Check : Not sharded
+        if (self.shard is None):
+            return np.ones(len(self.identities), dtype=bool)
+
+        index, count = self.shard
+        return np.array([self.ShardOf(number, count) == index for number in self.identities.tolist()], dtype=bool)
+
+    @property
+    def weights(self) -> np.ndarray:
+        ''' Fill level scale of identities, higher for fewer cameras.'''
+        # Check : No identities
+        if (len(self.cameras) == 0):
+            return np.zeros(0, dtype=np.float64)
+
+        coverage = self.cameras / max(1, self.cameras.max())
+        return 1.0 + self.cameraWeight * (1.0 - coverage)
+
+    @property
+    def rooms(self) -> np.ndarray:
+        ''' Maximum outputs of identities (cap minus images).'''
+        # Check : Identities without images cannot be augmented
+        rooms = np.where(self.counts > 0, np.iinfo(np.int64).max, 0)
+        if (self.cap is not None):
+            rooms = np.minimum(rooms, np.maximum(0, self.cap - self.counts))
+
+        return rooms
+
+    def Fill(self, level: float) -> np.ndarray:
+        ''' Return outputs of identities filled to level (fractional outputs).'''
+        return np.clip(level * self.weights - self.counts, 0, self.rooms)
+
+    def Targets(self) -> np.ndarray:
+        ''' Return outputs of identities, summing to budget (or all rooms).'''
+        rooms = self.rooms
+        # Check : Budget exceeds all rooms
+        if (self.iterations >= rooms.sum(dtype=np.float64)):
+            return rooms.copy()
+
+        # Level : Bisection of highest level within budget
+        low, high = 0.0, float(self.counts.max() + self.iterations + 1)
+        for _ in range(64):
+            level = (low + high) / 2
+            if (np.floor(self.Fill(level)).sum() <= self.iterations):
+                low = level
+            else:
+                high = level
+
+        fill = self.Fill(low)
+        targets = np.floor(fill).astype(np.int64)
+
+        # Remainder : Identities with largest fractional parts, then smallest
+        order = np.lexsort((self.counts, -(fill - targets)))
+        order = order[targets[order] < rooms[order]]
+        targets[order[:self.iterations - targets.sum()]] += 1
+        return targets
+
+    def Plan(self, outputPath: str, transform: str, seed: int = None) -> list:
+        ''' Plan augmentation jobs, assign output names, frame numbers and job seeds.'''
+        # Random : Planner generator, same plan for same seed and dataset
+        planner = random.Random(seed)
+        # Jobs : List of planned jobs
+        jobs = []
+
+        # Identities : Shuffled, outputs of identity kept together
+        order = np.flatnonzero(self.owned & (self.targets > 0)).tolist()
+        planner.shuffle(order)
+        for position in order:
+            # Identity : Own generator, plan independent of other identities
+            identity = self.annoter.identities[int(self.identities[position])]
+            identityPlanner = random.Random(f'{seed}:{identity.number}') if (seed is not None) else random.Random()
+            jobs.extend(self.PlanIdentity(identity, int(self.targets[position]), outputPath, transform, identityPlanner))
+
+        # Jobs : Index in plan
+        for index, job in enumerate(jobs):
+            job.index = index
+
+        return jobs
+
+    @staticmethod
+    def PlanIdentity(identity, count: int, outputPath: str, transform: str, planner: random.Random) -> list:
+        ''' Plan outputs of identity, round robin over cameras and their images.'''
+        # Sources : Not outputs of previous runs (warm catalog of service)
+        images = [image for image in identity.images
+                  if (os.path.dirname(os.path.normpath(image.path)) != os.path.normpath(outputPath))]
+        images = images if (len(images) != 0) else identity.images
+
+        # Cameras : Shuffled images of every camera (same order on every node)
+        cameras = {}
+        for image in sorted(images, key=lambda image: (image.camera, image.frame, image.path)):
+            cameras.setdefault(image.camera, []).append(image)
+        for images in cameras.values():
+            planner.shuffle(images)
+        cameraOrder = sorted(cameras)
+        planner.shuffle(cameraOrder)
+
+        # Jobs : One job per source image, grouping all its outputs
+        identity_jobs = {}
+        for index in range(count):
+            # Image : Next camera, next image of camera
+            images = cameras[cameraOrder[index % len(cameraOrder)]]
+            image = images[(index // len(cameraOrder)) % len(images)]
+
+            # Job : Get or create job for source image
+            if (image.path not in identity_jobs):
+                identity_jobs[image.path] = AugmentJob(source=image.path,
+                                                       outputDirectory=outputPath,
+                                                       transform=transform,
+                                                       seed=planner.getrandbits(32))
+            job = identity_jobs[image.path]
+
+            # Output name : Next frame number of identity
+            next_frame_number = identity.last_frame + 1
+            outputName = ReidFileInfo.toPath(identity_number=identity.number,
+                                             camera_number=image.camera,
+                                             frame_number=next_frame_number,
+                                             dataset=identity.dataset)
+
+            # Identity : Append image, reserves frame number
+            identity.AddImage(ImageData(path=job.AddOutput(outputName),
+                                        camera=image.camera,
+                                        frame=next_frame_number))
+
+        return list(identity_jobs.values())
+
+    def Report(self) -> str:
+        ''' Return projected outputs report.'''
+        # Check : No identities
+        if (len(self.identities) == 0):
+            return 'No identities to augment.'
+
+        after = self.counts + self.targets
+        lines = [f'Projected {int(self.targets.sum())} outputs (budget {self.iterations}) '
+                 f'for {int(np.count_nonzero(self.targets))} of {len(self.identities)} identities.',
+                 f'Images per identity : min {self.counts.min()} -> {after.min()}, '
+                 f'median {np.median(self.counts):.1f} -> {np.median(after):.1f}, '
+                 f'max {self.counts.max()} -> {after.max()}.',
+                 f'Outputs per identity : min {self.targets.min()}, max {self.targets.max()}.']
+        if (self.cap is not None):
+            lines.append(f'Identities at cap {self.cap} : {int(np.count_nonzero(after >= self.cap))}.')
+        if (self.shard is not None):
+            owned = self.owned
+            lines.append(f'Shard {self.shard[0]}/{self.shard[1]} : {int(self.targets[owned].sum())} outputs '
+                         f'for {int(np.count_nonzero(owned))} identities.')
+
+        return '\n'.join(lines)
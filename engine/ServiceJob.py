@@ -0,0 +1,91 @@
+'''
+    Job of augmentation service : directory, pipeline and count of outputs
+    submitted by client, with progress and cancellation.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import time
+import uuid
+import threading
+
+
+@dataclass
+class ServiceJob:
+    ''' Dataclass representing one submitted augmentation service job.'''
+    # Dataset directory
+    directory: str = field(init=True, default=None)
+    # Transformation name (see helpers.augumentations.transforms)
+    transform: str = field(init=True, default='all')
+    # Count of outputs
+    count: int = field(init=True, default=100)
+    # Random seed of run (None for random)
+    seed: int = field(init=True, default=None)
+    # Maximum images of identity, None for no cap
+    cap: int = field(init=True, default=None)
+    # Rescan dataset directory before planning
+    rescan: bool = field(init=True, default=False)
+    # Unique job id
+    id: str = field(init=False, default_factory=lambda: uuid.uuid4().hex[:12])
+    # Status : queued, running, done, failed, cancelled
+    status: str = field(init=False, default='queued')
+    # Planned and written outputs
+    total: int = field(init=False, default=0)
+    done: int = field(init=False, default=0)
+    # Error message of failed job
+    error: str = field(init=False, default=None)
+    # Times of submit, start and finish
+    created: float = field(init=False, default_factory=time.time)
+    started: float = field(init=False, default=None)
+    finished: float = field(init=False, default=None)
+    # Cancel event, checked by processing stages
+    cancel: threading.Event = field(init=False, default_factory=threading.Event, repr=False)
+
+    @property
+    def manifestPath(self) -> str:
+        ''' Path of job run manifest in dataset output directory.'''
+        return os.path.join(self.directory, 'generated', f'manifest-{self.id}.jsonl')
+
+    @property
+    def finishedStatus(self) -> bool:
+        ''' True if job is finished (done, failed or cancelled).'''
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def Start(self):
+        ''' Mark job running.'''
+        self.status = 'running'
+        self.started = time.time()
+
+    def Finish(self, status: str, error: str = None):
+        ''' Mark job finished with status.'''
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+
+    def Cancel(self) -> bool:
+        ''' Request cancellation, False if already finished.'''
+        # Check : Already finished
+        if (self.finishedStatus):
+            return False
+
+        self.cancel.set()
+        # Queued : Cancelled immediately, skipped by runner
+        if (self.status == 'queued'):
+            self.Finish('cancelled')
+        return True
+
+    def Status(self) -> dict:
+        ''' Return job status dictionary.'''
+        return {'id': self.id,
+                'directory': self.directory,
+                'transform': self.transform,
+                'count': self.count,
+                'seed': self.seed,
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'progress': (self.done / self.total) if (self.total != 0) else 0.0,
+                'error': self.error,
+                'created': self.created,
+                'started': self.started,
+                'finished': self.finished}
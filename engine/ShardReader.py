@@ -0,0 +1,201 @@
+'''
+    Reader of tar shards written by ShardWriter. Shards index is loaded
+    once, images are read by single positioned read (thread safe) from
+    shard file, without listing or parsing tar archives. Images paths
+    inside shards (shards/shard-000000.tar/name) are read by ReadPath,
+    resolved by readers of shards indexes (whole run or run shard index
+    by shard file name), opened readers are reloaded when shards index
+    file changes.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import re
+import logging
+import threading
+import cv2
+import numpy as np
+from engine.ShardWriter import ShardWriter, shardsIndexFilename
+
+# Shard path : Separator of shard file and member name in image paths
+shardSeparator = '.tar' + os.sep
+# Shard file name of run shard (node)
+nodeShardPattern = re.compile(r'shard-(\d+)-of-(\d+)-\d+\.tar')
+
+
+@dataclass
+class ShardReader:
+    ''' Class reading images from tar shards by shards index.'''
+    # Path to shards directory
+    directory: str = field(init=True, default=None)
+    # Shards index file name
+    indexFilename: str = field(init=True, default=shardsIndexFilename)
+    # Entries : Name to (shard, offset, size, identity, camera, frame, dataset)
+    entries: dict = field(init=False, default_factory=dict)
+    # Entries : Names by shard name
+    shardNames: dict = field(init=False, default_factory=dict)
+    # Opened shard files descriptors by shard name
+    files: dict = field(init=False, default_factory=dict)
+    # Lock : Shard files opened once by many reader threads
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock, repr=False)
+
+    # Index : Modification time and size of loaded index file
+    version: tuple = field(init=False, default=None)
+
+    # Readers : Opened readers by directory and index file name (see ForPath)
+    readers = {}
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        self.version = self.IndexVersion()
+        with open(self.indexPath) as file:
+            for line in file:
+                fields = line.rstrip('\n').split('\t')
+                # Check : Line truncated by crash
+                if (len(fields) != 8):
+                    logging.warning('(ShardReader) Skipped truncated index line in `%s`!', self.directory)
+                    continue
+
+                shard, name, offset, size, identity, camera, frame, dataset = fields
+                self.entries[name] = (shard, int(offset), int(size),
+                                      int(identity) if (identity != '') else None,
+                                      int(camera) if (camera != '') else None,
+                                      int(frame) if (frame != '') else None,
+                                      dataset)
+
+        # Shards : Names grouped once (last index line of name wins)
+        for name, entry in self.entries.items():
+            self.shardNames.setdefault(entry[0], []).append(name)
+
+    @staticmethod
+    def IsShards(directory: str, indexFilename: str = shardsIndexFilename) -> bool:
+        ''' True if directory contains shards index.'''
+        return os.path.exists(os.path.join(directory, indexFilename))
+
+    @property
+    def indexPath(self) -> str:
+        ''' Path of shards index file.'''
+        return os.path.join(self.directory, self.indexFilename)
+
+    def IndexVersion(self) -> tuple:
+        ''' Return (modification time, size) of index file, None if not exists.'''
+        try:
+            stat = os.stat(self.indexPath)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def outdated(self) -> bool:
+        ''' True if index file was rewritten or appended after loading.'''
+        return self.IndexVersion() != self.version
+
+    @staticmethod
+    def IndexFilename(shard: str) -> str:
+        ''' Return shards index file name of shard file name (run shard or whole run).'''
+        match = nodeShardPattern.fullmatch(shard)
+        # Check : Shard of whole run
+        if (match is None):
+            return shardsIndexFilename
+
+        return ShardWriter.NodeNames((int(match.group(1)), int(match.group(2))))[1]
+
+    @staticmethod
+    def ForPath(imagePath: str) -> tuple:
+        ''' Return (reader, name) of shard image path (shards/shard-000000.tar/name),
+            (None, imagePath) if path is not inside shards.'''
+        # Check : Not shard path
+        if (shardSeparator not in imagePath):
+            return None, imagePath
+
+        shardPath, name = imagePath.split(shardSeparator, 1)
+        directory, shard = os.path.split(shardPath + '.tar')
+        key = (directory, ShardReader.IndexFilename(shard))
+        # Reader : Opened once, reopened if shards were rewritten
+        reader = ShardReader.readers.get(key, None)
+        if (reader is None) or (reader.outdated):
+            if (reader is not None):
+                reader.Close()
+                del ShardReader.readers[key]
+            # Check : No shards index, plain directory of `.tar` name
+            if (not ShardReader.IsShards(*key)):
+                return None, imagePath
+            reader = ShardReader.readers[key] = ShardReader(*key)
+
+        return reader, name
+
+    @staticmethod
+    def IsShardPath(imagePath: str) -> bool:
+        ''' True if image path points inside shard (resolved by shards index).'''
+        return ShardReader.ForPath(imagePath)[0] is not None
+
+    @staticmethod
+    def ReadPath(imagePath: str, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        ''' Read and decode image from file or shard image path, None if not decoded.'''
+        reader, name = ShardReader.ForPath(imagePath)
+        if (reader is not None):
+            return reader.Image(name, flags)
+
+        return cv2.imread(imagePath, flags)
+
+    @staticmethod
+    def Mtime(imagePath: str) -> int:
+        ''' Return modification time (ns) of image file or shard file of shard image path.'''
+        if (ShardReader.IsShardPath(imagePath)):
+            imagePath = imagePath.split(shardSeparator, 1)[0] + '.tar'
+
+        return os.stat(imagePath).st_mtime_ns
+
+    @property
+    def names(self) -> list:
+        ''' Names of all images.'''
+        return list(self.entries.keys())
+
+    @property
+    def shards(self) -> list:
+        ''' Names of all shards.'''
+        return sorted(self.shardNames)
+
+    def Contains(self, name: str) -> bool:
+        ''' True if image is stored in shards.'''
+        return name in self.entries
+
+    def Path(self, name: str) -> str:
+        ''' Return image path inside its shard.'''
+        return os.path.join(self.directory, self.entries[name][0], name)
+
+    def Rows(self, shard: str) -> list:
+        ''' Return (name, identity, camera, frame, dataset, hue, brightness,
+            saturation, dhash) rows of shard reid images.'''
+        rows = []
+        for name in self.shardNames.get(shard, []):
+            identity, camera, frame, dataset = self.entries[name][3:]
+            if (identity is not None):
+                rows.append((name, identity, camera, frame, dataset, None, None, None, None))
+
+        return rows
+
+    def Read(self, name: str) -> bytes:
+        ''' Read encoded image data.'''
+        shard, offset, size = self.entries[name][:3]
+        # File : Opened once, positioned reads are thread safe
+        descriptor = self.files.get(shard, None)
+        if (descriptor is None):
+            with self.lock:
+                if (shard not in self.files):
+                    self.files[shard] = os.open(os.path.join(self.directory, shard), os.O_RDONLY)
+                descriptor = self.files[shard]
+
+        return os.pread(descriptor, size, offset)
+
+    def Image(self, name: str, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        ''' Read and decode image.'''
+        return cv2.imdecode(np.frombuffer(self.Read(name), dtype=np.uint8), flags)
+
+    def Close(self):
+        ''' Close opened shard files.'''
+        with self.lock:
+            for descriptor in self.files.values():
+                os.close(descriptor)
+            self.files = {}
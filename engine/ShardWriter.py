@@ -0,0 +1,138 @@
+'''
+    Sharded output writer : encoded images and their reid metadata are
+    streamed into size capped tar shards (WebDataset style, every image
+    `name.jpeg` followed by `name.json`) instead of many small files.
+    Every written image is appended to shards index (shard, name, data
+    offset, size, identity, camera, frame, dataset), so images are read
+    back by single seek without parsing tar headers.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import io
+import os
+import re
+import json
+import time
+import tarfile
+import threading
+from engine.ReidFileInfo import ReidFileInfo
+
+# Shards index file name
+shardsIndexFilename = 'shards.index'
+# Shards index file name of run shard (node)
+nodeIndexPattern = re.compile(r'shards-(\d+)-of-(\d+)\.index')
+
+
+@dataclass
+class ShardWriter:
+    ''' Class writing images into size capped tar shards.'''
+    # Path to shards directory
+    directory: str = field(init=True, default=None)
+    # Maximum shard size in bytes
+    maxBytes: int = field(init=True, default=1 << 30)
+    # Shard file name prefix
+    prefix: str = field(init=True, default='shard')
+    # Shards index file name (one per writing node)
+    indexFilename: str = field(init=True, default=shardsIndexFilename)
+    # Current shard number
+    number: int = field(init=False, default=0)
+    # Current shard tar file
+    tar: tarfile.TarFile = field(init=False, default=None)
+    # Shards index file (append mode)
+    index: object = field(init=False, default=None)
+    # Lock : Writes from many writer threads are sequential
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        ''' Post init method.'''
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = open(os.path.join(self.directory, self.indexFilename), 'a')
+
+        # Shards : Continue after existing shards (resumed runs)
+        while (os.path.exists(self.ShardPath(self.number))):
+            self.number += 1
+
+    @property
+    def shardName(self) -> str:
+        ''' Name of current shard file.'''
+        return os.path.basename(self.ShardPath(self.number))
+
+    def ShardPath(self, number: int) -> str:
+        ''' Return path of shard number.'''
+        return os.path.join(self.directory, f'{self.prefix}-{number:06d}.tar')
+
+    def AddMember(self, name: str, data: bytes) -> int:
+        ''' Add member to current shard, return offset of its data.'''
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        # Offset : Data follows member header(s)
+        offset = self.tar.offset + len(info.tobuf(self.tar.format, self.tar.encoding, self.tar.errors))
+        self.tar.addfile(info, io.BytesIO(data))
+        return offset
+
+    def Write(self, name: str, data: bytes):
+        ''' Write encoded image with its reid metadata.'''
+        reidInfo = ReidFileInfo.FromFilename(name)
+        metadata = {} if (reidInfo is None) else {'identity': reidInfo.identity,
+                                                  'camera': reidInfo.camera,
+                                                  'frame': reidInfo.frame,
+                                                  'dataset': reidInfo.dataset.value}
+        with self.lock:
+            # Shard : Open new, if none or current is full
+            if (self.tar is not None) and (self.tar.offset + len(data) > self.maxBytes):
+                self.CloseShard()
+            if (self.tar is None):
+                self.tar = tarfile.open(self.ShardPath(self.number), 'w')
+
+            offset = self.AddMember(name, data)
+            self.AddMember(f'{os.path.splitext(name)[0]}.json', json.dumps(metadata).encode())
+
+            # Index : Flushed after data, written images survive crash
+            self.tar.fileobj.flush()
+            self.index.write('\t'.join(map(str, [self.shardName, name, offset, len(data),
+                                                 metadata.get('identity', ''),
+                                                 metadata.get('camera', ''),
+                                                 metadata.get('frame', ''),
+                                                 metadata.get('dataset', '')])) + '\n')
+            self.index.flush()
+
+    def CloseShard(self):
+        ''' Close current shard.'''
+        if (self.tar is not None):
+            self.tar.close()
+            self.tar = None
+            self.number += 1
+
+    @staticmethod
+    def NodeNames(shard: tuple) -> tuple:
+        ''' Return (shard prefix, index file name) of run shard (node).'''
+        return f'shard-{shard[0]}-of-{shard[1]}', f'shards-{shard[0]}-of-{shard[1]}.index'
+
+    @staticmethod
+    def Merge(directory: str) -> int:
+        ''' Merge indexes of run shards (nodes) into shards index, return count of lines.'''
+        count = 0
+        with open(os.path.join(directory, shardsIndexFilename), 'w') as index:
+            for filename in sorted(os.listdir(directory)):
+                # Check : Not node index
+                if (nodeIndexPattern.fullmatch(filename) is None):
+                    continue
+
+                with open(os.path.join(directory, filename)) as file:
+                    for line in file:
+                        # Check : Line truncated by crash
+                        if (not line.endswith('\n')):
+                            continue
+                        index.write(line)
+                        count += 1
+
+        return count
+
+    def Close(self):
+        ''' Close current shard and index.'''
+        with self.lock:
+            self.CloseShard()
+            if (self.index is not None):
+                self.index.close()
+                self.index = None
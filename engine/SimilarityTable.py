@@ -0,0 +1,198 @@
+'''
+    Identities similarity matrix maintained incrementally.
+
+    Rows are looked up by identity number in O(1). Removals only mark
+    row as removed (tombstone), matrix is compacted by single copy when
+    removed rows exceed ratio of matrix size. New identities append row
+    and column, computed against already stored feature vectors.
+    Matrix of many identities can be memory mapped to file (bounded
+    memory), computed in tiles directly into the file. Growth and
+    compaction of memory mapped matrix copy row blocks into new file,
+    which replaces old one.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import numpy as np
+from helpers.features import NormalizeFeatures, SimilarityMatrix
+
+# Copy : Rows copied at once by growth and compaction
+copyBlock = 1024
+
+
+@dataclass
+class SimilarityTable:
+    ''' Class storing identities similarity matrix.'''
+    # Ratio of removed rows starting compaction
+    compactRatio: float = field(init=True, default=0.25)
+    # Memory mapped matrix file, None for matrix in memory
+    path: str = field(init=True, default=None)
+    # Similarity matrix (capacity x capacity), only `size` rows used
+    matrix: np.ndarray = field(init=False, repr=False, default=None)
+    # Normalized features of rows
+    features: np.ndarray = field(init=False, repr=False, default=None)
+    # Identity number of rows
+    ids: np.ndarray = field(init=False, repr=False, default=None)
+    # Identity number to row lookup
+    rows: dict = field(init=False, default_factory=dict)
+    # Alive (not removed) rows mask
+    alive: np.ndarray = field(init=False, repr=False, default=None)
+    # Count of used and removed rows
+    size: int = field(init=False, default=0)
+    removed: int = field(init=False, default=0)
+
+    @staticmethod
+    def Build(ids: list, features: np.ndarray, tile: int = 2048, path: str = None) -> SimilarityTable:
+        ''' Build table from identities features (matrix memory mapped to path if given).'''
+        table = SimilarityTable(path=path)
+        table.features = NormalizeFeatures(np.asarray(features, dtype=np.float32))
+        table.matrix = SimilarityMatrix(table.features, tile=tile, out=table.Allocate(len(table.features), path))
+        table.ids = np.asarray(ids, dtype=np.int64)
+        table.rows = {identity: row for row, identity in enumerate(table.ids.tolist())}
+        table.alive = np.ones(len(table.ids), dtype=bool)
+        table.size = len(table.ids)
+        return table
+
+    @property
+    def count(self) -> int:
+        ''' Count of alive identities.'''
+        return self.size - self.removed
+
+    @property
+    def capacity(self) -> int:
+        ''' Allocated rows capacity.'''
+        return 0 if (self.matrix is None) else len(self.matrix)
+
+    @property
+    def active_ids(self) -> np.ndarray:
+        ''' Return identities numbers of rows of Active() matrix.'''
+        self.Compact()
+        return self.ids[:self.size]
+
+    def Active(self) -> np.ndarray:
+        ''' Return matrix of alive identities (view, compacts if needed).'''
+        self.Compact()
+        return self.matrix[:self.size, :self.size]
+
+    @staticmethod
+    def Allocate(capacity: int, path: str = None) -> np.ndarray:
+        ''' Return zeroed capacity x capacity matrix, memory mapped to path if given.'''
+        # Check : Matrix in memory
+        if (path is None):
+            return np.zeros((capacity, capacity), dtype=np.float32)
+
+        if (os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(capacity, capacity))
+
+    def Resized(self, capacity: int, rows: np.ndarray) -> np.ndarray:
+        ''' Return new capacity x capacity matrix with rows and columns `rows` of
+            matrix copied to its start, by row blocks (new file replaces memory mapped one).'''
+        temporary = None if (self.path is None) else self.path + '.resize.npy'
+        matrix = self.Allocate(capacity, temporary)
+        for start in range(0, len(rows), copyBlock):
+            block = rows[start:start + copyBlock]
+            matrix[start:start + len(block), :len(rows)] = self.matrix[block][:, rows]
+
+        # File : New matrix replaces old file
+        if (temporary is not None):
+            matrix.flush()
+            self.matrix = None
+            os.replace(temporary, self.path)
+
+        return matrix
+
+    def Row(self, identity: int) -> int:
+        ''' Return row of identity, None if not stored.'''
+        return self.rows.get(identity, None)
+
+    def Contains(self, identity: int) -> bool:
+        ''' True if identity stored.'''
+        return identity in self.rows
+
+    def Similarities(self, identity: int) -> tuple:
+        ''' Return (identities numbers, similarities) of identity to alive identities.'''
+        alive = self.alive[:self.size]
+        values = self.matrix[self.rows[identity], :self.size]
+
+        # Check : No removed rows, no copy
+        if (self.removed == 0):
+            return self.ids[:self.size], values
+
+        return self.ids[:self.size][alive], values[alive]
+
+    def Reserve(self, count: int):
+        ''' Grow matrix and features to hold at least `count` rows.'''
+        # Check : Enough capacity
+        if (count <= self.capacity):
+            return
+
+        # Capacity : Double until enough
+        capacity = max(16, self.capacity)
+        while (capacity < count):
+            capacity *= 2
+
+        # Matrix : Copy used block
+        matrix = self.Resized(capacity, np.arange(self.size))
+        features = np.zeros((capacity, self.features.shape[1]), dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        ids = np.zeros(capacity, dtype=np.int64)
+        features[:self.size] = self.features[:self.size]
+        alive[:self.size] = self.alive[:self.size]
+        ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.features, self.alive, self.ids = matrix, features, alive, ids
+
+    def Add(self, identity: int, features: np.ndarray):
+        ''' Append identity row and column.'''
+        # Check : Already stored, remove old row
+        if (identity in self.rows):
+            self.Remove(identity)
+
+        # Features : Normalize
+        vector = NormalizeFeatures(np.asarray(features, dtype=np.float32).reshape(1, -1))[0]
+
+        # Empty : First row
+        if (self.features is None):
+            self.features = np.zeros((0, len(vector)), dtype=np.float32)
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self.alive = np.zeros(0, dtype=bool)
+            self.ids = np.zeros(0, dtype=np.int64)
+
+        # Row : Reserve and fill
+        row = self.size
+        self.Reserve(row + 1)
+        self.features[row] = vector
+        similarities = self.features[:row + 1] @ vector
+        self.matrix[row, :row + 1] = similarities
+        self.matrix[:row + 1, row] = similarities
+        self.alive[row] = True
+
+        # Lookup : Store
+        self.ids[row] = identity
+        self.rows[identity] = row
+        self.size = row + 1
+
+    def Remove(self, identity: int):
+        ''' Remove identity (tombstone), compact lazily.'''
+        row = self.rows.pop(identity)
+        self.alive[row] = False
+        self.removed += 1
+
+        # Check : Too many removed rows, compact
+        if (self.removed > self.compactRatio * self.size):
+            self.Compact()
+
+    def Compact(self):
+        ''' Drop removed rows and columns by single copy.'''
+        # Check : Nothing removed
+        if (self.removed == 0):
+            return
+
+        keep = np.flatnonzero(self.alive[:self.size])
+        self.matrix = self.Resized(len(keep), keep)
+        self.features = self.features[keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.ids = self.ids[keep]
+        self.rows = {identity: row for row, identity in enumerate(self.ids.tolist())}
+        self.size = len(keep)
+        self.removed = 0
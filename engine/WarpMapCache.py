@@ -0,0 +1,134 @@
+'''
+    Cache of precomputed geometric warp maps for fixed image size.
+
+    Distortion pipeline (grid, elastic, optical) is applied once per pool
+    entry to identity coordinates image, which gives the `cv2.remap` maps
+    of the sampled distortion. Maps are stored in fixed point form of
+    `cv2.convertMaps` (int16 coordinates + uint16 interpolation table)
+    and can be memory mapped from files shared by all worker processes.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import logging
+import cv2
+import numpy as np
+
+# Coordinates : Value of pixels mapped outside of source image
+outsideCoordinate = -16
+
+
+@dataclass
+class WarpMapCache:
+    ''' Class storing pool of fixed point remap maps.'''
+    # Image size (width, height)
+    size: tuple = field(init=True, default=None)
+    # Number of maps in pool
+    poolSize: int = field(init=True, default=64)
+    # Path prefix of cache files (memory mapped), None for memory only
+    path: str = field(init=True, default=None)
+    # Fixed point coordinates (P,H,W,2) int16
+    map1: np.ndarray = field(init=False, default=None)
+    # Interpolation table indices (P,H,W) uint16
+    map2: np.ndarray = field(init=False, default=None)
+    # Identity flags (no distortion sampled) (P,)
+    identity: np.ndarray = field(init=False, default=None)
+
+    @property
+    def ready(self) -> bool:
+        ''' True if pool is generated or loaded.'''
+        return self.map1 is not None
+
+    @property
+    def nbytes(self) -> int:
+        ''' Size of pool in bytes.'''
+        return 0 if (not self.ready) else self.map1.nbytes + self.map2.nbytes
+
+    @staticmethod
+    def CoordinatesImage(width: int, height: int) -> np.ndarray:
+        ''' Return (H,W,3) float32 image of x+1, y+1 coordinates and inside mask.'''
+        x, y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+        return np.dstack([x + 1, y + 1, np.ones_like(x)])
+
+    def Generate(self, distortion):
+        ''' Generate pool by applying distortion to identity coordinates.'''
+        width, height = self.size
+        coordinates = self.CoordinatesImage(width, height)
+        self.map1 = np.empty((self.poolSize, height, width, 2), dtype=np.int16)
+        self.map2 = np.empty((self.poolSize, height, width), dtype=np.uint16)
+        self.identity = np.zeros(self.poolSize, dtype=bool)
+
+        for index in range(self.poolSize):
+            warped = distortion(image=coordinates)['image']
+            # Identity : Nothing applied, remap skipped
+            self.identity[index] = np.array_equal(warped, coordinates)
+
+            # Maps : Outside pixels moved far away (constant border)
+            outside = warped[..., 2] < 0.5
+            mapx, mapy = warped[..., 0] - 1, warped[..., 1] - 1
+            mapx[outside] = outsideCoordinate
+            mapy[outside] = outsideCoordinate
+            self.map1[index], self.map2[index] = cv2.convertMaps(mapx, mapy, cv2.CV_16SC2)
+
+        logging.info('(WarpMapCache) Generated %u maps %ux%u (%.1f MB).',
+                     self.poolSize, width, height, self.nbytes / 2**20)
+
+    def Files(self) -> dict:
+        ''' Return cache files paths by array name.'''
+        return {name: f'{self.path}.{name}.npy' for name in ['map1', 'map2', 'identity']}
+
+    def Save(self):
+        ''' Save pool to cache files.'''
+        for name, path in self.Files().items():
+            np.save(path, getattr(self, name))
+
+    def Load(self) -> bool:
+        ''' Load pool from cache files (memory mapped), True if loaded.'''
+        files = self.Files() if (self.path is not None) else {}
+        # Check : No files
+        if (len(files) == 0) or (not all(os.path.exists(path) for path in files.values())):
+            return False
+
+        arrays = {name: np.load(path, mmap_mode='r') for name, path in files.items()}
+        # Check : Different pool size or image size
+        width, height = self.size
+        if (arrays['map1'].shape != (self.poolSize, height, width, 2)) or \
+           (arrays['map2'].shape != (self.poolSize, height, width)):
+            logging.warning('(WarpMapCache) Cache `%s` has different size, regenerated!', self.path)
+            return False
+
+        self.map1, self.map2 = arrays['map1'], arrays['map2']
+        self.identity = np.array(arrays['identity'])
+        return True
+
+    def Reset(self):
+        ''' Drop prepared pool (generated or loaded again on next use).'''
+        self.map1, self.map2, self.identity = None, None, None
+
+    def Prepare(self, distortion):
+        ''' Load pool from files or generate (and save) it.'''
+        # Check : Already prepared
+        if (self.ready):
+            return
+
+        if (self.Load()):
+            logging.info('(WarpMapCache) Loaded %u maps from `%s`.', self.poolSize, self.path)
+            return
+
+        self.Generate(distortion)
+        if (self.path is not None):
+            self.Save()
+
+    def Remap(self, image: np.ndarray, index: int) -> np.ndarray:
+        ''' Warp image by pool map `index`.'''
+        # Check : Image size differs from maps size
+        if ((image.shape[1], image.shape[0]) != tuple(self.size)):
+            raise ValueError(f'Image size {image.shape[1]}x{image.shape[0]} differs from '
+                             f'warp maps size {self.size[0]}x{self.size[1]}!')
+
+        # Check : Identity map
+        if (self.identity[index]):
+            return image
+
+        return cv2.remap(image, self.map1[index], self.map2[index], cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT)
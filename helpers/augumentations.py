@@ -1,8 +1,16 @@
 import os
+import math
+import random
+import struct
 import albumentations as A
 import cv2
+from engine.ShardReader import ShardReader
+from engine.WarpMapCache import WarpMapCache
+from helpers.colorbatch import BatchColorTransform
 
-
+# Output : Size of every augmented image
+outputWidth = 320
+outputHeight = 280
 
 # Shape : Albumentations transform
 transform_shape = A.Compose([
@@ -18,7 +26,7 @@ transform_shape = A.Compose([
     A.OpticalDistortion(distort_limit=0.2, p=0.2,
                         border_mode=cv2.BORDER_CONSTANT),
     A.ZoomBlur(max_factor=1.1, p=0.2),
-    A.Resize(width=320, height=280, always_apply=True),
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
 ], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.3))
 
 # Color : Albumentations transform
@@ -55,7 +63,7 @@ transform_color = A.Compose([
                     alpha_coef=0.5, 
                     p=0.1),
     ]),
-    A.Resize(width=320, height=280, always_apply=True),
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
 ], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
 
 # All : Full transform
@@ -64,23 +72,379 @@ transform_all = A.Compose([
     A.SomeOf([transform_shape], n=3, p=0.5),
 ], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
 
+# Presets : Pipeline tiers, `full` are pipelines above
+presets = ['fast', 'balanced', 'full']
 
-def Augment(imagePath: str,
-            outputName : str,
-            outputDirectory: str,
-            transformations) -> str:
-    ''' Read image, augment image and bboxes and save it to new file. '''
+# Crop : Source pixels area and aspect of full pipeline RandomCrop(200x180)
+cropArea = 200 * 180
+cropRatio = 200 / 180
+
+
+class ProportionalCrop(A.RandomResizedCrop):
+    ''' Crop of fixed source area (as full pipeline crop) resized to output size,
+        area share computed from size of every source image (clipped to whole image).'''
+
+    def __init__(self, area: int = cropArea, aspect: float = cropRatio,
+                 always_apply: bool = False, p: float = 0.3):
+        ''' Create crop of `area` source pixels of `aspect` (width / height).'''
+        super().__init__(height=outputHeight, width=outputWidth, ratio=(aspect, aspect),
+                         always_apply=always_apply, p=p)
+        self.area = area
+        self.aspect = aspect
+
+    def get_params_dependent_on_targets(self, params: dict) -> dict:
+        ''' Crop size from source image size, random position.'''
+        height, width = params['image'].shape[:2]
+        # Crop : Fixed aspect (stretched if clipped), area clipped to whole source image
+        area = min(self.area, width * height)
+        cropWidth = min(width, max(1, round(math.sqrt(area * self.aspect))))
+        cropHeight = min(height, max(1, round(area / cropWidth)))
+        cropWidth = min(width, max(1, round(area / cropHeight)))
+        return {'crop_height': cropHeight, 'crop_width': cropWidth,
+                'h_start': random.random(), 'w_start': random.random()}
+
+    def get_transform_init_args_names(self) -> tuple:
+        ''' Serialization arguments.'''
+        return ('area', 'aspect')
+
+
+def CropOrResize(p: float = 0.3) -> A.OneOf:
+    ''' Return first step of resize first pipelines, proportional crop of source
+        with probability `p`, plain resize otherwise (both to output size).'''
+    return A.OneOf([ProportionalCrop(p=p),
+                    A.Resize(width=outputWidth, height=outputHeight, p=1.0 - p)], p=1.0)
+
+# Color fast : Resize first, expensive ops replaced by cheap approximations
+# (Superpixels, GlassBlur -> Blur, ISONoise -> GaussNoise, Spatter -> CoarseDropout,
+#  sun flare -> gamma, fog -> brighter low contrast)
+transform_color_fast = A.Compose([
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
+    A.OneOf([
+        A.RandomBrightnessContrast(p=0.3),
+        A.Equalize(p=0.3),
+        A.ImageCompression(quality_lower=30, quality_upper=55, p=0.3),
+        A.MultiplicativeNoise(p=0.2),
+        A.Downscale(scale_min=0.4, scale_max=0.6, p=0.2),
+        A.MedianBlur(blur_limit=3, p=0.1),
+        A.GaussNoise(var_limit=(10, 50), p=0.1),
+        A.PixelDropout(dropout_prob=0.1, p=0.1),
+        A.CoarseDropout(max_holes=8, max_height=16, max_width=16, p=0.1),
+        A.Blur(blur_limit=3, p=0.2),
+    ]),
+    A.OneOf([
+        A.RandomRain(drop_length=4,
+                     blur_value=4,
+                     p=0.1),
+        A.RandomSnow(p=0.1, brightness_coeff=1),
+        A.RandomGamma(gamma_limit=(50, 80), p=0.1),
+        A.RandomBrightnessContrast(brightness_limit=(0.1, 0.3),
+                                   contrast_limit=(-0.5, -0.2),
+                                   p=0.1),
+    ]),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
+
+# Shape fast : Crop or resize first, remap distortions replaced by perspective warp
+transform_shape_fast = A.Compose([
+    CropOrResize(p=0.3),
+    A.SomeOf([
+        A.ImageCompression(quality_lower=30, quality_upper=55, p=0.3),
+        A.MotionBlur(blur_limit=7, p=0.3),
+    ], n=2),
+    A.ShiftScaleRotate(shift_limit=0.1, scale_limit=0.2, rotate_limit=15,
+                       p=0.7, border_mode=cv2.BORDER_CONSTANT),
+    A.Perspective(scale=(0.02, 0.06), p=0.4),
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.3))
+
+# All fast : Full transform of fast pipelines
+transform_all_fast = A.Compose([
+    A.SomeOf([transform_color_fast], n=3, p=0.5),
+    A.SomeOf([transform_shape_fast], n=3, p=0.5),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
+
+# Color balanced : Full color ops at output size, only slowest ops replaced
+transform_color_balanced = A.Compose([
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
+    A.OneOf([
+        A.RandomBrightnessContrast(p=0.3),
+        A.Equalize(p=0.3),
+        A.ImageCompression(quality_lower=30, quality_upper=55, p=0.3),
+        A.MultiplicativeNoise(p=0.2),
+        A.Downscale(scale_min=0.4, scale_max=0.6, p=0.2),
+        A.MedianBlur(blur_limit=3, p=0.1),
+        A.ISONoise(color_shift=(0.01, 0.08), intensity=(0.2, 0.8), p=0.1),
+        A.PixelDropout(dropout_prob=0.1, p=0.1),
+        A.Spatter(intensity=0.3, p=0.1),
+        A.Blur(blur_limit=3, p=0.2),
+    ]),
+    A.OneOf([
+        A.RandomRain(drop_length=4,
+                     blur_value=4,
+                     p=0.1),
+        A.RandomSnow(p=0.1, brightness_coeff=1),
+        A.RandomSunFlare(src_radius=100,
+                         num_flare_circles_lower=2,
+                         num_flare_circles_upper=4,
+                         p=0.1),
+        A.RandomBrightnessContrast(brightness_limit=(0.1, 0.3),
+                                   contrast_limit=(-0.5, -0.2),
+                                   p=0.1),
+    ]),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
+
+# Shape balanced : Elastic transform (slowest) replaced by perspective warp
+transform_shape_balanced = A.Compose([
+    A.SomeOf([
+        A.ImageCompression(quality_lower=30, quality_upper=55, p=0.3),
+        A.MotionBlur(blur_limit=7, p=0.3),
+    ], n=2),
+    A.GridDistortion(num_steps=3, distort_limit=0.25, p=0.2),
+    A.RandomCrop(width=200, height=180, p=0.3),
+    A.ShiftScaleRotate(shift_limit=0.1, scale_limit=0.2, rotate_limit=15,
+                       p=0.7, border_mode=cv2.BORDER_CONSTANT),
+    A.Perspective(scale=(0.02, 0.06), p=0.2),
+    A.OpticalDistortion(distort_limit=0.2, p=0.2,
+                        border_mode=cv2.BORDER_CONSTANT),
+    A.ZoomBlur(max_factor=1.1, p=0.2),
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.3))
+
+# All balanced : Full transform of balanced pipelines
+transform_all_balanced = A.Compose([
+    A.SomeOf([transform_color_balanced], n=3, p=0.5),
+    A.SomeOf([transform_shape_balanced], n=3, p=0.5),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
+
+
+class CachedWarp(A.ImageOnlyTransform):
+    ''' Transform warping image by random map of precomputed warp maps pool.'''
+
+    def __init__(self, distortion: A.Compose, cache: WarpMapCache, always_apply: bool = True, p: float = 1.0):
+        ''' Create transform sampling maps of distortion pipeline.'''
+        super().__init__(always_apply=always_apply, p=p)
+        self.distortion = distortion
+        self.cache = cache
+
+    def Prepare(self):
+        ''' Load or generate maps pool.'''
+        self.cache.Prepare(self.distortion)
+
+    def get_params(self) -> dict:
+        ''' Random map index.'''
+        return {'index': random.randrange(self.cache.poolSize)}
+
+    def apply(self, image, index: int = 0, **params):
+        ''' Warp image by map.'''
+        # Pool : Prepared on first use if not prepared before workers start
+        self.Prepare()
+        return self.cache.Remap(image, index)
+
+    def get_transform_init_args_names(self) -> tuple:
+        ''' Serialization arguments.'''
+        return ()
+
+
+# Warp : Distortions of shape pipeline sampled into maps pool at output size
+warpDistortion = A.Compose([
+    A.GridDistortion(num_steps=3, distort_limit=0.25, p=0.2),
+    A.ElasticTransform(alpha_affine=9, p=0.2, border_mode=cv2.BORDER_CONSTANT),
+    A.OpticalDistortion(distort_limit=0.2, p=0.2,
+                        border_mode=cv2.BORDER_CONSTANT),
+])
+warpMapCache = WarpMapCache(size=(outputWidth, outputHeight))
+
+# Shape cached : Crop or resize first, distortions by precomputed warp maps
+transform_shape_cached = A.Compose([
+    CropOrResize(p=0.3),
+    A.SomeOf([
+        A.ImageCompression(quality_lower=30, quality_upper=55, p=0.3),
+        A.MotionBlur(blur_limit=7, p=0.3),
+    ], n=2),
+    CachedWarp(warpDistortion, warpMapCache),
+    A.ShiftScaleRotate(shift_limit=0.1, scale_limit=0.2, rotate_limit=15,
+                       p=0.7, border_mode=cv2.BORDER_CONSTANT),
+    A.ZoomBlur(max_factor=1.1, p=0.2),
+    A.Resize(width=outputWidth, height=outputHeight, always_apply=True),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.3))
+
+# All cached : Full transform with cached shape pipeline
+transform_all_cached = A.Compose([
+    A.SomeOf([transform_color], n=3, p=0.5),
+    A.SomeOf([transform_shape_cached], n=3, p=0.5),
+], bbox_params=A.BboxParams(format='yolo', min_area=100, min_visibility=0.2))
+
+
+def ConfigureWarpMaps(poolSize: int = 64, path: str = None):
+    ''' Configure warp maps pool size and cache file, prepared pool dropped if changed.'''
+    if ((warpMapCache.poolSize, warpMapCache.path) != (poolSize, path)):
+        warpMapCache.Reset()
+    warpMapCache.poolSize = poolSize
+    warpMapCache.path = path
+
+
+def ResizeFirst(transform: A.Compose) -> A.Compose:
+    ''' Return copy of pipeline with its final resize moved to front.'''
+    return A.Compose([transform.transforms[-1]] + transform.transforms[:-1],
+                     bbox_params=transform.processors['bboxes'].params)
+
+
+# Transforms : Pipelines by name
+transforms = {
+    'color': transform_color,
+    'shape': transform_shape,
+    'all': transform_all,
+    'color_fast': transform_color_fast,
+    'shape_fast': transform_shape_fast,
+    'all_fast': transform_all_fast,
+    'color_balanced': transform_color_balanced,
+    'shape_balanced': transform_shape_balanced,
+    'all_balanced': transform_all_balanced,
+    'shape_cached': transform_shape_cached,
+    'all_cached': transform_all_cached,
+    # Batched : Color variants of image augmented as one stack after resize
+    'color_batched': BatchColorTransform(outputWidth, outputHeight),
+}
+
+# Transforms : Pipelines without geometry changes, resize can be done first
+geometrySafe = ['color']
+for name in geometrySafe:
+    transforms[f'{name}_resized'] = ResizeFirst(transforms[name])
+
+
+def IsGeometrySafe(name: str) -> bool:
+    ''' True if pipeline `name` (any tier or variant) has no geometry changes,
+        so its output does not depend on source resolution (reduced decode).'''
+    return name.split('_')[0] in geometrySafe
+
+
+def PresetName(name: str, preset: str = 'full') -> str:
+    ''' Return name of pipeline `name` (color, shape, all) in preset tier.'''
+    # Check : Unknown preset
+    if (preset not in presets):
+        raise ValueError(f'Unknown preset `{preset}`!')
+
+    return name if (preset == 'full') else f'{name}_{preset}'
+
+
+def PrepareTransform(transform):
+    ''' Prepare transformation and its children (warp maps pools).'''
+    if (hasattr(transform, 'Prepare')):
+        transform.Prepare()
+
+    for child in getattr(transform, 'transforms', []):
+        PrepareTransform(child)
+
+
+def GetTransform(name: str):
+    ''' Return transformation pipeline by name.'''
+    # Check : Unknown transformation name
+    if (name not in transforms):
+        raise ValueError(f'Unknown transformation `{name}`!')
+
+    return transforms[name]
+
+
+def ReadImageSize(imagePath: str) -> tuple:
+    ''' Read (width, height) from JPEG or PNG header, None if unknown.'''
+    with open(imagePath, 'rb') as file:
+        header = file.read(2)
+
+        # PNG : Size in IHDR chunk
+        if (header == b'\x89P'):
+            file.seek(16)
+            return struct.unpack('>II', file.read(8))
+
+        # Check : Not JPEG
+        if (header != b'\xff\xd8'):
+            return None
+
+        # JPEG : Walk markers until start of frame
+        while True:
+            marker = file.read(4)
+            if (len(marker) < 4) or (marker[0] != 0xFF):
+                return None
+
+            # Start of frame (SOF0..SOF15 without DHT, JPG, DAC) : Height and width
+            if (0xC0 <= marker[1] <= 0xCF) and (marker[1] not in (0xC4, 0xC8, 0xCC)):
+                _precision, height, width = struct.unpack('>BHH', file.read(5))
+                return width, height
+
+            # Segment : Skip
+            length = struct.unpack('>H', marker[2:])[0]
+            file.seek(length - 2, os.SEEK_CUR)
+
+
+def ReducedDecodeFlag(imageSize: tuple, targetSize: tuple) -> int:
+    ''' Return cv2.imread flag of largest reduction keeping image not smaller than target.'''
+    # Check : Unknown size
+    if (imageSize is None):
+        return cv2.IMREAD_COLOR
+
+    width, height = imageSize
+    targetWidth, targetHeight = targetSize
+    for factor, flag in [(8, cv2.IMREAD_REDUCED_COLOR_8),
+                         (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)]:
+        if (width // factor >= targetWidth) and (height // factor >= targetHeight):
+            return flag
+
+    return cv2.IMREAD_COLOR
+
+
+def ReadImage(imagePath: str, targetSize: tuple = None):
+    ''' Read (decode) image from file, reduced to not smaller than targetSize if given.'''
+    # Shard : Image stored inside tar shard
+    reader, name = ShardReader.ForPath(imagePath)
+    if (reader is not None):
+        return reader.Image(name)
+
+    # Full : Decode full resolution
+    if (targetSize is None):
+        return cv2.imread(imagePath)
+
+    # Reduced : JPEG DCT scaling decodes only needed resolution
+    return cv2.imread(imagePath, ReducedDecodeFlag(ReadImageSize(imagePath), targetSize))
+
+
+def AugmentImage(image,
+                 transformations,
+                 count: int = 1) -> list:
+    ''' Augment one decoded image `count` times, return list of images.'''
+    # Batched : All variants at once
+    if (hasattr(transformations, 'AugmentBatch')):
+        return list(transformations.AugmentBatch(image, count))
+
+    return [transformations(image=image, bboxes=[])['image'] for _ in range(count)]
+
+
+def AugmentMany(imagePath: str,
+                outputNames: list,
+                outputDirectory: str,
+                transformations) -> list:
+    ''' Read image once, augment it and save every variant to new file. '''
 
     # Read image
-    image = cv2.imread(imagePath)
+    image = ReadImage(imagePath)
+
+    # Augmentate image : One variant per output name
+    variants = AugmentImage(image, transformations, len(outputNames))
 
-    # Augmentate image
-    transformed = transformations(image=image, bboxes=[])
+    # Variants : Save all
+    outputFilepaths = []
+    for outputName, variant in zip(outputNames, variants):
+        # Create filename
+        outputFilepath = os.path.join(outputDirectory, outputName)
 
-    # Create filename
-    outputFilepath = os.path.join(outputDirectory, outputName)
+        # Image : Save
+        cv2.imwrite(outputFilepath, variant)
+        outputFilepaths.append(outputFilepath)
 
-    # Image : Save
-    cv2.imwrite(outputFilepath, transformed['image'])
+    return outputFilepaths
 
-    return outputFilepath
+
+def Augment(imagePath: str,
+            outputName : str,
+            outputDirectory: str,
+            transformations) -> str:
+    ''' Read image, augment image and bboxes and save it to new file. '''
+    return AugmentMany(imagePath, [outputName], outputDirectory, transformations)[0]
@@ -0,0 +1,120 @@
+'''
+    Batched color augmentation of stacked images.
+
+    Image is resized to output size once, replicated to (N,H,W,3) stack
+    and every sample gets its own randomly chosen operation with random
+    parameters (like A.OneOf of color pipeline) : brightness/contrast,
+    multiplicative noise, gauss noise, gamma and pixel dropout. All
+    operations are folded into per-sample lookup table (gamma, scale and
+    offset), noise sigma and dropout probability. Parameters are drawn
+    for whole stack by NumPy, samples are transformed by single OpenCV
+    call each (untouched samples are only copied). Noise is cropped at
+    random offset from noise bank generated once per output size from
+    fixed seed (not job random stream), so variants depend only on job
+    seed, not on worker or order of jobs.
+'''
+import cv2
+import numpy as np
+
+# Operations : Names and selection weights (normalized like A.OneOf)
+operations = ['brightness_contrast', 'multiplicative_noise', 'gauss_noise', 'gamma', 'pixel_dropout']
+operationsWeights = np.array([0.3, 0.2, 0.1, 0.1, 0.1])
+# Noise : Fixed point scale of gauss noise bank
+noiseScale = 16
+# Noise : Seed of noise banks generator
+noiseSeed = 0
+
+
+def RandomParameters(count: int) -> dict:
+    ''' Draw per-sample operation parameters for stack of `count` images.'''
+    # Operation : Chosen for every sample, applied with probability 0.5
+    chosen = np.random.choice(len(operations), count, p=operationsWeights / operationsWeights.sum())
+    applied = np.random.random(count) < 0.5
+    selected = {name: applied & (chosen == index) for index, name in enumerate(operations)}
+
+    # Affine : Brightness/contrast or multiplicative noise
+    contrast = 1 + np.random.uniform(-0.2, 0.2, count)
+    brightness = np.random.uniform(-0.2, 0.2, count)
+    multiplier = np.random.uniform(0.9, 1.1, count)
+    scale = np.where(selected['brightness_contrast'], contrast, 1.0)
+    scale = np.where(selected['multiplicative_noise'], multiplier, scale)
+    offset = np.where(selected['brightness_contrast'], brightness * 255, 0.0)
+
+    return {
+        'scale': scale.astype(np.float32),
+        'offset': offset.astype(np.float32),
+        'sigma': np.where(selected['gauss_noise'], np.sqrt(np.random.uniform(10, 50, count)), 0).astype(np.float32),
+        'gamma': np.where(selected['gamma'], np.random.uniform(0.8, 1.2, count), 1.0),
+        'dropout': np.where(selected['pixel_dropout'], 0.1, 0.0),
+    }
+
+
+def NoiseBank(height: int, width: int, seed: int = noiseSeed) -> tuple:
+    ''' Return (gauss, uniform) noise banks twice the image size, cropped at random offsets.'''
+    generator = np.random.default_rng(seed)
+    gauss = (generator.standard_normal((2 * height, 2 * width, 3)) * noiseScale).astype(np.int16)
+    uniform = generator.integers(0, 256, (2 * height, 2 * width), dtype=np.uint8)
+    return gauss, uniform
+
+
+def AugmentColorStack(stack: np.ndarray, parameters: dict, banks: tuple) -> np.ndarray:
+    ''' Apply per-sample color parameters to (N,H,W,3) uint8 stack.'''
+    result = np.array(stack, order='C')
+    height, width = stack.shape[1:3]
+    gauss, uniform = banks
+
+    # Tables : Gamma, scale and offset folded into one lookup table per sample
+    levels = np.arange(256) / 255
+    tables = np.power(levels[None], parameters['gamma'][:, None]) * 255
+    tables = tables * parameters['scale'][:, None] + parameters['offset'][:, None]
+    tables = np.clip(np.rint(tables), 0, 255).astype(np.uint8)
+
+    # Tables : Applied only to samples with not identity table
+    changed = np.flatnonzero(np.any(tables != np.arange(256, dtype=np.uint8), axis=1))
+    for index in changed:
+        result[index] = cv2.LUT(stack[index], tables[index])
+
+    # Noise : Gauss noise cropped from bank at random offset
+    for index in np.flatnonzero(parameters['sigma'] != 0):
+        y, x = np.random.randint(0, height), np.random.randint(0, width)
+        result[index] = cv2.addWeighted(result[index], 1.0, gauss[y:y + height, x:x + width],
+                                        parameters['sigma'][index] / noiseScale, 0.0, dtype=cv2.CV_8U)
+
+    # Dropout : Zero random pixels (all channels)
+    for index in np.flatnonzero(parameters['dropout'] != 0):
+        y, x = np.random.randint(0, height), np.random.randint(0, width)
+        threshold = parameters['dropout'][index] * 256 - 1
+        _, keep = cv2.threshold(uniform[y:y + height, x:x + width], threshold, 255, cv2.THRESH_BINARY)
+        result[index] = cv2.bitwise_and(result[index], result[index], mask=keep)
+
+    return result
+
+
+class BatchColorTransform:
+    ''' Color transformation augmenting all variants of image as one stack.'''
+
+    def __init__(self, width: int, height: int):
+        ''' Create transformation with output size.'''
+        self.width = width
+        self.height = height
+        # Noise : Banks generated by Prepare (before workers fork)
+        self.banks = None
+
+    def Prepare(self):
+        ''' Generate noise banks (same for every process).'''
+        if (self.banks is None):
+            self.banks = NoiseBank(self.height, self.width)
+
+    def AugmentBatch(self, image: np.ndarray, count: int) -> np.ndarray:
+        ''' Resize image once and return (count,H,W,3) stack of color variants.'''
+        resized = cv2.resize(image, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        stack = np.broadcast_to(resized, (count,) + resized.shape)
+
+        # Noise : Banks if not prepared before
+        self.Prepare()
+
+        return AugmentColorStack(stack, RandomParameters(count), self.banks)
+
+    def __call__(self, image: np.ndarray, **kwargs) -> dict:
+        ''' Augment single image (albumentations call convention).'''
+        return {'image': self.AugmentBatch(image, 1)[0]}
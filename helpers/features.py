@@ -0,0 +1,122 @@
+'''
+    Helper functions for CPU feature extraction and similarities.
+
+    Features are color histograms of horizontal stripes (classic reid
+    descriptor) : every image is resized to fixed size, converted to HSV
+    and quantized, then whole batch is histogrammed by single bincount.
+'''
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from engine.ShardReader import ShardReader
+
+# Features : Image size (width, height) before histogram
+featuresSize = (64, 128)
+# Features : Horizontal stripes count
+featuresStripes = 4
+# Features : HSV bins (hue, saturation, value)
+featuresBins = (8, 4, 4)
+# Features : Dimension of feature vector
+featuresDimension = featuresStripes * featuresBins[0] * featuresBins[1] * featuresBins[2]
+
+
+def ReadFeaturesImage(imagePath: str) -> np.ndarray:
+    ''' Read image, resize to features size and convert to HSV.'''
+    image = ShardReader.ReadPath(imagePath, cv2.IMREAD_REDUCED_COLOR_2)
+    # Check : Image not decoded
+    if (image is None):
+        raise IOError(f'Cannot read image `{imagePath}`!')
+
+    image = cv2.resize(image, featuresSize, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+
+
+def ExtractFeatures(images: np.ndarray) -> np.ndarray:
+    ''' Extract L2 normalized features from (N,H,W,3) HSV images stack.'''
+    count, height, _width, _channels = images.shape
+    hueBins, saturationBins, valueBins = featuresBins
+    binsPerStripe = hueBins * saturationBins * valueBins
+
+    # Quantize : Bin index of every pixel (OpenCV hue is 0..179)
+    hue = (images[..., 0].astype(np.int32) * hueBins) // 180
+    saturation = (images[..., 1].astype(np.int32) * saturationBins) // 256
+    value = (images[..., 2].astype(np.int32) * valueBins) // 256
+    bins = (hue * saturationBins + saturation) * valueBins + value
+
+    # Stripes : Offset bins by stripe of pixel row
+    stripes = (np.arange(height) * featuresStripes) // height
+    bins += (stripes * binsPerStripe)[None, :, None]
+
+    # Images : Offset bins by image index, histogram whole batch at once
+    bins += (np.arange(count) * featuresDimension)[:, None, None]
+    features = np.bincount(bins.ravel(), minlength=count * featuresDimension)
+    features = features.reshape(count, featuresDimension).astype(np.float32)
+
+    return NormalizeFeatures(features)
+
+
+def NormalizeFeatures(features: np.ndarray) -> np.ndarray:
+    ''' L2 normalize feature vectors (rows).'''
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-12)
+
+
+def ExtractFeaturesBatches(paths: list,
+                           batchSize: int = 256,
+                           threads: int = 4):
+    ''' Extract features of images in batches, yield (start, features) tuples.'''
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for start in range(0, len(paths), batchSize):
+            # Batch : Decode in threads, OpenCV releases GIL
+            images = list(executor.map(ReadFeaturesImage, paths[start:start + batchSize]))
+            yield start, ExtractFeatures(np.stack(images))
+
+
+def SimilarityMatrix(features: np.ndarray,
+                     tile: int = 2048,
+                     out: np.ndarray = None) -> np.ndarray:
+    ''' Cosine similarity matrix of features rows, computed in tiles.'''
+    count = len(features)
+    features = NormalizeFeatures(np.asarray(features, dtype=np.float32))
+
+    # Output : Allocate if not given (may be memory mapped)
+    if (out is None):
+        out = np.empty((count, count), dtype=np.float32)
+
+    # Tiles : Blocked matrix multiplication, bounded temporaries
+    for rowStart in range(0, count, tile):
+        rows = features[rowStart:rowStart + tile]
+        for columnStart in range(0, count, tile):
+            columns = features[columnStart:columnStart + tile]
+            out[rowStart:rowStart + tile, columnStart:columnStart + tile] = rows @ columns.T
+
+    return out
+
+
+def TopK(similarities: np.ndarray, k: int) -> np.ndarray:
+    ''' Return column indices of k largest values of every row, sorted descending.'''
+    k = min(k, similarities.shape[1])
+    # Partition : Unordered top k, then sort only k values
+    indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(similarities, indices, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(indices, order, axis=1)
+
+
+def ExactSearch(features: np.ndarray,
+                queries: np.ndarray,
+                k: int,
+                tile: int = 2048) -> tuple:
+    ''' Exact cosine top-k search of queries in features, return (indices, similarities).'''
+    features = NormalizeFeatures(np.asarray(features, dtype=np.float32))
+    queries = NormalizeFeatures(np.asarray(queries, dtype=np.float32))
+    indices = np.zeros((len(queries), min(k, len(features))), dtype=np.int64)
+    similarities = np.zeros(indices.shape, dtype=np.float32)
+
+    # Tiles : Queries in blocks, bounded temporaries
+    for start in range(0, len(queries), tile):
+        block = queries[start:start + tile] @ features.T
+        indices[start:start + tile] = TopK(block, k)
+        similarities[start:start + tile] = np.take_along_axis(block, indices[start:start + tile], axis=1)
+
+    return indices, similarities
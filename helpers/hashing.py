@@ -3,6 +3,10 @@ Created on 12 lis 2020
 
 @author: spasz
 '''
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from engine.ShardReader import ShardReader
 
 
 def GetHexList():
@@ -34,4 +38,50 @@ def GetRandomSha1() -> str:
     m.update(str(counter).encode('ASCII'))
     m.update(str(datetime.datetime.now().timestamp()).encode('ASCII'))
     counter+=1
-    return m.hexdigest()
\ No newline at end of file
+    return m.hexdigest()
+
+# Popcount : Bits count of every byte value
+popcountTable = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def HashThumbnail(image: np.ndarray) -> np.ndarray:
+    ''' Return 9x8 grayscale thumbnail of decoded (reduced) BGR image for dHash.'''
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+
+
+def ReadHashImage(imagePath: str) -> np.ndarray:
+    ''' Read image at reduced resolution and return its dHash thumbnail.'''
+    image = ShardReader.ReadPath(imagePath, cv2.IMREAD_REDUCED_COLOR_4)
+    # Check : Image not decoded
+    if (image is None):
+        raise IOError(f'Cannot read image `{imagePath}`!')
+
+    return HashThumbnail(image)
+
+
+def DHash(images: np.ndarray) -> np.ndarray:
+    ''' Return 64-bit dHash of every (N,8,9) grayscale image as uint64 array.'''
+    # Bits : Pixel brighter than right neighbour, row major
+    bits = images[:, :, 1:] > images[:, :, :-1]
+    # Pack : 8 bytes per image, big endian to keep bits order
+    packed = np.packbits(bits.reshape(len(images), 64), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+
+def DHashBatches(paths: list,
+                 batchSize: int = 1024,
+                 threads: int = 4):
+    ''' Compute dHash of images in batches, yield (start, hashes) tuples.'''
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for start in range(0, len(paths), batchSize):
+            # Batch : Decode in threads, OpenCV releases GIL
+            images = list(executor.map(ReadHashImage, paths[start:start + batchSize]))
+            yield start, DHash(np.stack(images))
+
+
+def HammingDistance(hashes1: np.ndarray, hashes2: np.ndarray) -> np.ndarray:
+    ''' Return Hamming distances of uint64 hashes (broadcasted).'''
+    xor = np.bitwise_xor(np.asarray(hashes1, dtype=np.uint64), np.asarray(hashes2, dtype=np.uint64))
+    xor = np.ascontiguousarray(xor)
+    return popcountTable[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1, dtype=np.int64)
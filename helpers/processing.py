@@ -0,0 +1,253 @@
+'''
+    Helper functions for running augmentation jobs in parallel.
+
+    Jobs are streamed through three stages connected by bounded queues :
+    reader threads (decode), augment workers (threads or process pool)
+    and writer threads (encode and save). Queue depth limits the number
+    of decoded images in flight, which gives backpressure on slow stages.
+    Cancelled run drains stages without processing, so all threads end.
+    Stage error or closed generator stops the run : stages are drained
+    and joined before error is raised, no output is written afterwards.
+    With profiling enabled stages are timed and worker processes return
+    transforms records with every result, merged into parent profiler.
+'''
+import os
+import queue
+import random
+import logging
+import threading
+import multiprocessing
+import multiprocessing.pool
+from contextlib import nullcontext
+import cv2
+import numpy as np
+from engine.AugmentJob import AugmentJob
+from engine.ShardWriter import ShardWriter
+from functools import partial
+from helpers.augumentations import AugmentImage, GetTransform, IsGeometrySafe, PrepareTransform, ReadImage, outputHeight, outputWidth, transforms
+import helpers.profiler as profiling
+
+# Sentinel : Marks end of stage input
+StageEnd = None
+
+
+def InitWorker(profile: bool = False):
+    ''' Initialize worker process.'''
+    # Random : Reseed, forked workers inherit parent random state
+    seed = int.from_bytes(os.urandom(4), 'little')
+    random.seed(seed)
+    np.random.seed(seed)
+
+    # OpenCV : Single thread per worker, pool provides parallelism
+    cv2.setNumThreads(1)
+
+    # Profiler : Instrument worker copy of pipelines
+    if (profile):
+        profiling.EnableProfiling(transforms)
+
+
+def SeedJob(seed: int):
+    ''' Seed all random generators used by transformations.'''
+    random.seed(seed)
+    np.random.seed(seed)
+    cv2.setRNGSeed(seed & 0x7FFFFFFF)
+
+
+def AugmentVariants(transform: str, image: np.ndarray, count: int, seed: int = None) -> list:
+    ''' Augment decoded image `count` times by named transformation (seeded by job seed).'''
+    # Seed : Same variants for same job seed, independent of worker
+    if (seed is not None):
+        SeedJob(seed)
+
+    return AugmentImage(image, GetTransform(transform), count)
+
+
+def AugmentVariantsProfiled(transform: str, image: np.ndarray, count: int, seed: int = None) -> tuple:
+    ''' Augment variants in worker process, return (variants, profiler records).'''
+    variants = AugmentVariants(transform, image, count, seed)
+    return variants, profiling.profiler.Pop()
+
+
+def ReadJob(job: AugmentJob, reducedDecode: bool = False) -> tuple:
+    ''' Reader stage : Decode job source image (reduced to output size for
+        geometry safe pipelines only, absolute crops of shape pipelines
+        depend on source resolution).'''
+    reduced = (reducedDecode) and (IsGeometrySafe(job.transform))
+    with profiling.Measure('stage/read'):
+        image = ReadImage(job.source, (outputWidth, outputHeight) if (reduced) else None)
+
+    # Check : Image not decoded
+    if (image is None):
+        raise IOError(f'Cannot read image `{job.source}`!')
+
+    return job, image
+
+
+def WriteJob(item: tuple, sink: ShardWriter = None) -> AugmentJob:
+    ''' Writer stage : Encode and save all job variants (files or shards), return finished job.'''
+    job, variants = item
+
+    # Variants : Save all
+    with profiling.Measure('stage/write'):
+        for outputName, outputPath, variant in zip(job.outputNames, job.outputPaths, variants):
+            # Sink : Encoded image streamed to shard
+            if (sink is not None):
+                sink.Write(outputName, cv2.imencode(os.path.splitext(outputName)[1], variant)[1].tobytes())
+            else:
+                cv2.imwrite(outputPath, variant)
+
+    return job
+
+
+class Stage:
+    ''' Pool of threads processing items from input queue into output queue.'''
+
+    def __init__(self, name: str, function, threads: int,
+                 inputQueue: queue.Queue, outputQueue: queue.Queue,
+                 nextThreads: int, errors: queue.Queue,
+                 cancel: threading.Event = None,
+                 stop: threading.Event = None):
+        ''' Create and start stage threads.'''
+        self.name = name
+        self.cancel = cancel
+        self.stop = stop
+        self.function = function
+        self.inputQueue = inputQueue
+        self.outputQueue = outputQueue
+        self.nextThreads = nextThreads
+        self.errors = errors
+        self.running = threads
+        self.lock = threading.Lock()
+        # Threads : Create and start
+        self.threads = [threading.Thread(target=self.Run, name=f'{name}{index}', daemon=True)
+                        for index in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    @property
+    def cancelled(self) -> bool:
+        ''' True if run is cancelled (by caller) or stopped (by error or consumer).'''
+        return any((event is not None) and (event.is_set()) for event in (self.cancel, self.stop))
+
+    def Run(self):
+        ''' Thread loop.'''
+        while True:
+            item = self.inputQueue.get()
+            # Check : End of input
+            if (item is StageEnd):
+                break
+            # Check : Cancelled, drain input
+            if (self.cancelled):
+                continue
+
+            # Function : Process item, errors are reported to consumer and stop run
+            try:
+                self.outputQueue.put(self.function(item))
+            except Exception as error:
+                logging.error('(%s) %s', self.name, error)
+                self.errors.put(error)
+                if (self.stop is not None):
+                    self.stop.set()
+
+        # Last thread : Finish next stage
+        with self.lock:
+            self.running -= 1
+            if (self.running == 0):
+                for _ in range(self.nextThreads):
+                    self.outputQueue.put(StageEnd)
+
+    def Join(self):
+        ''' Wait for all stage threads.'''
+        for thread in self.threads:
+            thread.join()
+
+
+def ProcessJobs(jobs: list,
+                workers: int = 1,
+                queueDepth: int = 8,
+                ioThreads: int = 2,
+                reducedDecode: bool = False,
+                profile: bool = False,
+                sink: ShardWriter = None,
+                pool: multiprocessing.pool.Pool = None,
+                cancel: threading.Event = None):
+    ''' Execute jobs by reader/augment/writer pipeline, yield finished jobs.
+        Augment stage uses given (long running) pool or own pool of workers,
+        set cancel event stops processing of remaining jobs. Stage error
+        or closing generator stops all stages before returning.'''
+    # Profiler : Instrument pipelines of this process
+    if (profile):
+        profiling.EnableProfiling(transforms)
+
+    # Workers : Zero means all cores
+    if (workers is None) or (workers <= 0):
+        workers = os.cpu_count()
+
+    # Check : Nothing to do
+    if (len(jobs) == 0):
+        return
+
+    # Transformations : Prepare before workers start (shared by fork)
+    for name in {job.transform for job in jobs}:
+        PrepareTransform(GetTransform(name))
+
+    # Pool : Augment stage in given pool, worker processes, in-thread for single worker
+    if (pool is not None):
+        poolContext = nullcontext(pool)
+    elif (workers > 1):
+        poolContext = multiprocessing.Pool(processes=workers, initializer=InitWorker, initargs=(profile,))
+    else:
+        poolContext = nullcontext()
+
+    with poolContext as pool:
+        def AugmentItem(item: tuple) -> tuple:
+            ''' Augment stage : Augment decoded image into job variants.'''
+            job, image = item
+            with profiling.Measure('stage/augment'):
+                # Pool : Worker records merged into this process profiler
+                if (pool is not None) and (profile):
+                    variants, records = pool.apply(AugmentVariantsProfiled, (job.transform, image, job.count, job.seed))
+                    profiling.profiler.Merge(records)
+                elif (pool is not None):
+                    variants = pool.apply(AugmentVariants, (job.transform, image, job.count, job.seed))
+                else:
+                    variants = AugmentVariants(job.transform, image, job.count, job.seed)
+            return job, variants
+
+        # Queues : Bounded between stages for backpressure
+        jobsQueue = queue.Queue()
+        readQueue = queue.Queue(maxsize=max(1, queueDepth))
+        writeQueue = queue.Queue(maxsize=max(1, queueDepth))
+        doneQueue = queue.Queue()
+        errors = queue.Queue()
+
+        # Jobs : Feed reader stage
+        for job in jobs:
+            jobsQueue.put(job)
+        for _ in range(ioThreads):
+            jobsQueue.put(StageEnd)
+
+        # Stages : Create reader, augment and writer stages
+        stop = threading.Event()
+        stages = [Stage('Reader', partial(ReadJob, reducedDecode=reducedDecode), ioThreads,
+                        jobsQueue, readQueue, workers, errors, cancel, stop),
+                  Stage('Augment', AugmentItem, workers, readQueue, writeQueue, ioThreads, errors, cancel, stop),
+                  Stage('Writer', partial(WriteJob, sink=sink), ioThreads, writeQueue, doneQueue, 1, errors, cancel, stop)]
+
+        # Results : Yield until writer stage finished
+        try:
+            while True:
+                job = doneQueue.get()
+                # Check : Any stage error
+                if (not errors.empty()):
+                    raise errors.get()
+                # Check : Writer stage finished
+                if (job is StageEnd):
+                    break
+
+                yield job
+        finally:
+            # Stages : Stopped stages drain their inputs, joined before pool closes
+            stop.set()
+            for stage in stages:
+                stage.Join()
@@ -0,0 +1,174 @@
+'''
+    Pipeline cost profiler.
+
+    Every transform of albumentations pipelines is instrumented (its class
+    is swapped for timed subclass) to record invocations, applied count
+    and wall time histogram. Pipeline stages (read, augment, write) are
+    measured by `Measure` context. Worker processes return their records,
+    which are merged into parent profiler.
+'''
+from __future__ import annotations
+from contextlib import contextmanager, nullcontext
+import json
+import time
+import threading
+import numpy as np
+import albumentations as A
+
+# Histogram : Buckets upper bounds in milliseconds (last is infinity)
+histogramBounds = [0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, float('inf')]
+
+# Profiler : Active profiler of this process, None if disabled
+profiler = None
+
+
+class Profiler:
+    ''' Class recording calls count, applied count and time histograms by key.'''
+
+    def __init__(self):
+        ''' Create empty profiler.'''
+        self.records = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def Record(self, key: str, elapsed: float, applied: bool = None):
+        ''' Record single call of key taking elapsed seconds (applied None if unknown).'''
+        milliseconds = 1000 * elapsed
+        bucket = int(np.searchsorted(histogramBounds, milliseconds))
+        with self.lock:
+            # Record : Create if not exists
+            if (key not in self.records):
+                self.records[key] = {'calls': 0, 'applied': 0, 'total_ms': 0.0,
+                                     'histogram': [0] * len(histogramBounds)}
+            record = self.records[key]
+            record['calls'] += 1
+            record['applied'] += int(applied is not False)
+            record['total_ms'] += milliseconds
+            record['histogram'][bucket] += 1
+
+    def Merge(self, records: dict):
+        ''' Merge records of other profiler.'''
+        with self.lock:
+            for key, other in records.items():
+                # Record : Copy if not exists
+                if (key not in self.records):
+                    self.records[key] = {'calls': 0, 'applied': 0, 'total_ms': 0.0,
+                                         'histogram': [0] * len(histogramBounds)}
+                record = self.records[key]
+                record['calls'] += other['calls']
+                record['applied'] += other['applied']
+                record['total_ms'] += other['total_ms']
+                record['histogram'] = [a + b for a, b in zip(record['histogram'], other['histogram'])]
+
+    def Pop(self) -> dict:
+        ''' Return records and reset profiler.'''
+        with self.lock:
+            records, self.records = self.records, {}
+        return records
+
+    def Report(self) -> dict:
+        ''' Return report dictionary (JSON serializable).'''
+        with self.lock:
+            return {'wall_ms': 1000 * (time.perf_counter() - self.started),
+                    'histogram_bounds_ms': [str(bound) for bound in histogramBounds],
+                    'records': {key: dict(record,
+                                          applied_ratio=record['applied'] / max(1, record['calls']),
+                                          mean_ms=record['total_ms'] / max(1, record['calls']))
+                                for key, record in self.records.items()}}
+
+    def Save(self, path: str):
+        ''' Save JSON report to file.'''
+        with open(path, 'w') as file:
+            json.dump(self.Report(), file, indent=2)
+
+    def Summary(self, limit: int = 40) -> str:
+        ''' Return summary table sorted by total time.'''
+        records = sorted(self.Report()['records'].items(), key=lambda item: -item[1]['total_ms'])
+        lines = [f'{"key":<52} {"calls":>8} {"applied":>8} {"mean ms":>9} {"total s":>9}']
+        for key, record in records[:limit]:
+            lines.append(f'{key[-52:]:<52} {record["calls"]:>8} {record["applied_ratio"]:>8.2f} '
+                         f'{record["mean_ms"]:>9.3f} {record["total_ms"] / 1000:>9.2f}')
+        return '\n'.join(lines)
+
+
+# Profiled classes : Original class to timed subclass
+profiledClasses = {}
+
+
+def ProfiledClass(cls: type) -> type:
+    ''' Return subclass of transform class recording its calls.'''
+    if (cls in profiledClasses):
+        return profiledClasses[cls]
+
+    def __call__(self, *args, **kwargs):
+        ''' Timed call.'''
+        self._profileApplied = False if (isinstance(self, A.BasicTransform)) else None
+        start = time.perf_counter()
+        result = cls.__call__(self, *args, **kwargs)
+        if (profiler is not None):
+            profiler.Record(self._profileKey, time.perf_counter() - start, self._profileApplied)
+        return result
+
+    def apply_with_params(self, params, **kwargs):
+        ''' Marks transform as applied.'''
+        self._profileApplied = True
+        return cls.apply_with_params(self, params, **kwargs)
+
+    def AugmentBatch(self, *args, **kwargs):
+        ''' Timed batch augmentation.'''
+        start = time.perf_counter()
+        result = cls.AugmentBatch(self, *args, **kwargs)
+        if (profiler is not None):
+            profiler.Record(self._profileKey, time.perf_counter() - start, True)
+        return result
+
+    members = {'__call__': __call__}
+    if (issubclass(cls, A.BasicTransform)):
+        members['apply_with_params'] = apply_with_params
+    # Batched : Transformations augmenting all variants at once
+    if (hasattr(cls, 'AugmentBatch')):
+        members['AugmentBatch'] = AugmentBatch
+
+    profiledClasses[cls] = type(cls.__name__, (cls,), members)
+    return profiledClasses[cls]
+
+
+def Instrument(transform, key: str):
+    ''' Instrument transform and all its children, keyed by tree path.'''
+    # Check : Already instrumented (pipelines share sub pipelines)
+    if (hasattr(transform, '_profileKey')):
+        return
+
+    transform._profileKey = key
+    transform.__class__ = ProfiledClass(type(transform))
+
+    # Children : Compositions (Compose, OneOf, SomeOf)
+    for index, child in enumerate(getattr(transform, 'transforms', [])):
+        Instrument(child, f'{key}/{index}:{type(child).__name__}')
+
+
+def EnableProfiling(transforms: dict) -> Profiler:
+    ''' Enable profiling in this process, instrument pipelines by name.'''
+    global profiler
+    if (profiler is None):
+        profiler = Profiler()
+        for name, transform in transforms.items():
+            Instrument(transform, name)
+
+    return profiler
+
+
+def Measure(key: str):
+    ''' Context measuring stage time, does nothing if profiling disabled.'''
+    if (profiler is None):
+        return nullcontext()
+
+    return Measuring(key)
+
+
+@contextmanager
+def Measuring(key: str):
+    ''' Context recording time of block.'''
+    start = time.perf_counter()
+    yield
+    profiler.Record(key, time.perf_counter() - start, True)
@@ -0,0 +1,39 @@
+'''
+    Helper functions for scanning dataset directories trees.
+
+    Directories are listed by `os.scandir` (file types without extra
+    stat calls) in thread pool, so listing of many directories on
+    network storage overlaps instead of serial round-trips.
+'''
+import os
+from helpers.files import IsImageFile
+
+# Scanning : Directories names never scanned (outputs of this tool)
+scanExcludes = {'generated'}
+
+
+def IsScannedDirectory(name: str) -> bool:
+    ''' True if subdirectory should be scanned (not hidden, not excluded).'''
+    return (not name.startswith('.')) and (name not in scanExcludes)
+
+
+def StatDirectory(path: str) -> int:
+    ''' Return directory modification time in nanoseconds.'''
+    return os.stat(path).st_mtime_ns
+
+
+def ListDirectory(path: str) -> tuple:
+    ''' Return (mtime, images names, subdirectories names) of directory.'''
+    # Directory : Modification time, taken before listing
+    mtime = StatDirectory(path)
+
+    images, subdirectories = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if (entry.is_dir(follow_symlinks=False)):
+                if (IsScannedDirectory(entry.name)):
+                    subdirectories.append(entry.name)
+            elif (IsImageFile(entry.name)):
+                images.append(entry.name)
+
+    return mtime, images, sorted(subdirectories)
@@ -0,0 +1,73 @@
+'''
+    Helper functions for per-image visual statistics.
+
+    Every image is decoded once at reduced resolution and resized to
+    small fixed size, then whole batch is reduced by NumPy : circular
+    hue mean, saturation and brightness means. dHash is computed from
+    same decode by helpers.hashing (same hash as NearDuplicates).
+    Batches are spread over process pool.
+'''
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from engine.ShardReader import ShardReader
+from helpers.hashing import DHash, HashThumbnail
+
+# Visuals : Image size (width, height) before statistics
+visualsSize = (32, 64)
+
+
+def ReadVisualsImage(imagePath: str) -> tuple:
+    ''' Read image at reduced resolution, return (visuals size image, dHash thumbnail).'''
+    image = ShardReader.ReadPath(imagePath, cv2.IMREAD_REDUCED_COLOR_4)
+    # Check : Image not decoded
+    if (image is None):
+        raise IOError(f'Cannot read image `{imagePath}`!')
+
+    return cv2.resize(image, visualsSize, interpolation=cv2.INTER_AREA), HashThumbnail(image)
+
+
+def ComputeVisuals(images: np.ndarray, thumbnails: np.ndarray) -> dict:
+    ''' Compute visual statistics of (N,H,W,3) BGR images stack and (N,8,9) dHash thumbnails.'''
+    # HSV : Convert whole stack as one tall image
+    hsv = cv2.cvtColor(images.reshape(-1, images.shape[2], 3), cv2.COLOR_BGR2HSV)
+    hsv = hsv.reshape(images.shape).astype(np.float32)
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    # Hue : Circular mean weighted by saturation, in degrees 0..360
+    angle = np.deg2rad(hue * 2)
+    weights = saturation / 255
+    sines = (np.sin(angle) * weights).sum(axis=(1, 2))
+    cosines = (np.cos(angle) * weights).sum(axis=(1, 2))
+    hueMean = np.rad2deg(np.arctan2(sines, cosines)) % 360
+
+    return {
+        'hue': hueMean.astype(np.float32),
+        'saturation': (saturation.mean(axis=(1, 2)) / 255).astype(np.float32),
+        'brightness': (value.mean(axis=(1, 2)) / 255).astype(np.float32),
+        'dhash': DHash(thumbnails),
+    }
+
+
+def ComputeVisualsPaths(paths: list) -> dict:
+    ''' Read images and compute their visual statistics.'''
+    images, thumbnails = zip(*[ReadVisualsImage(path) for path in paths])
+    return ComputeVisuals(np.stack(images), np.stack(thumbnails))
+
+
+def ComputeVisualsBatches(paths: list,
+                          batchSize: int = 512,
+                          workers: int = None):
+    ''' Compute visual statistics of images in batches, yield (start, visuals) tuples.'''
+    batches = [paths[start:start + batchSize] for start in range(0, len(paths), batchSize)]
+
+    # Sequential : Single worker runs in this process
+    if (workers == 1):
+        for index, batch in enumerate(batches):
+            yield index * batchSize, ComputeVisualsPaths(batch)
+        return
+
+    # Pool : Batches processed in parallel, results in order
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for index, visuals in enumerate(executor.map(ComputeVisualsPaths, batches)):
+            yield index * batchSize, visuals
@@ -1,17 +1,222 @@
 #!/usr/bin/python3
-from copy import copy
 import os
 from pathlib import Path
 import sys
 import random
 import argparse
 import logging
+import cv2
+import numpy as np
 from tqdm import tqdm
 from engine.AnnoterReid import AnnoterReid
-from engine.ImageData import ImageData
+from engine.AugmentService import Serve
+from engine.PackedDataset import PackedDataset
 from engine.ReidFileInfo import ReidFileInfo
-from helpers.augumentations import Augment, transform_color, transform_shape, transform_all
+from engine.RunManifest import RunManifest
+from engine.Scheduler import Scheduler
+from engine.ShardReader import ShardReader
+from engine.ShardWriter import ShardWriter, shardsIndexFilename
+from helpers.augumentations import ConfigureWarpMaps, GetTransform, PrepareTransform, PresetName, geometrySafe, presets
 from helpers.files import FixPath, GetFileLocation 
+from helpers.processing import AugmentVariants, ProcessJobs, ReadJob, SeedJob
+import helpers.profiler as profiling
+
+def PresetTransformName(arguments: argparse.Namespace) -> str:
+    ''' Return pipeline name (color, shape, all) in preset tier selected by arguments.'''
+    if (arguments.augumentColor):
+        name = 'color'
+    elif (arguments.augumentShape):
+        name = 'shape'
+    else:
+        name = 'all'
+
+    # Preset : Pipeline tier (fast and balanced color pipelines resize first already)
+    return PresetName(name, arguments.preset)
+
+
+def IgnoredOptions(arguments: argparse.Namespace) -> list:
+    ''' Return names of pipeline options given by arguments, not applied by selected pipeline.'''
+    name = PresetTransformName(arguments)
+    ignored = []
+    # Batched : Full color pipeline only
+    if (arguments.batchedColor) and (name != 'color'):
+        ignored.append('batchedColor')
+    # Warp maps : Full shape pipelines only
+    if (arguments.warpMaps is not None) and (name not in ['shape', 'all']):
+        ignored.append('warpMaps')
+    # Resize first : Full geometry safe pipelines only, batched color resizes first already
+    if (arguments.resizeFirst) and ((name not in geometrySafe) or (arguments.batchedColor)):
+        ignored.append('resizeFirst')
+
+    return ignored
+
+
+def CheckTransformOptions(arguments: argparse.Namespace) -> bool:
+    ''' True if all pipeline options given by arguments are applied by selected pipeline.'''
+    ignored = IgnoredOptions(arguments)
+    for name in ignored:
+        logging.error('Option `%s` is not applied by `%s` pipeline (preset %s)!',
+                      name, PresetTransformName(arguments), arguments.preset)
+
+    return len(ignored) == 0
+
+
+def TransformName(arguments: argparse.Namespace) -> str:
+    ''' Return transformation name selected by arguments.'''
+    name = PresetTransformName(arguments)
+
+    # Batched : Color variants augmented as one stack
+    if (arguments.batchedColor) and (name == 'color'):
+        return 'color_batched'
+
+    # Warp maps : Shape distortions by precomputed maps pool
+    if (arguments.warpMaps is not None) and (name in ['shape', 'all']):
+        return f'{name}_cached'
+
+    # Resize first : Only for pipelines without geometry changes
+    if (arguments.resizeFirst) and (name in geometrySafe):
+        return f'{name}_resized'
+
+    return name
+
+
+def PlanJobs(annoter: AnnoterReid,
+             outputPath: str,
+             arguments: argparse.Namespace,
+             seed: int = None) -> list:
+    ''' Plan identity balanced augmentation jobs, report projected outputs.'''
+    scheduler = Scheduler(annoter=annoter,
+                          iterations=arguments.iterations,
+                          cap=arguments.cap,
+                          cameraWeight=arguments.cameraWeight,
+                          shard=arguments.shard)
+    logging.info('(Scheduler) %s', scheduler.Report())
+    return scheduler.Plan(outputPath, TransformName(arguments), seed)
+
+
+def PrepareRun(manifest: RunManifest):
+    ''' Prepare run transformations (warp maps pools) by run options, seeded by pool seed
+        of run (service jobs share pool of service) or run seed.'''
+    # Warp maps : Pool of run, configured before first use
+    if (manifest.run.get('warpMaps', None) is not None):
+        ConfigureWarpMaps(manifest.run['warpMaps'], manifest.run.get('warpFile', None))
+
+    SeedJob(manifest.run.get('warpSeed', manifest.run['seed']))
+    for name in {job.transform for job in manifest.jobs}:
+        PrepareTransform(GetTransform(name))
+
+
+def CheckRunOptions(manifest: RunManifest, arguments: argparse.Namespace) -> bool:
+    ''' True if arguments do not override run options of manifest (applied by PrepareRun).'''
+    conflicts = manifest.Conflicts(arguments)
+    for name in conflicts:
+        logging.error('Option `%s` %s differs from run manifest %s!',
+                      name, getattr(arguments, name), manifest.run.get(name, None))
+
+    return len(conflicts) == 0
+
+
+def SinkNames(shard: tuple = None) -> tuple:
+    ''' Return (shard prefix, index file name) of shards sink of run shard (node) or whole run.'''
+    return ShardWriter.NodeNames(shard) if (shard is not None) else ('shard', shardsIndexFilename)
+
+
+def Regenerate(outputPath: str, outputName: str, arguments: argparse.Namespace):
+    ''' Regenerate single output exactly from its job seed in run manifest (of run shard),
+        written into new shard of shards runs.'''
+    manifest = RunManifest.Load(RunManifest.ForDirectory(outputPath, arguments.shard), outputPath)
+    found = manifest.FindOutput(outputName) if (manifest is not None) else None
+    # Check : Output not in manifest
+    if (found is None):
+        logging.error('Output `%s` not found in run manifest!', outputName)
+        return
+    # Check : Different run options
+    if (not CheckRunOptions(manifest, arguments)):
+        return
+
+    # Job : Augment all job variants in same order, save only requested one
+    job, outputIndex = found
+    PrepareRun(manifest)
+    _, image = ReadJob(job, manifest.run.get('reducedDecode', False))
+    variants = AugmentVariants(job.transform, image, job.count, job.seed)
+
+    # Shards : Appended to shards index, replaces previous entry of output
+    if (manifest.run.get('shards', None) is not None):
+        prefix, indexFilename = SinkNames(arguments.shard)
+        sink = ShardWriter(os.path.join(outputPath, 'shards'), maxBytes=manifest.run['shards'] << 20,
+                           prefix=prefix, indexFilename=indexFilename)
+        try:
+            sink.Write(outputName, cv2.imencode(os.path.splitext(outputName)[1], variants[outputIndex])[1].tobytes())
+        finally:
+            sink.Close()
+    else:
+        cv2.imwrite(job.outputPaths[outputIndex], variants[outputIndex])
+    logging.info('Regenerated `%s` (job %u, seed %u).', outputName, job.index, job.seed)
+
+
+def Export(annoter: AnnoterReid,
+           manifest: RunManifest,
+           exportPath: str,
+           shardsPath: str = None,
+           indexFilename: str = shardsIndexFilename) -> int:
+    ''' Export original images of all identities and finished outputs of run manifest into packed file.'''
+    catalog = annoter.catalog
+    reader = ShardReader(shardsPath, indexFilename) \
+        if (shardsPath is not None) and (ShardReader.IsShards(shardsPath, indexFilename)) else None
+
+    def ReadEncoded(path: str) -> bytes:
+        ''' Read encoded image from file, shard path or generated shards.'''
+        shardReader, name = ShardReader.ForPath(path)
+        if (shardReader is not None):
+            return shardReader.Read(name)
+        if (reader is not None) and (not os.path.exists(path)):
+            return reader.Read(os.path.basename(path))
+        with open(path, 'rb') as file:
+            return file.read()
+
+    # Originals : Catalog images, except outputs planned into output directory (or its shards)
+    outputDirectory = os.path.normpath(os.path.dirname(manifest.path))
+    outputs = {index for index, directory in enumerate(catalog.directories)
+               if (os.path.normpath(directory) == outputDirectory) or
+                  (os.path.normpath(directory).startswith(outputDirectory + os.sep))}
+    images = [(catalog.Name(row), int(catalog.identity[row]), int(catalog.camera[row]),
+               int(catalog.frame[row]), catalog.Path(row))
+              for row in range(catalog.count)
+              if (int(catalog.directory[row]) not in outputs)]
+
+    # Outputs : Written outputs of done jobs (also of resumed runs)
+    for job in manifest.jobs:
+        if (job.index in manifest.done):
+            for outputName, outputPath in zip(job.outputNames, job.outputPaths):
+                reidInfo = ReidFileInfo.FromFilename(outputName)
+                images.append((outputName, reidInfo.identity, reidInfo.camera, reidInfo.frame, outputPath))
+
+    # Images : Sorted by identity, then camera and frame
+    images.sort(key=lambda image: image[1:4])
+    return PackedDataset.Write(exportPath, ((name, identity, camera, frame, ReadEncoded(path))
+                                            for name, identity, camera, frame, path in images))
+
+
+def Merge(outputPath: str):
+    ''' Merge run shards (nodes) manifests and shards indexes.'''
+    # Shards : Merge nodes indexes first, outputs checked in merged index
+    shardsPath = os.path.join(outputPath, 'shards')
+    exists = os.path.exists
+    if (os.path.isdir(shardsPath)):
+        count = ShardWriter.Merge(shardsPath)
+        logging.info('Merged %u shards index entries.', count)
+        reader = ShardReader(shardsPath)
+        exists = lambda outputPath: reader.Contains(os.path.basename(outputPath))
+
+    manifest = RunManifest.Merge(outputPath, exists)
+    # Check : Nothing to merge
+    if (manifest is None):
+        logging.error('No run shards manifests in `%s`!', outputPath)
+        return
+
+    logging.info('Merged %u shards : %u of %u jobs done.',
+                 manifest.run['runShards'], len(manifest.done), len(manifest.jobs))
+
 
 def Process(path: str, arguments: argparse.Namespace):
     ''' Process directory'''
@@ -24,82 +229,190 @@ def Process(path: str, arguments: argparse.Namespace):
     outputPath = os.path.join(path, 'generated')
     Path(outputPath).mkdir(parents=True, exist_ok=True)
 
-    # Annoter : Create
-    annoter = AnnoterReid(dirpath=FixPath(GetFileLocation(args.input)),
-                          args=args,
-                          )
+    # Seed : Given or random, always stored in run manifest
+    seed = arguments.seed if (arguments.seed is not None) else int.from_bytes(os.urandom(4), 'little')
+    random.seed(seed)
+    np.random.seed(seed)
+
+    # Regenerate : Single output from run manifest
+    if (arguments.regenerate is not None):
+        Regenerate(outputPath, arguments.regenerate, arguments)
+        return
+
+    # Merge : Run shards manifests into single manifest
+    if (arguments.merge):
+        Merge(outputPath)
+        return
+
+    # Annoter : Create, roots of different datasets refused
+    try:
+        annoter = AnnoterReid(dirpath=FixPath(GetFileLocation(arguments.input)),
+                              args=arguments,
+                              )
+    except ValueError as error:
+        logging.error('%s', error)
+        return
+
+    # Similarities : Compute and report identities separation
+    if (arguments.similarity):
+        annoter.ComputeSimilarities(path=arguments.similarityFile)
+        logging.info('Identities separation avg %2.4f, min %2.4f, max %2.4f.',
+                     annoter.separation_avg,
+                     annoter.separation_min,
+                     annoter.separation_max)
+
+    # Visuals : Compute and report images visual statistics
+    if (arguments.visuals):
+        annoter.ComputeVisuals(workers=arguments.workers if (arguments.workers != 0) else None)
+        identities = list(annoter.identities.values())
+        logging.info('Identities brightness avg %2.3f, saturation avg %2.3f.',
+                     np.nanmean([identity.brightness for identity in identities], dtype=np.float64),
+                     np.nanmean([identity.saturation for identity in identities], dtype=np.float64))
+
+    # Shards : Outputs streamed into tar shards instead of files
+    sink = None
+    exists = os.path.exists
+    if (arguments.shards is not None):
+        shardsPath = os.path.join(outputPath, 'shards')
+        # Run shard : Own shards files and index of node
+        prefix, indexFilename = SinkNames(arguments.shard)
+        # Resume : Outputs already written to shards
+        if (arguments.resume) and (ShardReader.IsShards(shardsPath, indexFilename)):
+            reader = ShardReader(shardsPath, indexFilename)
+            exists = lambda outputPath: reader.Contains(os.path.basename(outputPath))
+        sink = ShardWriter(shardsPath, maxBytes=arguments.shards << 20,
+                           prefix=prefix, indexFilename=indexFilename)
+
+    # Manifest : Resume previous run or plan new one
+    manifestPath = RunManifest.ForDirectory(outputPath, arguments.shard)
+    manifest = RunManifest.Load(manifestPath, outputPath, exists) if (arguments.resume) else None
+    if (manifest is not None):
+        # Check : Different run options
+        if (not CheckRunOptions(manifest, arguments)):
+            if (sink is not None):
+                sink.Close()
+            return
+        logging.info('Resuming run (seed %u) : %u of %u jobs done.',
+                     manifest.run['seed'], len(manifest.done), len(manifest.jobs))
+    else:
+        # Check : Nothing to resume
+        if (arguments.resume):
+            logging.warning('No run manifest `%s` to resume, starting new run!', manifestPath)
+
+        # Check : Pipeline options silently dropped by selected pipeline
+        if (not CheckTransformOptions(arguments)):
+            if (sink is not None):
+                sink.Close()
+            return
+
+        # Jobs : Plan all jobs before processing
+        manifest = RunManifest(path=manifestPath,
+                               run={'seed': seed,
+                                    'iterations': arguments.iterations,
+                                    **({'shard': list(arguments.shard)} if (arguments.shard is not None) else {}),
+                                    **RunManifest.Options(arguments)},
+                               jobs=PlanJobs(annoter, outputPath, arguments, seed))
+        manifest.Create()
+
+        # Plan only : Jobs list stored in manifest, processed later by resume
+        if (arguments.planOnly):
+            logging.info('Planned %u jobs (%u outputs) in `%s`.',
+                         len(manifest.jobs), sum(job.count for job in manifest.jobs), manifestPath)
+            if (sink is not None):
+                sink.Close()
+            return
+
+    # Jobs : Only not finished jobs
+    PrepareRun(manifest)
+    jobs = manifest.pending
+    done = sum(job.count for job in manifest.jobs) - sum(job.count for job in jobs)
 
-    # Counter : Of processed images
-    processed_counter = 0
     # Preview: ProgressBar : Create
-    progress = tqdm(total=args.iterations, 
+    progress = tqdm(total=done + sum([job.count for job in jobs]),
+                    initial=done,
                     desc='Augumentation', 
                     unit='images')
-    
-    # Albumentations per identity : Calculate
-    albumentations_per_image = max(1, round(args.iterations / len(annoter.identities)))
-    
-    # Identities : Get all IDs
-    identities_ids = annoter.indentities_ids
-    random.shuffle(identities_ids)
-
-    # Identities : Loop over every identity
-    for identity_id in identities_ids:
-        # Identity : Get identity
-        identity = annoter.identities[identity_id]
-
-        # Original identitiy images list : get copy
-        original_images = copy(identity.images)
-        random.shuffle(original_images)
-
-        # Images : For every identity image
-        for image in original_images[:albumentations_per_image]:
-            # Next frame number : Get from identity
-            next_frame_number = identity.last_frame + 1
-
-            # Output name : 
-            outputName = ReidFileInfo.toPath(identity_number=identity.number,
-                                camera_number=image.camera,
-                                frame_number=next_frame_number,
-                                dataset=identity.dataset,)
-
-            # Augmentate image
-            if (arguments.augumentColor):
-                createdPath = Augment(image.path, outputName, outputPath, transform_color)
-            elif (arguments.augumentShape):
-                createdPath = Augment(image.path, outputName, outputPath, transform_shape)
-            else:
-                createdPath = Augment(image.path, outputName, outputPath, transform_all)
-
-            # Identity : Append image
-            identity.AddImage(ImageData(path=createdPath,
-                                        camera=image.camera,
-                                        frame=next_frame_number))
 
+    # Jobs : Process by reader, augment and writer pipeline
+    manifest.Open()
+    try:
+        for job in ProcessJobs(jobs,
+                               workers=arguments.workers,
+                               queueDepth=arguments.queueDepth,
+                               ioThreads=arguments.ioThreads,
+                               reducedDecode=manifest.run.get('reducedDecode', False),
+                               profile=arguments.profile,
+                               sink=sink):
+            # Manifest : Job done
+            manifest.MarkDone(job)
             # Counter : Increment
-            progress.update(1)
+            progress.update(job.count)
+    finally:
+        manifest.Close()
+        if (sink is not None):
+            sink.Close()
 
-            # Check : Maximum number of created images
-            processed_counter += 1
-            if (processed_counter >= arguments.iterations):
-                logging.info('Finished. Maximum number of created images reached!')
-                sys.exit(0)
+    # Progress : Close
+    progress.close()
 
+    # Catalog : Outputs written into shards read from shards by catalog consumers
+    if (sink is not None):
+        moved = annoter.MoveToShards(outputPath, ShardReader(shardsPath, sink.indexFilename))
+        logging.debug('Moved %u catalog outputs into shards.', moved)
 
-if (__name__ == '__main__'):
-    # Logging : Enable
-    if (__debug__ is True):
-        logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
-    else:
-        logging.basicConfig(stream=sys.stderr, level=logging.INFO)
-    logging.debug('Logging enabled!')
+    # Export : Packed file of original and generated images
+    if (arguments.export is not None):
+        count = Export(annoter, manifest, arguments.export,
+                       shardsPath if (sink is not None) else None,
+                       sink.indexFilename if (sink is not None) else shardsIndexFilename)
+        logging.info('Exported %u images to `%s`.', count, arguments.export)
 
-    # Arguments and config
+    # Duplicates : Find near duplicates of originals and generated images
+    if (arguments.duplicates is not None):
+        duplicates = annoter.NearDuplicates(radius=arguments.duplicates)
+        with open(os.path.join(outputPath, 'duplicates.csv'), 'w') as file:
+            for path1, path2, distance in duplicates:
+                file.write(f'{path1},{path2},{distance}\n')
+        logging.info('Found %u near duplicate pairs (radius %u).',
+                     len(duplicates), arguments.duplicates)
+
+    # Profiler : Save report and print summary
+    if (arguments.profile) and (profiling.profiler is not None):
+        reportPath = os.path.join(outputPath, 'profile.json')
+        profiling.profiler.Save(reportPath)
+        logging.info('Profile saved to `%s` :\n%s', reportPath, profiling.profiler.Summary())
+
+    # Check : Maximum number of created images
+    if (progress.n >= arguments.iterations):
+        logging.info('Finished. Maximum number of created images reached!')
+
+
+def ShardArgument(text: str) -> tuple:
+    ''' Parse run shard argument `I/N` into (index, count).'''
+    try:
+        index, count = map(int, text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Shard `{text}` is not in I/N format!')
+    # Check : Index out of range
+    if (count <= 0) or (index < 0) or (index >= count):
+        raise argparse.ArgumentTypeError(f'Shard index {index} out of range 0..{count - 1}!')
+
+    return index, count
+
+
+def CreateParser() -> argparse.ArgumentParser:
+    ''' Create command line arguments parser.'''
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', type=str,
-                        required=True, help='Input path')
+    parser.add_argument('-i', '--input', type=str, default=None,
+                        required=False, help='Input path')
     parser.add_argument('-n', '--iterations', type=int, nargs='?', const=100, default=100,
                         required=False, help='Maximum number of created images')
+    parser.add_argument('-cap', '--cap', type=int, default=None,
+                        required=False, help='Maximum images of identity (originals and created).')
+    parser.add_argument('-cw', '--cameraWeight', type=float, default=1.0,
+                        required=False, help='Extra outputs weight of identities seen by fewer cameras.')
+    parser.add_argument('-po', '--planOnly', action='store_true',
+                        required=False, help='Plan jobs into generated/manifest.jsonl and report, process later by --resume.')
     parser.add_argument('-a', '--all', action='store_true',
                         required=False, help='All images (annotated and not annotated). Defaut is only annotated.')
     parser.add_argument('-aa', '--augumentAll', action='store_true',
@@ -108,7 +421,77 @@ if (__name__ == '__main__'):
                         required=False, help='Process extra image shape augmentation.')
     parser.add_argument('-ac', '--augumentColor', action='store_true',
                         required=False, help='Process extra image color augmentation.')
-    args = parser.parse_args()
+    parser.add_argument('-R', '--recursive', action='store_true',
+                        required=False, help='Scan input subdirectories recursively (except generated).')
+    parser.add_argument('-ir', '--inputRoots', type=str, nargs='+', default=None,
+                        required=False, help='Additional input roots of same dataset, identities merged with input.')
+    parser.add_argument('-st', '--scanThreads', type=int, default=8,
+                        required=False, help='Number of directory listing threads.')
+    parser.add_argument('-ni', '--noIndex', action='store_true',
+                        required=False, help='Do not use persistent dataset index file.')
+    parser.add_argument('-sim', '--similarity', action='store_true',
+                        required=False, help='Compute identities features and similarity matrix.')
+    parser.add_argument('-simf', '--similarityFile', type=str, default=None,
+                        required=False, help='Memory map similarity matrix to file (e.g. generated/similarity.npy), bounded memory for many identities.')
+    parser.add_argument('-nfs', '--noFeatureStore', action='store_true',
+                        required=False, help='Do not use memory mapped features store file.')
+    parser.add_argument('-dup', '--duplicates', type=int, nargs='?', const=4, default=None,
+                        required=False, help='Find near duplicate images within dHash Hamming radius.')
+    parser.add_argument('-vis', '--visuals', action='store_true',
+                        required=False, help='Compute images visual statistics (hue, brightness, saturation).')
+    parser.add_argument('-rd', '--reducedDecode', action='store_true',
+                        required=False, help='Decode JPEG images at reduced scale, not smaller than output size (color pipelines only).')
+    parser.add_argument('-rf', '--resizeFirst', action='store_true',
+                        required=False, help='Resize before transformations in geometry safe pipelines.')
+    parser.add_argument('-w', '--workers', type=int, nargs='?', const=0, default=1,
+                        required=False, help='Number of worker processes. Zero means all cores.')
+    parser.add_argument('-qd', '--queueDepth', type=int, default=8,
+                        required=False, help='Maximum number of decoded images queued between pipeline stages.')
+    parser.add_argument('-io', '--ioThreads', type=int, default=2,
+                        required=False, help='Number of reader and writer threads.')
+    parser.add_argument('-bc', '--batchedColor', action='store_true',
+                        required=False, help='Augment color variants of image as one stack (with -ac).')
+    parser.add_argument('-wm', '--warpMaps', type=int, nargs='?', const=64, default=None,
+                        required=False, help='Shape distortions by pool of N precomputed warp maps.')
+    parser.add_argument('-wf', '--warpFile', type=str, default=None,
+                        required=False, help='Warp maps cache files prefix (memory mapped, shared by runs).')
+    parser.add_argument('-s', '--seed', type=int, default=None,
+                        required=False, help='Random seed of run (stored in generated/manifest.jsonl).')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        required=False, help='Resume run from generated/manifest.jsonl, skip done jobs.')
+    parser.add_argument('-rg', '--regenerate', type=str, default=None,
+                        required=False, help='Regenerate single output name exactly from run manifest.')
+    parser.add_argument('-sh', '--shards', type=int, nargs='?', const=1024, default=None,
+                        required=False, help='Write outputs into tar shards of maximum size in MB (generated/shards).')
+    parser.add_argument('-sd', '--shard', type=ShardArgument, default=None,
+                        required=False, help='Process run shard I/N (0 based) of identities, for many nodes.')
+    parser.add_argument('-mg', '--merge', action='store_true',
+                        required=False, help='Merge manifests of all run shards into generated/manifest.jsonl.')
+    parser.add_argument('-e', '--export', type=str, default=None,
+                        required=False, help='Export original and generated images into packed memory mappable file.')
+    parser.add_argument('-p', '--preset', type=str, choices=presets, default='full',
+                        required=False, help='Pipelines cost tier (fast, balanced, full).')
+    parser.add_argument('-srv', '--serve', type=str, default=None,
+                        required=False, help='Run augmentation service on loopback `[host:]port` or Unix socket `unix:path` (or path).')
+    parser.add_argument('-prof', '--profile', action='store_true',
+                        required=False, help='Profile pipeline stages and transformations, save generated/profile.json.')
+    return parser
 
+
+if (__name__ == '__main__'):
+    # Logging : Enable
+    if (__debug__ is True):
+        logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
+    else:
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+    logging.debug('Logging enabled!')
+
+    # Arguments and config
+    args = CreateParser().parse_args()
+
+    # Service : Long running, jobs submitted by clients
+    if (args.serve is not None):
+        Serve(args.serve, args)
     # Process
-    Process(args.input, args)
+    else:
+        Process(args.input, args)
@@ -0,0 +1,70 @@
+'''
+    Shared fixtures of tests : small reid datasets made of test image.
+'''
+import os
+import cv2
+import pytest
+import main
+from helpers.augumentations import ConfigureWarpMaps, warpMapCache
+
+# Test image : Source of all datasets images, 1024x803 JPEG
+testImagePath = os.path.join(os.path.dirname(__file__), 'TestImages1', '99630559138358b1d3ce96ca3b0dcf76cabf4b26.jpg')
+
+
+def ResetWarpMaps():
+    ''' Drop warp maps pool and restore default configuration.'''
+    warpMapCache.Reset()
+    ConfigureWarpMaps()
+
+
+@pytest.fixture(autouse=True)
+def freshWarpMaps():
+    ''' Every test starts and ends with fresh state of warp maps pool.'''
+    ResetWarpMaps()
+    yield
+    ResetWarpMaps()
+
+
+@pytest.fixture(scope='session')
+def testImage() -> str:
+    ''' Path to test image.'''
+    return testImagePath
+
+
+@pytest.fixture(scope='session')
+def names() -> list:
+    ''' Image names of dataset of 3 identities seen by 2 cameras.'''
+    return [f'ID{identity}_CAM{camera}_FRAME{frame}.jpg'
+            for identity in range(3) for camera in range(1, 3) for frame in range(2)]
+
+
+@pytest.fixture
+def run():
+    ''' Process dataset by command line options, in fresh state of warp maps pool.'''
+    def Run(path: str, *options: str):
+        ''' Run main processing of dataset `path`.'''
+        ResetWarpMaps()
+        main.Process(path, main.CreateParser().parse_args(['-i', path, *options]))
+
+    return Run
+
+
+@pytest.fixture(scope='session')
+def smallImage() -> bytes:
+    ''' Test image encoded at reduced size (fast augmentations).'''
+    image = cv2.resize(cv2.imread(testImagePath), (256, 200), interpolation=cv2.INTER_AREA)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+@pytest.fixture
+def dataset(tmp_path, smallImage):
+    ''' Factory of reid dataset directory from list of image names, returns path with separator.'''
+    def Create(names: list, name: str = 'dataset') -> str:
+        ''' Create directory with test image stored under every name.'''
+        directory = tmp_path / name
+        directory.mkdir(exist_ok=True)
+        for filename in names:
+            (directory / filename).write_bytes(smallImage)
+        return str(directory) + os.sep
+
+    return Create
@@ -0,0 +1,42 @@
+'''
+    Tests of approximate nearest neighbours index (engine.AnnIndex).
+'''
+import numpy as np
+from engine.AnnIndex import AnnIndex
+from helpers.features import ExactSearch
+
+
+def Recall(approximate: np.ndarray, exact: np.ndarray) -> float:
+    ''' Mean fraction of exact neighbours found.'''
+    return np.mean([len(set(a.tolist()) & set(e.tolist())) / len(e) for a, e in zip(approximate, exact)])
+
+
+def test_recall_against_exact_search():
+    ''' Probing all lists is exact search, few probes keep high recall.'''
+    generator = np.random.default_rng(0)
+    centers = generator.normal(size=(20, 32)).astype(np.float32)
+    features = centers[generator.integers(0, 20, 2000)] + 0.3 * generator.normal(size=(2000, 32)).astype(np.float32)
+    ids = np.arange(1000, 3000)
+    queries = features[:100]
+    exact, _ = ExactSearch(features, queries, 10)
+
+    index = AnnIndex(nlist=16, nprobe=16)
+    index.Build(ids, features)
+    found, similarities = index.Search(queries, 10)
+    assert Recall(found - 1000, exact) == 1.0
+    assert np.all(np.diff(similarities, axis=1) <= 1e-6)
+
+    index.nprobe = 4
+    found, _ = index.Search(queries, 10)
+    assert Recall(found - 1000, exact) >= 0.9
+
+
+def test_search_all_excludes_itself():
+    ''' Neighbours of indexed vectors do not contain vector itself.'''
+    features = np.random.default_rng(1).normal(size=(200, 8)).astype(np.float32)
+    index = AnnIndex(nlist=4, nprobe=4)
+    index.Build(np.arange(200), features)
+    ids, neighbours, _ = index.SearchAll(5)
+    assert not np.any(neighbours == ids[:, None])
+    exact, _ = ExactSearch(features, features[ids], 6)
+    assert Recall(neighbours, exact[:, 1:]) == 1.0
@@ -0,0 +1,55 @@
+'''
+    Tests of pipelines and decoding (helpers.augumentations).
+'''
+import numpy as np
+from engine.AugmentJob import AugmentJob
+from helpers.augumentations import ConfigureWarpMaps, GetTransform, PrepareTransform, ProportionalCrop, \
+    cropArea, outputHeight, outputWidth, warpMapCache
+from helpers.processing import ReadJob
+
+
+def test_reduced_decode_only_geometry_safe(testImage):
+    ''' Reduced decode applies to color pipelines, shape pipelines get full resolution.'''
+    for transform in ['color', 'color_fast', 'color_resized', 'color_batched']:
+        _, image = ReadJob(AugmentJob(source=testImage, transform=transform), reducedDecode=True)
+        assert image.shape[:2] == (402, 512)
+
+    for transform in ['shape', 'all', 'shape_fast', 'all_cached']:
+        _, image = ReadJob(AugmentJob(source=testImage, transform=transform), reducedDecode=True)
+        assert image.shape[:2] == (803, 1024)
+
+
+def test_proportional_crop_keeps_full_pipeline_area():
+    ''' Crop of resize first pipelines keeps source area of full pipeline crop for any source size.'''
+    for width, height in [(1024, 803), (320, 280), (128, 256), (150, 100)]:
+        x, y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+        coordinates = np.dstack([x, y, np.zeros_like(x)])
+        cropped = ProportionalCrop(p=1.0)(image=coordinates)['image']
+
+        cropWidth = cropped[..., 0].max() - cropped[..., 0].min() + 1
+        cropHeight = cropped[..., 1].max() - cropped[..., 1].min() + 1
+        assert cropped.shape[:2] == (outputHeight, outputWidth)
+        assert abs(cropWidth * cropHeight / min(cropArea, width * height) - 1) < 0.05
+
+
+def test_resize_first_pipelines_output_size():
+    ''' Crop or resize first step gives output size for every source size.'''
+    for width, height in [(1024, 803), (150, 100)]:
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        for _ in range(10):
+            assert GetTransform('shape_fast')(image=image, bboxes=[])['image'].shape == (outputHeight, outputWidth, 3)
+
+
+def test_warp_maps_pool_dropped_on_configuration_change(tmp_path):
+    ''' Prepared warp maps pool is prepared again after pool size or file change only.'''
+    ConfigureWarpMaps(4)
+    PrepareTransform(GetTransform('shape_cached'))
+    assert warpMapCache.map1.shape[0] == 4
+
+    ConfigureWarpMaps(4)
+    assert warpMapCache.ready
+    ConfigureWarpMaps(4, str(tmp_path / 'warp'))
+    assert not warpMapCache.ready
+    ConfigureWarpMaps(2, str(tmp_path / 'warp'))
+    PrepareTransform(GetTransform('shape_cached'))
+    assert warpMapCache.map1.shape[0] == 2
@@ -0,0 +1,53 @@
+'''
+    Tests of columnar identity catalog (engine.ReidCatalog, engine.Identity).
+'''
+import numpy as np
+import pytest
+from engine.Identity import Identity
+from engine.ImageData import ImageData
+from engine.ReidCatalog import ReidCatalog
+
+
+def test_extend_and_append_rows():
+    ''' Rows of identities follow bulk and single adds, counters maintained.'''
+    catalog = ReidCatalog()
+    catalog.Extend('/data', ['b1.jpg', 'a1.jpg', 'b2.jpg'], [2, 1, 2], [1, 1, 2], [5, 3, 9])
+    row = catalog.Append(1, '/generated/a2.jpg', 2, 4)
+
+    assert catalog.count == 4
+    assert [catalog.Name(row) for row in catalog.Rows(2)] == ['b1.jpg', 'b2.jpg']
+    assert [catalog.Path(row) for row in catalog.Rows(1)] == ['/data/a1.jpg', '/generated/a2.jpg']
+    assert (catalog.Count(1), catalog.LastFrame(1), catalog.LastFrame(2)) == (2, 4, 9)
+    assert catalog.camera[row] == 2
+
+
+def test_truncate_restores_counters():
+    ''' Truncated rows are removed from identities, counters recomputed.'''
+    catalog = ReidCatalog()
+    catalog.Extend('/data', [f'{index}.jpg' for index in range(6)], [1, 1, 2, 2, 3, 3], [1] * 6, range(6))
+    # Growth : Appended rows beyond initial capacity
+    for frame in range(10, 2000):
+        catalog.Append(1 + frame % 3, f'/generated/{frame}.jpg', 1, frame)
+    catalog.Append(4, '/generated/new.jpg', 1, 1)
+
+    catalog.Truncate(6)
+    assert catalog.count == 6
+    assert sorted(catalog.identities_ids) == [1, 2, 3]
+    assert [catalog.Count(number) for number in [1, 2, 3]] == [2, 2, 2]
+    assert [catalog.LastFrame(number) for number in [1, 2, 3]] == [1, 3, 5]
+    assert catalog.Rows(2).tolist() == [2, 3]
+    assert np.isnan(catalog.hue[6:catalog.capacity]).all()
+
+    row = catalog.Append(2, '/generated/again.jpg', 1, 4)
+    assert catalog.Name(row) == 'again.jpg'
+
+
+def test_identity_images_read_only():
+    ''' Initial images are stored in catalog, images list is not mutable.'''
+    identity = Identity(7, [ImageData(path='/data/ID7_CAM1_FRAME3.jpg', camera=1, frame=3)])
+    identity.AddImage(ImageData(path='/data/ID7_CAM2_FRAME5.jpg', camera=2, frame=5))
+
+    assert [image.frame for image in identity.images] == [3, 5]
+    assert (identity.images_count, identity.last_frame) == (2, 5)
+    with pytest.raises(AttributeError):
+        identity.images.append(ImageData())
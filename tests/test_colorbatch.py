@@ -0,0 +1,41 @@
+'''
+    Tests of batched color augmentation (helpers.colorbatch).
+'''
+import os
+import numpy as np
+from engine.AugmentJob import AugmentJob
+from helpers.colorbatch import BatchColorTransform
+from helpers.processing import ProcessJobs
+
+
+def test_noise_banks_independent_of_random_state():
+    ''' Noise banks do not depend on global random state.'''
+    first, second = BatchColorTransform(32, 16), BatchColorTransform(32, 16)
+    np.random.seed(1)
+    first.Prepare()
+    np.random.seed(2)
+    second.Prepare()
+    for bank1, bank2 in zip(first.banks, second.banks):
+        assert np.array_equal(bank1, bank2)
+
+
+def test_batched_outputs_independent_of_workers(dataset):
+    ''' Batched color outputs are same for single worker and worker pool.'''
+    outputs = {}
+    for workers in [1, 3]:
+        path = dataset([f'ID{index}_CAM1_FRAME1.jpg' for index in range(6)], name=f'w{workers}')
+        outputDirectory = os.path.join(path, 'generated')
+        os.makedirs(outputDirectory)
+        jobs = [AugmentJob(source=os.path.join(path, f'ID{index}_CAM1_FRAME1.jpg'),
+                           outputNames=[f'ID{index}_CAM1_FRAME{frame}.jpeg' for frame in range(2, 6)],
+                           outputDirectory=outputDirectory,
+                           transform='color_batched',
+                           seed=100 + index,
+                           index=index)
+                for index in range(6)]
+        list(ProcessJobs(jobs, workers=workers))
+        outputs[workers] = {name: open(os.path.join(outputDirectory, name), 'rb').read()
+                            for name in sorted(os.listdir(outputDirectory))}
+
+    assert len(outputs[1]) == 24
+    assert outputs[1] == outputs[3]
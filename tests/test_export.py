@@ -0,0 +1,35 @@
+'''
+    Tests of packed dataset export (main.Export, engine.PackedDataset).
+'''
+import os
+from engine.PackedDataset import PackedDataset
+
+
+def Names(exportPath: str) -> list:
+    ''' Return names of exported images.'''
+    packed = PackedDataset(exportPath)
+    return [packed.Name(index) for index in range(len(packed))]
+
+
+def test_resumed_export_equals_fresh_export(dataset, tmp_path, names, run):
+    ''' Export after resume contains outputs of resumed run.'''
+    fresh, resumed = dataset(names, 'fresh'), dataset(names, 'resumed')
+    run(fresh, '-s', '2', '-n', '10', '-ac', '--export', str(tmp_path / 'fresh.pack'))
+    run(resumed, '-s', '2', '-n', '10', '-ac', '--planOnly')
+    run(resumed, '--resume', '--export', str(tmp_path / 'resumed.pack'))
+
+    assert len(Names(str(tmp_path / 'fresh.pack'))) == len(names) + 10
+    assert Names(str(tmp_path / 'resumed.pack')) == Names(str(tmp_path / 'fresh.pack'))
+
+
+def test_export_of_run_shard(dataset, tmp_path, names, run):
+    ''' Export of run shard reads outputs from shards index of node.'''
+    path = dataset(names)
+    exported = 0
+    for shard in range(2):
+        exportPath = str(tmp_path / f'shard{shard}.pack')
+        run(path, '-s', '2', '-n', '10', '-ac', '--shards', '--shard', f'{shard}/2', '--export', exportPath)
+        exported += len(Names(exportPath)) - len(names)
+
+    assert exported == 10
+    assert os.path.exists(os.path.join(path, 'generated', 'shards', 'shards-1-of-2.index'))
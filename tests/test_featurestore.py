@@ -0,0 +1,52 @@
+'''
+    Tests of memory mapped features store (engine.FeatureStore).
+'''
+import os
+import numpy as np
+from engine.FeatureStore import FeatureStore, storeFilename
+
+
+def Touch(path: str, mtime: int):
+    ''' Write file with given modification time.'''
+    with open(path, 'wb') as file:
+        file.write(b'image')
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_changed_file_row_stale(tmp_path):
+    ''' Vector of changed file is not returned, new vector is appended.'''
+    paths = [str(tmp_path / f'ID{index}_CAM1_FRAME1.jpg') for index in range(3)]
+    for path in paths:
+        Touch(path, 10**9)
+    store = FeatureStore.ForDirectory(str(tmp_path), 4)
+    store.Write(paths, np.arange(12, dtype=np.float32).reshape(3, 4))
+    assert store.Lookup(paths).tolist() == [0, 1, 2]
+
+    Touch(paths[1], 2 * 10**9)
+    assert store.Lookup(paths).tolist() == [0, -1, 2]
+    store.Write(paths[1:2], np.full((1, 4), 7, dtype=np.float32))
+    assert store.Lookup(paths).tolist() == [0, 3, 2]
+    store.Close()
+
+    # Reopen : Same rows in other process
+    store = FeatureStore.ForDirectory(str(tmp_path), 4)
+    assert store.Read(store.Lookup(paths)).tolist() == [[0, 1, 2, 3], [7, 7, 7, 7], [8, 9, 10, 11]]
+    store.Close()
+
+
+def test_stale_vectors_compacted(tmp_path):
+    ''' Store with many stale vectors is rewritten on open, live vectors kept.'''
+    paths = [str(tmp_path / f'ID{index}_CAM1_FRAME1.jpg') for index in range(2)]
+    store = FeatureStore.ForDirectory(str(tmp_path), 2)
+    for version in range(4):
+        for path in paths:
+            Touch(path, (version + 1) * 10**9)
+        store.Write(paths, np.full((2, 2), version, dtype=np.float32))
+    assert store.count == 8
+    store.Close()
+
+    store = FeatureStore.ForDirectory(str(tmp_path), 2)
+    assert (store.count, store.generation) == (2, 1)
+    assert os.path.getsize(str(tmp_path / storeFilename)) == 2 * store.rowBytes
+    assert store.Read(store.Lookup(paths)).tolist() == [[3, 3], [3, 3]]
+    store.Close()
@@ -0,0 +1,30 @@
+'''
+    Tests of perceptual hashes near duplicates index (engine.HashIndex).
+'''
+import numpy as np
+from engine.HashIndex import HashIndex
+from helpers.hashing import HammingDistance
+
+
+def BruteForce(hashes: np.ndarray, radius: int) -> np.ndarray:
+    ''' All (index1, index2, distance) pairs within radius.'''
+    distances = HammingDistance(hashes[:, None], hashes[None, :])
+    first, second = np.nonzero(np.triu(distances <= radius, k=1))
+    return np.stack([first, second, distances[first, second]], axis=1)
+
+
+def test_near_duplicates_equal_brute_force():
+    ''' Pairs of random, perturbed and identical (one big bucket) hashes match brute force.'''
+    generator = np.random.default_rng(0)
+    hashes = generator.integers(0, 2**63, 1000, dtype=np.uint64)
+    # Near : Perturbed copies by up to 5 bits
+    flips = [np.bitwise_or.reduce(np.uint64(1) << generator.choice(64, bits, replace=False).astype(np.uint64))
+             for bits in generator.integers(1, 6, 400)]
+    near = hashes[:400] ^ np.array(flips, dtype=np.uint64)
+    # Blank : Identical hashes, bucket bigger than block
+    hashes = np.concatenate([hashes, near, np.zeros(1200, dtype=np.uint64)])
+
+    for radius in [0, 4]:
+        index = HashIndex(radius=radius)
+        index.Build(hashes)
+        assert np.array_equal(index.NearDuplicates(), BruteForce(hashes, radius))
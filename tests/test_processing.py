@@ -0,0 +1,69 @@
+'''
+    Tests of reader/augment/writer pipeline (helpers.processing).
+'''
+import os
+import time
+import shutil
+import pytest
+from engine.AugmentJob import AugmentJob
+from helpers.processing import ProcessJobs
+
+
+def CreateJobs(directory: str, image: str, count: int, corrupt: int = None) -> list:
+    ''' Create `count` color jobs of copied `image`, job `corrupt` with not decodable source.'''
+    outputDirectory = os.path.join(directory, 'generated')
+    os.makedirs(outputDirectory, exist_ok=True)
+    jobs = []
+    for index in range(count):
+        source = os.path.join(directory, f'ID{index}_CAM1_FRAME1.jpg')
+        if (index == corrupt):
+            with open(source, 'wb') as file:
+                file.write(b'not an image')
+        else:
+            shutil.copy(image, source)
+        jobs.append(AugmentJob(source=source,
+                               outputNames=[f'ID{index}_CAM1_FRAME{frame}.jpeg' for frame in range(2, 4)],
+                               outputDirectory=outputDirectory,
+                               transform='color_resized',
+                               seed=index,
+                               index=index))
+    return jobs
+
+
+def Outputs(directory: str) -> int:
+    ''' Count of written outputs.'''
+    return len(os.listdir(os.path.join(directory, 'generated')))
+
+
+def test_process_jobs_writes_all_outputs(tmp_path, testImage):
+    ''' All jobs are yielded and all outputs written.'''
+    jobs = CreateJobs(str(tmp_path), testImage, 6)
+    done = list(ProcessJobs(jobs, workers=1, queueDepth=2, ioThreads=2))
+    assert sorted(job.index for job in done) == list(range(6))
+    assert Outputs(str(tmp_path)) == 12
+
+
+def test_process_jobs_error_stops_stages(tmp_path, testImage):
+    ''' Stage error is raised after all stages stopped, no outputs written afterwards.'''
+    jobs = CreateJobs(str(tmp_path), testImage, 40, corrupt=1)
+    with pytest.raises(IOError):
+        for _job in ProcessJobs(jobs, workers=1, queueDepth=1, ioThreads=1):
+            pass
+
+    written = Outputs(str(tmp_path))
+    time.sleep(0.5)
+    assert Outputs(str(tmp_path)) == written
+    assert written < 2 * len(jobs)
+
+
+def test_process_jobs_close_stops_stages(tmp_path, testImage):
+    ''' Closing generator stops stages, no outputs written afterwards.'''
+    jobs = CreateJobs(str(tmp_path), testImage, 40)
+    results = ProcessJobs(jobs, workers=1, queueDepth=1, ioThreads=1)
+    next(results)
+    results.close()
+
+    written = Outputs(str(tmp_path))
+    time.sleep(0.5)
+    assert Outputs(str(tmp_path)) == written
+    assert written < 2 * len(jobs)
@@ -0,0 +1,38 @@
+'''
+    Tests of pipeline cost profiler (helpers.profiler).
+'''
+import numpy as np
+import albumentations as A
+import helpers.profiler as profiling
+
+
+def test_records_of_applied_transforms(monkeypatch):
+    ''' Every transform call is recorded, applied only if transform was applied.'''
+    monkeypatch.setattr(profiling, 'profiler', profiling.Profiler())
+    pipeline = A.Compose([A.HorizontalFlip(p=1), A.VerticalFlip(p=0)])
+    profiling.Instrument(pipeline, 'test')
+
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    for _ in range(3):
+        pipeline(image=image)
+    with profiling.Measure('stage/read'):
+        pass
+
+    records = profiling.profiler.Report()['records']
+    assert records['test']['calls'] == 3
+    assert (records['test/0:HorizontalFlip']['calls'], records['test/0:HorizontalFlip']['applied']) == (3, 3)
+    assert (records['test/1:VerticalFlip']['calls'], records['test/1:VerticalFlip']['applied']) == (3, 0)
+    assert records['stage/read']['calls'] == 1
+    assert sum(records['test']['histogram']) == 3
+
+
+def test_worker_records_merged():
+    ''' Records popped from worker profiler are merged into parent profiler.'''
+    worker, parent = profiling.Profiler(), profiling.Profiler()
+    worker.Record('test', 0.002, True)
+    parent.Record('test', 0.001, False)
+    parent.Merge(worker.Pop())
+
+    assert worker.Pop() == {}
+    record = parent.Report()['records']['test']
+    assert (record['calls'], record['applied'], record['applied_ratio']) == (2, 1, 0.5)
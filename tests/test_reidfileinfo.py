@@ -0,0 +1,51 @@
+'''
+    Tests of registered reid dataset formats (engine.ReidFileInfo, engine.AnnoterReid).
+'''
+import argparse
+import numpy as np
+import pytest
+from engine.AnnoterReid import AnnoterReid
+from engine.ReidFileInfo import ReidDataset, ReidFileInfo, reidFormats
+
+# Infos : One of every registered format
+infos = [ReidFileInfo(12, 3, 451, ReidDataset.AispReid),
+         ReidFileInfo(2, 1, 1000451, ReidDataset.Market1501),
+         ReidFileInfo(7, 2, 46182, ReidDataset.DukeMTMC),
+         ReidFileInfo(5, 11, 15, ReidDataset.MSMT17)]
+
+
+@pytest.mark.parametrize('info', infos, ids=lambda info: info.dataset.value)
+def test_format_round_trip(info):
+    ''' Name created by format is parsed back into same info.'''
+    name = reidFormats[info.dataset].Path(info.identity, info.camera, info.frame)
+    assert ReidFileInfo.FromFilename(name) == info
+
+
+def test_bulk_parse_equals_single_parse():
+    ''' Bulk parse of mixed formats names equals parse of every name.'''
+    names = [reidFormats[info.dataset].Path(info.identity, info.camera, info.frame) for info in infos]
+    names += ['readme.jpg', '-1_c1s1_000001_00.jpg', '0000_c3s2_000100_01.jpg']
+    valid, identities, cameras, frames, datasets = ReidFileInfo.FromFilenames(names)
+
+    parsed = [ReidFileInfo.FromFilename(name) for name in names]
+    assert valid.tolist() == [info is not None for info in parsed]
+    assert [ReidFileInfo(*values, ReidDataset(dataset)) for values, dataset in
+            zip(np.stack([identities, cameras, frames], axis=1)[valid].tolist(), datasets[valid])] == infos
+
+
+def test_market_junk_and_distractors_skipped():
+    ''' Market1501 junk (-1) and distractors (0000) are not identities.'''
+    names = ['-1_c1s1_000001_00.jpg', '0000_c1s1_000002_00.jpg', '0002_c1s1_000451_03.jpg']
+    assert [ReidFileInfo.FromFilename(name) for name in names][:2] == [None, None]
+    assert ReidFileInfo.FromFilenames(names)[0].tolist() == [False, False, True]
+
+
+def test_mixed_datasets_roots_refused(dataset):
+    ''' Roots of different datasets are not merged into same identities.'''
+    market = dataset(['0001_c1s1_000001_00.jpg', '0001_c2s1_000002_00.jpg'], 'market')
+    duke = dataset(['0001_c1_f0000001.jpg', '0001_c2_f0000002.jpg'], 'duke')
+    with pytest.raises(ValueError):
+        AnnoterReid(dirpath=market, args=argparse.Namespace(inputRoots=[duke]))
+
+    annoter = AnnoterReid(dirpath=market, args=argparse.Namespace(inputRoots=None))
+    assert annoter.identities[1].dataset == ReidDataset.Market1501
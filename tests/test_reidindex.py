@@ -0,0 +1,61 @@
+'''
+    Tests of persistent dataset index (engine.ReidIndex, AnnoterReid.OpenLocation).
+'''
+import os
+import sqlite3
+import argparse
+import engine.AnnoterReid
+from engine.AnnoterReid import AnnoterReid
+from engine.ReidIndex import ReidIndex, indexFilename
+from helpers.scanning import ListDirectory
+
+# Dataset : 2 identities seen by 2 cameras
+names = [f'ID{identity}_CAM{camera}_FRAME1.jpg' for identity in range(2) for camera in range(1, 3)]
+
+
+def Open(path: str) -> AnnoterReid:
+    ''' Open dataset through its index.'''
+    return AnnoterReid(dirpath=path, args=argparse.Namespace(noIndex=False))
+
+
+def test_update_adds_and_removes(tmp_path):
+    ''' Changed directory is updated by added and removed names only.'''
+    index = ReidIndex(str(tmp_path / indexFilename))
+    rows = index.Update('.', 1, names)
+    assert sorted(row[0] for row in rows) == sorted(names)
+
+    rows = index.Update('.', 2, names[1:] + ['ID5_CAM1_FRAME3.jpg', 'readme.jpg'])
+    assert sorted(row[0] for row in rows) == sorted(names[1:] + ['ID5_CAM1_FRAME3.jpg'])
+    assert index.IsValid('.', 2) and not index.IsValid('.', 1)
+    index.Close()
+
+
+def test_unchanged_directory_not_listed(dataset, monkeypatch):
+    ''' Unchanged directory is read from index, changed directory is listed again.'''
+    path = dataset(names)
+    Open(path)
+    Open(path)
+
+    listed = []
+    monkeypatch.setattr(engine.AnnoterReid, 'ListDirectory', lambda path: listed.append(path) or ListDirectory(path))
+    assert Open(path).images_count == len(names)
+    assert listed == []
+
+    os.remove(os.path.join(path, names[0]))
+    assert Open(path).images_count == len(names) - 1
+    assert listed == [path]
+
+
+def test_damaged_index_rebuilt(dataset):
+    ''' Index not being database or failing queries is dropped and rebuilt.'''
+    path = dataset(names)
+    with open(os.path.join(path, indexFilename), 'wb') as file:
+        file.write(b'not database' * 100)
+    assert Open(path).images_count == len(names)
+
+    connection = sqlite3.connect(os.path.join(path, indexFilename))
+    connection.execute('DROP TABLE images')
+    connection.commit()
+    connection.close()
+    assert Open(path).images_count == len(names)
+    assert Open(path).images_count == len(names)
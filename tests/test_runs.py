@@ -0,0 +1,100 @@
+'''
+    Tests of seeded, resumable and reproducible generation runs (main.Process).
+'''
+import os
+from engine.RunManifest import RunManifest
+from engine.ShardReader import ShardReader
+from helpers.files import IsImageFile
+
+
+def Outputs(path: str) -> dict:
+    ''' Return generated images data by name.'''
+    outputPath = os.path.join(path, 'generated')
+    return {name: open(os.path.join(outputPath, name), 'rb').read()
+            for name in sorted(os.listdir(outputPath)) if (IsImageFile(name))}
+
+
+def test_seeded_runs_identical(dataset, names, run):
+    ''' Runs of same seed and options create same outputs.'''
+    first, second = dataset(names, 'first'), dataset(names, 'second')
+    for path in [first, second]:
+        run(path, '-s', '5', '-n', '12', '-as', '-wm', '8')
+
+    assert len(Outputs(first)) == 12
+    assert Outputs(first) == Outputs(second)
+
+
+def test_planned_run_resumed_identical(dataset, names, run):
+    ''' Planned only run processed by resume creates same outputs as full run.'''
+    full, planned = dataset(names, 'full'), dataset(names, 'planned')
+    run(full, '-s', '9', '-n', '10', '-ac', '-bc')
+    run(planned, '-s', '9', '-n', '10', '-ac', '-bc', '--planOnly')
+    assert len(Outputs(planned)) == 0
+
+    run(planned, '--resume')
+    assert Outputs(planned) == Outputs(full)
+
+
+def test_regenerate_applies_run_options(dataset, names, run):
+    ''' Regenerate without run options uses options stored in manifest.'''
+    path = dataset(names)
+    run(path, '-s', '3', '-n', '10', '-as', '-wm', '8')
+    outputs = Outputs(path)
+
+    for name, data in outputs.items():
+        outputPath = os.path.join(path, 'generated', name)
+        os.remove(outputPath)
+        run(path, '--regenerate', name)
+        assert open(outputPath, 'rb').read() == data
+
+
+def test_regenerate_refuses_different_options(dataset, names, run):
+    ''' Regenerate with options different from run options writes nothing.'''
+    path = dataset(names)
+    run(path, '-s', '3', '-n', '4', '-as', '-wm', '8')
+    name = next(iter(Outputs(path)))
+    outputPath = os.path.join(path, 'generated', name)
+    os.remove(outputPath)
+
+    run(path, '--regenerate', name, '-wm', '16')
+    assert not os.path.exists(outputPath)
+
+
+def test_ignored_pipeline_options_refused(dataset, names, run):
+    ''' Pipeline options not applied by selected pipeline plan nothing.'''
+    path = dataset(names)
+    for options in [['-ac', '-bc', '-p', 'fast'], ['-as', '-wm', '8', '-p', 'balanced'],
+                    ['-ac', '-wm', '8'], ['-ac', '-rf', '-p', 'fast'], ['-ac', '-rf', '-bc'],
+                    ['-as', '-bc'], ['-rf']]:
+        run(path, '-s', '1', '-n', '4', *options)
+        assert not os.path.exists(os.path.join(path, 'generated', 'manifest.jsonl'))
+
+    run(path, '-s', '1', '-n', '4', '-ac', '-rf')
+    assert len(Outputs(path)) == 4
+
+
+def test_resume_refuses_different_sink(dataset, names, run):
+    ''' Resume of shards run without same shards option writes nothing.'''
+    path = dataset(names)
+    run(path, '-s', '2', '-n', '6', '-ac', '--shards', '--planOnly')
+    shardsPath = os.path.join(path, 'generated', 'shards')
+    for options in [[], ['--shards', '512']]:
+        run(path, '--resume', *options)
+        assert len(Outputs(path)) == 0
+        assert len(ShardReader(shardsPath + os.sep).entries) == 0
+
+    run(path, '--resume', '--shards')
+    assert len(Outputs(path)) == 0
+    assert len(ShardReader(shardsPath + os.sep).entries) == 6
+
+
+def test_merged_run_keeps_sink(dataset, names, run):
+    ''' Merged manifest of run shards keeps shards sink and stores count of run shards.'''
+    path = dataset(names)
+    for shard in range(2):
+        run(path, '-s', '2', '-n', '6', '-ac', '--shards', '--shard', f'{shard}/2')
+    run(path, '--merge')
+
+    outputPath = os.path.join(path, 'generated')
+    manifest = RunManifest.Load(os.path.join(outputPath, 'manifest.jsonl'), outputPath)
+    assert (manifest.run['shards'], manifest.run['runShards']) == (1024, 2)
@@ -0,0 +1,69 @@
+'''
+    Tests of identity balanced scheduler (engine.Scheduler).
+'''
+import argparse
+import numpy as np
+from engine.AnnoterReid import AnnoterReid
+from engine.Scheduler import Scheduler
+
+# Dataset : Identities of different images and cameras counts
+names = [f'ID{identity}_CAM{1 + frame % cameras}_FRAME{frame}.jpg'
+         for identity, images, cameras in [(0, 6, 2), (1, 2, 1), (2, 4, 2), (3, 1, 1), (4, 3, 3),
+                                           (5, 5, 1), (6, 2, 2), (7, 1, 1), (8, 4, 1), (9, 3, 2)]
+         for frame in range(images)]
+
+
+def Annoter(path: str) -> AnnoterReid:
+    ''' Fresh annoter of dataset (plans add outputs to catalog).'''
+    return AnnoterReid(dirpath=path, args=argparse.Namespace(noIndex=True))
+
+
+def Plan(path: str, seed: int = 1, **fields) -> list:
+    ''' Return planned jobs as (source, outputs names, seed) of fresh annoter.'''
+    scheduler = Scheduler(annoter=Annoter(path), **fields)
+    return [(job.source, tuple(job.outputNames), job.seed)
+            for job in scheduler.Plan(path + 'generated', 'color', seed)]
+
+
+def test_targets_sum_to_budget(dataset):
+    ''' Targets spend whole budget, smaller identities get more outputs.'''
+    scheduler = Scheduler(annoter=Annoter(dataset(names)), iterations=17)
+    assert scheduler.targets.sum() == 17
+    # Same cameras : Filled to common level, identities above level not augmented
+    single = scheduler.cameras == 1
+    filled = single & (scheduler.targets > 0)
+    levels = scheduler.counts[filled] + scheduler.targets[filled]
+    assert levels.max() - levels.min() <= 1
+    assert np.all(scheduler.counts[single & (scheduler.targets == 0)] >= levels.min())
+
+
+def test_targets_respect_cap(dataset):
+    ''' Identity images with outputs never exceed cap, budget above rooms fills rooms.'''
+    annoter = Annoter(dataset(names))
+    scheduler = Scheduler(annoter=annoter, iterations=1000, cap=5)
+    assert np.all(scheduler.counts + scheduler.targets <= np.maximum(5, scheduler.counts))
+    assert scheduler.targets.sum() == np.maximum(0, 5 - scheduler.counts).sum()
+
+    capped = Scheduler(annoter=annoter, iterations=10, cap=5)
+    assert capped.targets.sum() == 10
+    assert np.all(capped.counts + capped.targets <= np.maximum(5, capped.counts))
+
+
+def test_plan_deterministic(dataset):
+    ''' Same seed and dataset plan same jobs, outputs names and seeds.'''
+    path = dataset(names)
+    plan = Plan(path, seed=7, iterations=30)
+    assert sum(len(outputs) for _, outputs, _ in plan) == 30
+    assert Plan(path, seed=7, iterations=30) == plan
+    assert Plan(path, seed=8, iterations=30) != plan
+
+
+def test_shards_plans_union_equals_unsharded_plan(dataset):
+    ''' Shards plan disjoint outputs, together exactly outputs of unsharded run.'''
+    path = dataset(names)
+    plan = Plan(path, seed=3, iterations=25)
+    for count in [2, 3]:
+        shards = [Plan(path, seed=3, iterations=25, shard=(index, count)) for index in range(count)]
+        outputs = [name for shard in shards for _, names, _ in shard for name in names]
+        assert len(outputs) == len(set(outputs))
+        assert sorted(job for shard in shards for job in shard) == sorted(plan)
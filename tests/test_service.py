@@ -0,0 +1,143 @@
+'''
+    Tests of augmentation service (engine.AugmentService).
+'''
+import os
+import socket
+import threading
+import numpy as np
+import pytest
+import main
+from engine.RunManifest import RunManifest
+from engine.Scheduler import Scheduler
+from engine.AugmentService import AugmentService, CreateServer, ParseAddress, ServiceEnd
+from engine.ServiceJob import ServiceJob
+from helpers.augumentations import warpMapCache
+
+
+def Service(path: str, **fields) -> AugmentService:
+    ''' Service of single worker, not started (jobs run by caller).'''
+    return AugmentService(arguments=main.CreateParser().parse_args(['-i', path]), **fields)
+
+
+def test_parse_address():
+    ''' Ports, hosts and Unix socket paths are told apart.'''
+    assert ParseAddress('8080') == ('127.0.0.1', 8080)
+    assert ParseAddress('localhost:8080') == ('localhost', 8080)
+    assert ParseAddress('aug.sock') == ('aug.sock', None)
+    assert ParseAddress('unix:aug.sock') == ('aug.sock', None)
+    assert ParseAddress('/tmp/aug:1.sock') == ('/tmp/aug:1.sock', None)
+    with pytest.raises(ValueError):
+        ParseAddress('localhost:http')
+
+
+def test_non_loopback_host_refused():
+    ''' Service listens on loopback host only.'''
+    with pytest.raises(ValueError):
+        CreateServer('0.0.0.0:0', AugmentService())
+
+    CreateServer('127.0.0.1:0', AugmentService()).server_close()
+
+
+def test_socket_path_replaced_only_if_stale(tmp_path):
+    ''' Stale socket is replaced, other files and listening sockets are kept.'''
+    path = str(tmp_path / 'aug.sock')
+    open(path, 'w').close()
+    with pytest.raises(FileExistsError):
+        CreateServer(path, AugmentService())
+    os.remove(path)
+
+    # Stale : Bound and closed socket, connection refused
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = CreateServer(path, AugmentService())
+    with pytest.raises(OSError):
+        CreateServer(path, AugmentService())
+    server.server_close()
+
+
+def test_failed_job_joined_and_rolled_back(dataset, names):
+    ''' Failed job stops its stages and keeps only written outputs in warm catalog.'''
+    path = dataset(names)
+    open(os.path.join(path, names[0]), 'wb').write(b'not image')
+    service = Service(path)
+    images = service.Annoter(path).catalog.count
+
+    job = service.Submit({'directory': path, 'transform': 'color', 'count': 24, 'seed': 1})
+    service.queue.put(ServiceEnd)
+    service.Run()
+
+    assert job.status == 'failed'
+    assert not any(thread.name.startswith(('Reader', 'Augment', 'Writer')) for thread in threading.enumerate())
+    annoter = service.Annoter(path)
+    assert annoter.catalog.count == images + job.done
+    assert sum(annoter.catalog.Count(number) for number in annoter.indentities_ids) == images + job.done
+
+
+def test_rollback_keeps_done_outputs(dataset, names):
+    ''' Rollback removes planned outputs except outputs of done jobs.'''
+    path = dataset(names)
+    annoter = Service(path).Annoter(path)
+    images = annoter.catalog.count
+    lastFrames = {number: identity.last_frame for number, identity in annoter.identities.items()}
+
+    outputPath = os.path.join(path, 'generated')
+    jobs = Scheduler(annoter=annoter, iterations=12).Plan(outputPath, 'color', 1)
+    manifest = RunManifest(path=os.path.join(outputPath, 'manifest.jsonl'), run={}, jobs=jobs, done={jobs[0].index})
+    AugmentService.Rollback(annoter, images, manifest)
+
+    assert annoter.catalog.count == images + jobs[0].count
+    kept = {annoter.catalog.Name(row) for row in range(images, annoter.catalog.count)}
+    assert kept == set(jobs[0].outputNames)
+    for number, identity in annoter.identities.items():
+        assert identity.last_frame >= lastFrames[number]
+
+
+def test_finished_jobs_pruned(tmp_path):
+    ''' Only latest finished jobs and their manifests are kept.'''
+    (tmp_path / 'generated').mkdir()
+    service = AugmentService(history=2)
+    jobs = [ServiceJob(directory=str(tmp_path)) for _ in range(4)]
+    for job in jobs:
+        open(job.manifestPath, 'w').close()
+        job.Finish('done')
+        service.jobs[job.id] = job
+    queued = ServiceJob()
+    service.jobs[queued.id] = queued
+
+    service.Prune()
+    assert set(service.jobs) == {jobs[2].id, jobs[3].id, queued.id}
+    assert [os.path.exists(job.manifestPath) for job in jobs] == [False, False, True, True]
+
+
+def test_submit_validates_seed_and_cap(dataset, names):
+    ''' Seed and cap of wrong type or range are refused at submit.'''
+    path = dataset(names)
+    service = Service(path)
+    for fields in [{'seed': 'one'}, {'seed': -1}, {'seed': 2**32}, {'seed': 1.5}, {'seed': True},
+                   {'cap': 0}, {'cap': '5'}, {'cap': 2.0}, {'count': True}]:
+        with pytest.raises(ValueError):
+            service.Submit({'directory': path, 'transform': 'color', 'count': 4, **fields})
+
+    job = service.Submit({'directory': path, 'transform': 'color', 'count': 4, 'seed': 0, 'cap': 5})
+    assert (job.seed, job.cap) == (0, 5)
+    assert service.queue.qsize() == 1
+
+
+def test_job_manifest_stores_warp_maps_seed(dataset, names):
+    ''' Jobs manifests store seed of service warp maps pool, run preparation restores same pool.'''
+    path = dataset(names)
+    service = AugmentService(arguments=main.CreateParser().parse_args(['-i', path, '-wm', '4', '-s', '5']))
+    service.Start()
+    pool = np.array(warpMapCache.map1)
+    job = service.Submit({'directory': path, 'transform': 'shape_cached', 'count': 4, 'seed': 1})
+    service.queue.put(ServiceEnd)
+    service.runner.join()
+    assert job.status == 'done'
+
+    outputPath = os.path.join(path, 'generated')
+    manifest = RunManifest.Load(os.path.join(outputPath, f'manifest-{job.id}.jsonl'), outputPath)
+    assert (manifest.run['seed'], manifest.run['warpSeed']) == (1, 5)
+    warpMapCache.Reset()
+    main.PrepareRun(manifest)
+    assert np.array_equal(warpMapCache.map1, pool)
@@ -0,0 +1,91 @@
+'''
+    Tests of tar shards output and shards input datasets (engine.ShardWriter, engine.ShardReader).
+'''
+import os
+import shutil
+import argparse
+from engine.AnnoterReid import AnnoterReid
+from engine.ShardReader import ShardReader
+from engine.ShardWriter import ShardWriter, shardsIndexFilename
+
+
+def test_shards_input_reads(dataset, names, run):
+    ''' Similarities, near duplicates and visuals are computed on shards input.'''
+    path = dataset(names)
+    run(path, '-s', '1', '-n', '6', '-ac', '--shards')
+    shardsPath = os.path.join(path, 'generated', 'shards') + os.sep
+
+    annoter = AnnoterReid(dirpath=shardsPath, args=argparse.Namespace(noFeatureStore=False))
+    assert annoter.images_count == 6
+
+    annoter.ComputeSimilarities()
+    assert annoter.similarity_matrix.shape == (annoter.identities_count, annoter.identities_count)
+    annoter.ComputeVisuals(workers=1)
+    assert len(annoter.catalog.MissingVisuals()) == 0
+    assert len(annoter.NearDuplicates(radius=64)) == 15
+
+
+def test_reader_reloaded_after_rewrite(tmp_path):
+    ''' Reader of shard paths is reloaded when shards directory is rewritten.'''
+    directory = str(tmp_path / 'shards')
+    for data in [[b'first', b'a'], [b'second image', b'b']]:
+        shutil.rmtree(directory, ignore_errors=True)
+        writer = ShardWriter(directory)
+        writer.Write('ID1_CAM1_FRAME1.jpeg', data[0])
+        writer.Write('ID1_CAM1_FRAME2.jpeg', data[1])
+        writer.Close()
+
+        reader, name = ShardReader.ForPath(os.path.join(directory, 'shard-000000.tar', 'ID1_CAM1_FRAME2.jpeg'))
+        assert reader.Read(name) == data[1]
+
+
+def test_shards_outputs_read_by_catalog_consumers(dataset, names, run):
+    ''' Near duplicates of shards run read outputs from shards, no loose files written.'''
+    path = dataset(names)
+    run(path, '-s', '2', '-n', '6', '-ac', '--shards', '--duplicates', '64')
+    outputPath = os.path.join(path, 'generated')
+
+    assert not any(name.endswith('.jpeg') for name in os.listdir(outputPath))
+    with open(os.path.join(outputPath, 'duplicates.csv')) as file:
+        pairs = [line.split(',') for line in file]
+    assert len(pairs) == (len(names) + 6) * (len(names) + 5) // 2
+    assert any(ShardReader.IsShardPath(path1) for path1, _, _ in pairs)
+
+
+def test_regenerate_writes_into_shards(dataset, names, run):
+    ''' Regenerate of shards run (or run shard) replaces output in shards, refused without shards.'''
+    for shard in [[], ['--shard', '1/2']]:
+        path = dataset(names, f'dataset{len(shard)}')
+        run(path, '-s', '3', '-n', '6', '-ac', '--shards', *shard)
+        shardsPath = os.path.join(path, 'generated', 'shards')
+        indexFilename = ShardWriter.NodeNames((1, 2))[1] if (len(shard) != 0) else shardsIndexFilename
+        reader = ShardReader(shardsPath, indexFilename)
+        name = reader.names[0]
+        data = reader.Read(name)
+
+        run(path, '--regenerate', name, *shard)
+        assert ShardReader(shardsPath, indexFilename).entries[name] == reader.entries[name]
+
+        run(path, '--regenerate', name, '--shards', *shard)
+        regenerated = ShardReader(shardsPath, indexFilename)
+        assert regenerated.entries[name][0] != reader.entries[name][0]
+        assert regenerated.Read(name) == data
+        assert not os.path.exists(os.path.join(path, 'generated', name))
+
+
+def test_shard_paths_resolved_by_index(tmp_path):
+    ''' Paths inside shards of run shards resolve by node index, plain `.tar` directories are files.'''
+    directory = str(tmp_path / 'shards')
+    prefix, indexFilename = ShardWriter.NodeNames((0, 2))
+    writer = ShardWriter(directory, prefix=prefix, indexFilename=indexFilename)
+    writer.Write('ID1_CAM1_FRAME1.jpeg', b'first')
+    writer.Close()
+
+    reader, name = ShardReader.ForPath(os.path.join(directory, f'{prefix}-000000.tar', 'ID1_CAM1_FRAME1.jpeg'))
+    assert (reader.indexFilename, reader.Read(name)) == (indexFilename, b'first')
+    assert reader.Rows(f'{prefix}-000000.tar')[0][:4] == ('ID1_CAM1_FRAME1.jpeg', 1, 1, 1)
+
+    plain = tmp_path / 'plain.tar'
+    plain.mkdir()
+    (plain / 'ID1_CAM1_FRAME1.jpeg').write_bytes(b'file')
+    assert not ShardReader.IsShardPath(str(plain / 'ID1_CAM1_FRAME1.jpeg'))
@@ -0,0 +1,55 @@
+'''
+    Tests of identities similarity matrix (engine.SimilarityTable, AnnoterReid.ComputeSimilarities).
+'''
+import argparse
+import numpy as np
+import pytest
+from engine.AnnoterReid import AnnoterReid
+from engine.SimilarityTable import SimilarityTable
+
+# Dataset : 4 identities seen by 2 cameras
+names = [f'ID{identity}_CAM{camera}_FRAME1.jpg' for identity in range(4) for camera in range(1, 3)]
+
+
+def test_similarity_file_equals_memory_matrix(dataset, tmp_path):
+    ''' Similarity matrix memory mapped to file equals matrix in memory.'''
+    path = str(tmp_path / 'generated' / 'similarity.npy')
+    annoter = AnnoterReid(dirpath=dataset(names), args=argparse.Namespace(noFeatureStore=True))
+    annoter.ComputeSimilarities()
+    dense = np.array(annoter.similarity_matrix)
+
+    annoter.ComputeSimilarities(tile=3, path=path)
+    assert isinstance(annoter.similarity.matrix, np.memmap)
+    assert np.allclose(annoter.similarity_matrix, dense, atol=1e-5)
+    assert np.allclose(np.load(path, mmap_mode='r'), dense, atol=1e-5)
+
+
+def Dense(features: dict, ids: np.ndarray) -> np.ndarray:
+    ''' Recomputed cosine similarity matrix of identities.'''
+    vectors = np.stack([features[identity] for identity in ids.tolist()])
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors @ vectors.T
+
+
+@pytest.mark.parametrize('memoryMapped', [False, True])
+def test_table_updates_equal_dense_matrix(tmp_path, memoryMapped):
+    ''' Added, removed and compacted table equals recomputed matrix, memory mapped table stays mapped.'''
+    generator = np.random.default_rng(0)
+    features = {identity: generator.normal(size=8).astype(np.float32) for identity in range(40)}
+    path = str(tmp_path / 'similarity.npy') if (memoryMapped) else None
+    table = SimilarityTable.Build(list(range(10)), np.stack([features[identity] for identity in range(10)]),
+                                  tile=4, path=path)
+
+    # Growth : Added identities beyond capacity
+    for identity in range(10, 40):
+        table.Add(identity, features[identity])
+    assert np.allclose(table.Active(), Dense(features, table.active_ids), atol=1e-5)
+
+    # Removal : Tombstones and compaction
+    for identity in range(0, 40, 3):
+        table.Remove(identity)
+    ids, values = table.Similarities(1)
+    assert np.allclose(values, Dense(features, np.array([1] + ids.tolist()))[0, 1:], atol=1e-5)
+    assert np.allclose(table.Active(), Dense(features, table.active_ids), atol=1e-5)
+    assert table.removed == 0 and sorted(table.active_ids.tolist()) == [i for i in range(40) if (i % 3 != 0)]
+    assert isinstance(table.matrix, np.memmap) == memoryMapped
@@ -0,0 +1,19 @@
+'''
+    Tests of visual statistics and dHash (helpers.visuals, helpers.hashing).
+'''
+import shutil
+import numpy as np
+from helpers.hashing import DHashBatches
+from helpers.visuals import ComputeVisualsBatches
+
+
+def test_visuals_hash_equals_hashing_hash(tmp_path, testImage):
+    ''' Visuals store same dHash as hashing used by near duplicates.'''
+    paths = [str(tmp_path / f'ID{index}_CAM1_FRAME1.jpg') for index in range(3)]
+    for path in paths:
+        shutil.copy(testImage, path)
+
+    (_, visuals), = ComputeVisualsBatches(paths, workers=1)
+    (_, hashes), = DHashBatches(paths)
+    assert np.array_equal(visuals['dhash'], hashes)
+    assert set(visuals) == {'hue', 'saturation', 'brightness', 'dhash'}